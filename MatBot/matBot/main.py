@@ -40,7 +40,8 @@ from functions import (
     login_form, signup_form,
     save_user_data, get_timestamp, load_user_data
 )
-from app import load_embedding_model, load_mistral_model, generate_response
+from app import load_embedding_model, load_mistral_model, generate_response_stream, detect_function_lookup
+from streaming import ResponseStream
 
 # Rest of your code remains the same
 
@@ -65,7 +66,9 @@ USER_DB_PATH = "user_data.json"
 # ------------- APP INITIALIZATION ------------- 
 def initialize_app():
     """Initialize the application configuration and session state."""
-    st.session_state.use_web = True
+    # Default on; web search still only runs when retrieval confidence is low
+    if 'use_web' not in st.session_state:
+        st.session_state.use_web = True
     # Initialize models_loaded flag
     if 'models_loaded' not in st.session_state:
         st.session_state.models_loaded = False
@@ -123,10 +126,14 @@ def initialize_app():
     apply_matlab_theme(st.session_state.theme)
 
 def get_bot_response(user_input):
-    """Generate a response from the bot based on user input."""
+    """Generate a response from the bot based on user input, as (response, metadata)."""
+    return get_bot_response_stream(user_input).result()
+
+def get_bot_response_stream(user_input):
+    """Returns a ResponseStream that yields the bot's answer to user_input as it is generated."""
     if not user_input:
-        return "Please provide a question or input."
-        
+        return ResponseStream.completed("Please provide a question or input.", [])
+
     # Check for model initialization
     if 'embedding_model' not in st.session_state or 'vectorstore' not in st.session_state or 'model_pipeline' not in st.session_state:
         try:
@@ -134,32 +141,30 @@ def get_bot_response(user_input):
             st.session_state.models_loaded = all([st.session_state.embedding_model, st.session_state.vectorstore, st.session_state.model_pipeline])
         except RuntimeError as e:
             st.error(f"Error initializing models: {e}")
-            return f"I encountered an error initializing the models: {e}"
-    
+            return ResponseStream.completed(f"I encountered an error initializing the models: {e}", [])
+
     if not st.session_state.models_loaded:
-        return "Models failed to load. Please check the logs and try again."
-        
+        return ResponseStream.completed("Models failed to load. Please check the logs and try again.", [])
+
     try:
-         # Adding the NLP processing for the User input
-    
-        from nlp import GeminiQueryFormatter
-        
-        nlp1 = GeminiQueryFormatter()
-        user_input = nlp1.format_query(user_input)
+        # Single-function lookups go straight to the reference page, no rewrite needed
+        if detect_function_lookup(user_input) is None:
+            from nlp import GeminiQueryFormatter
 
-        # Generate response
-        response,metaData = generate_response(
+            nlp1 = GeminiQueryFormatter()
+            user_input = nlp1.format_query(user_input)
+
+        # Retrieval runs here; generation runs as the stream is consumed
+        return generate_response_stream(
             user_query=user_input,
             embedding_model=st.session_state.embedding_model,
             vectorstore=st.session_state.vectorstore,
             model_pipeline=st.session_state.model_pipeline,
             use_web_search=st.session_state.use_web
         )
-        print(metaData) #debug
-        return response,metaData
     except Exception as e:
         st.error(f"Error generating response: {str(e)}")
-        return f"I encountered an error: {str(e)}"
+        return ResponseStream.completed(f"I encountered an error: {str(e)}", [])
 
 # ------------- UI COMPONENTS ------------- 
 def render_sidebar():
@@ -1328,6 +1333,32 @@ def change_theme(theme):
         save_user_data(st.session_state.user_data)
     st.rerun()
 
+def render_user_message(content, timestamp):
+    """Render a single user bubble, as in render_chat_history()."""
+    st.markdown(f"""
+    <div class="chat-message user-message">
+        <div class="avatar user-avatar">U</div>
+        <div class="message-content">
+            <p>{content}</p>
+            <div class="chat-timestamp">{timestamp}</div>
+        </div>
+    </div>
+    """, unsafe_allow_html=True)
+
+def render_streaming_reply(placeholder, text, done):
+    """Render a partial bot answer into placeholder, with a cursor while it is still generating."""
+    cursor = "" if done else "▌"
+    placeholder.markdown(f"""
+    <div class="chat-message bot-message">
+        <div class="avatar bot-avatar">M</div>
+        <div class="message-content">
+            <div class="response-header" style="font-weight: bold; color: {'#0076A8' if st.session_state.theme == 'light' else '#0097E6'};">🤖 MatBot:</div>
+            <div class="response-content">{text}{cursor}</div>
+            <div class="chat-timestamp">{get_timestamp()}</div>
+        </div>
+    </div>
+    """, unsafe_allow_html=True)
+
 def process_user_input(user_input):
     """Process user input and add to the CURRENT selected chat only."""
     # Get current chat
@@ -1346,17 +1377,38 @@ def process_user_input(user_input):
         'timestamp': get_timestamp()
     })
     
+    # Show the question and stream the answer below it; the full history is
+    # re-rendered with source formatting on the rerun at the end
+    render_user_message(display_input, st.session_state.sessions[current_session][-1]['timestamp'])
+    reply_placeholder = st.empty()
+
     # Generate bot response with the full context
-    with st.spinner("MATBOT is thinking..."):
-        bot_response, metadata = get_bot_response(user_input)
-        
-        # Add bot response with metadata
-        st.session_state.sessions[current_session].append({
-            'role': 'assistant',
-            'content': bot_response,
-            'timestamp': get_timestamp(),
-            'metadata': metadata
-        })
+    stream = None
+    try:
+        with st.spinner("MATBOT is thinking..."):
+            stream = get_bot_response_stream(user_input)
+            deltas = iter(stream)
+            first_delta = next(deltas, "")  # retrieval and prompt processing end here
+            render_streaming_reply(reply_placeholder, first_delta, done=False)
+        for _ in deltas:
+            render_streaming_reply(reply_placeholder, stream.text, done=False)
+        bot_response, metadata = stream.result()
+    except Exception as e:
+        st.error(f"Error generating response: {str(e)}")
+        bot_response, metadata = f"I encountered an error: {str(e)}", []
+    finally:
+        # A rerun (new input, button click) interrupts the loop above; stop generating for it
+        if stream is not None:
+            stream.close()
+    render_streaming_reply(reply_placeholder, bot_response, done=True)
+
+    # Add bot response with metadata
+    st.session_state.sessions[current_session].append({
+        'role': 'assistant',
+        'content': bot_response,
+        'timestamp': get_timestamp(),
+        'metadata': metadata
+    })
     
     # Save user data if logged in
     if st.session_state.logged_in:
@@ -0,0 +1,140 @@
+import re
+import zlib
+import numpy as np
+from collections import defaultdict
+from typing import List, Tuple
+from langchain.schema import Document
+
+# MinHash hashing is done modulo the Mersenne prime 2^31 - 1 so that a * h + b
+# never overflows uint64.
+_PRIME = np.uint64((1 << 31) - 1)
+_TOKEN = re.compile(r"\w+")
+
+# -------------------- MinHash --------------------
+def shingles(text: str, size: int = 5) -> set:
+    """
+    Hashes the word n-grams of a text.
+    Returns:
+        set: CRC32 values of every lowercase word `size`-gram (the whole text if shorter).
+    """
+    tokens = _TOKEN.findall(text.lower())
+    if len(tokens) < size:
+        return {zlib.crc32(" ".join(tokens).encode("utf-8"))}
+    return {zlib.crc32(" ".join(tokens[i:i + size]).encode("utf-8")) for i in range(len(tokens) - size + 1)}
+
+
+class MinHasher:
+    """Computes fixed-length MinHash signatures with seeded universal hash functions."""
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, int(_PRIME), size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, int(_PRIME), size=num_perm, dtype=np.uint64)
+
+    def signature(self, shingle_set: set) -> np.ndarray:
+        hashes = np.fromiter(shingle_set, dtype=np.uint64, count=len(shingle_set)) % _PRIME
+        # Values are < 2^31, so uint32 halves the memory of the signature matrix
+        return ((np.outer(hashes, self.a) + self.b) % _PRIME).min(axis=0).astype(np.uint32)
+
+
+# -------------------- LSH Dedup --------------------
+def find_near_duplicates(texts: List[str], threshold: float = 0.85, num_perm: int = 128,
+                         bands: int = 16) -> List[int]:
+    """
+    Groups near-identical texts with MinHash + LSH banding.
+
+    Texts that share a band bucket are candidates; a candidate pair is merged
+    only if its estimated Jaccard similarity reaches the threshold.
+    Args:
+        texts (List[str]): Chunk texts.
+        threshold (float): Minimum estimated Jaccard similarity of word 5-grams.
+        num_perm (int): Signature length.
+        bands (int): LSH bands; num_perm must be divisible by it.
+    Returns:
+        List[int]: For every text, the index of the first text of its group.
+    """
+    rows = num_perm // bands
+    hasher = MinHasher(num_perm)
+    signatures = np.stack([hasher.signature(shingles(text)) for text in texts]) if texts else np.zeros((0, num_perm))
+
+    parent = list(range(len(texts)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(bands):
+        buckets = defaultdict(list)
+        for i, key in enumerate(map(bytes, signatures[:, band * rows:(band + 1) * rows])):
+            buckets[key].append(i)
+        for members in buckets.values():
+            # Compare each member with one representative per group already in the bucket
+            representatives = [members[0]]
+            for other in members[1:]:
+                for rep in representatives:
+                    root_a, root_b = find(rep), find(other)
+                    if root_a == root_b or np.mean(signatures[rep] == signatures[other]) >= threshold:
+                        # The smaller index wins so the earliest chunk stays the representative
+                        parent[max(root_a, root_b)] = min(root_a, root_b)
+                        break
+                else:
+                    representatives.append(other)
+
+    return [find(i) for i in range(len(texts))]
+
+
+def dedup_chunks(chunks: List[Document], threshold: float = 0.85) -> Tuple[List[Document], dict]:
+    """
+    Collapses near-duplicate chunks into their first occurrence.
+
+    The kept chunk records every place its text appeared in "duplicate_sources"
+    ("file:page;file:page", since Chroma metadata values must be scalars) and
+    the group size in "duplicate_count".
+    Args:
+        chunks (List[Document]): Split documents.
+        threshold (float): Minimum estimated Jaccard similarity to merge two chunks.
+    Returns:
+        tuple: Kept chunks in original order, and a report dict.
+    """
+    groups = find_near_duplicates([chunk.page_content for chunk in chunks], threshold)
+    members = defaultdict(list)
+    for i, root in enumerate(groups):
+        members[root].append(i)
+
+    kept = []
+    for i, chunk in enumerate(chunks):
+        if groups[i] != i:
+            continue
+        if len(members[i]) > 1:
+            sources = []
+            for j in members[i]:
+                location = f'{chunks[j].metadata["source"]}:{chunks[j].metadata.get("page", 0)}'
+                if location not in sources:
+                    sources.append(location)
+            chunk.metadata["duplicate_sources"] = ";".join(sources)
+            chunk.metadata["duplicate_count"] = len(members[i])
+        kept.append(chunk)
+
+    chars_before = sum(len(chunk.page_content) for chunk in chunks)
+    chars_after = sum(len(chunk.page_content) for chunk in kept)
+    report = {
+        "chunks_before": len(chunks),
+        "chunks_after": len(kept),
+        "removed": len(chunks) - len(kept),
+        "reduction": 1 - len(kept) / len(chunks) if chunks else 0.0,
+        "chars_before": chars_before,
+        "chars_after": chars_after,
+        "duplicate_groups": sum(1 for group in members.values() if len(group) > 1)
+    }
+    return kept, report
+
+
+def print_dedup_report(report: dict, dim: int = 768):
+    """Prints the index-size effect of dedup_chunks(), counting float32 vectors of size dim."""
+    saved_mb = report["removed"] * dim * 4 / 2 ** 20
+    print(f"🧹 Dedup: {report['chunks_before']} -> {report['chunks_after']} chunks "
+          f"({report['reduction']:.1%} fewer, {report['duplicate_groups']} duplicate groups), "
+          f"~{saved_mb:.1f} MB of vectors and "
+          f"{(report['chars_before'] - report['chars_after']) / 2 ** 20:.1f} MB of text saved.")
@@ -1,59 +1,161 @@
 import os
+import sys
 import torch
-import pickle
-from langchain.document_loaders import PyMuPDFLoader
+import argparse
+from functools import partial
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.vectorstores import Chroma
 
-# Step 1: Load all PDFs from input directory
-pdf_dir = "data/DatasetMatlab"
-all_docs = []
-
-for file in os.listdir(pdf_dir):
-    if file.endswith(".pdf"):
-        full_path = os.path.join(pdf_dir, file)
-        loader = PyMuPDFLoader(full_path)
-        docs = loader.load()
-        if not docs:
-            print(f"⚠️ No text extracted from: {file}")
+# Shared with the query server (server/app.py)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chunk_store import export_collection
+from vector_backends import build_unit_matrix, build_quantized_index, QUANT_MODES
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+from lexical_index import build_lexical_index
+from function_index import build_function_index
+from dedup import dedup_chunks, print_dedup_report
+from ingest import (list_source_files, load_files, assign_chunk_ids, index_settings, record_manifest, sync_index,
+                    upsert_documents)
+from parallel_embed import embed_and_upsert
+from pipeline import stream_index
+
+MODEL_NAME = "BAAI/bge-base-en-v1.5"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embed the MATLAB PDF manuals into a Chroma index.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only extract, embed and upsert files that changed since the last run.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Processes used for PDF page extraction (1 = serial).")
+    parser.add_argument("--embed-workers", type=int, default=0,
+                        help="CPU processes that shard the embedding step (0 = single in-process model).")
+    parser.add_argument("--batch-size", type=int, default=64,
+                        help="Encode batch size per embedding worker.")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Torch threads per embedding worker (default: cores / embed-workers).")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Bounded-memory load -> split -> embed -> upsert pipeline that resumes after a crash.")
+    parser.add_argument("--stream-batch", type=int, default=256,
+                        help="Chunks per embed/upsert batch in streaming mode.")
+    parser.add_argument("--embed-cache", default="output/embedding_cache.sqlite",
+                        help="On-disk embedding cache keyed by model and chunk text ('' disables it).")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Collapse near-duplicate chunks (MinHash/LSH) before embedding; full builds only.")
+    parser.add_argument("--dedup-threshold", type=float, default=0.85,
+                        help="Estimated Jaccard similarity above which two chunks are merged.")
+    args = parser.parse_args()
+
+    pdf_dir = "data/DatasetMatlab"
+    persist_dir = "output/chroma_index"
+    manifest_path = "output/manifest.json"
+    checkpoint_path = "output/checkpoint.json"
+    chunk_store_dir = "output/chunk_store"
+    lexical_index_dir = "output/lexical_index"
+    function_index_path = "output/function_index.json"
+    extensions = (".pdf",)
+
+    chunk_size, chunk_overlap = 512, 64
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    settings = index_settings(MODEL_NAME, chunk_size, chunk_overlap, extensions)
+
+    # Set up HuggingFace embedding model (BGE base)
+    embedding_model = HuggingFaceEmbeddings(
+        model_name=MODEL_NAME,
+        model_kwargs={"device": "cuda" if torch.cuda.is_available() else "cpu"}
+    )
+
+    # Re-chunking only pays for chunk texts that were never embedded before
+    cache = EmbeddingCache(args.embed_cache, MODEL_NAME) if args.embed_cache else None
+    if cache:
+        embedding_model = CachedEmbeddings(embedding_model, cache)
+
+    if args.embed_workers > 0:
+        upsert = partial(embed_and_upsert, model_name=MODEL_NAME, workers=args.embed_workers,
+                         batch_size=args.batch_size, threads=args.threads, cache=cache)
+    else:
+        upsert = upsert_documents
+
+    if args.dedup and (args.streaming or args.incremental):
+        # Duplicates span files, which the per-file manifest and checkpoint cannot represent
+        print("⚠️ --dedup needs the whole corpus at once and is ignored with --streaming/--incremental.")
+
+    if args.streaming:
+        # Steps 1-4: Stream pages through split, embed and upsert with a resumable checkpoint
+        os.makedirs("output", exist_ok=True)
+        files = list_source_files(pdf_dir, extensions)
+        vectorstore = Chroma(persist_directory=persist_dir, embedding_function=embedding_model)
+        n_upserted = stream_index(pdf_dir, files, splitter, embedding_model, vectorstore,
+                                  checkpoint_path, manifest_path, batch_size=args.stream_batch,
+                                  settings=settings)
+        vectorstore.persist()
+        print(f"✅ Streaming build done: {n_upserted} chunks embedded.")
+    elif args.incremental:
+        # Steps 1-4: Re-index only new, modified and removed files
+        vectorstore = Chroma(persist_directory=persist_dir, embedding_function=embedding_model)
+        n_added, n_deleted = sync_index(pdf_dir, extensions, splitter, vectorstore, manifest_path,
+                                        args.workers, upsert, settings)
+        vectorstore.persist()
+        print(f"✅ Incremental update done: {n_added} chunks embedded, {n_deleted} deleted.")
+    else:
+        # Step 1: Load all PDFs from input directory
+        files = list_source_files(pdf_dir, extensions)
+        all_docs = load_files(pdf_dir, files, args.workers)
+
+        print(f"✅ Loaded {len(all_docs)} total pages from {len(files)} PDFs.")
+
+        # Step 2: Split documents into chunks
+        chunks = splitter.split_documents(all_docs)
+
+        print(f"✅ Split into {len(chunks)} total chunks.")
+
+        if args.dedup:
+            chunks, report = dedup_chunks(chunks, args.dedup_threshold)
+            print_dedup_report(report)
+        ids = assign_chunk_ids(chunks)
+
+        # Steps 3-4: Create Chroma vectorstore and persist it
+        if args.embed_workers > 0:
+            vectorstore = Chroma(persist_directory=persist_dir, embedding_function=embedding_model)
+            upsert(vectorstore, chunks, ids)
         else:
-            print(f"✅ Extracted {len(docs)} pages from {file}")
+            vectorstore = Chroma.from_documents(
+                documents=chunks,
+                embedding=embedding_model,
+                ids=ids,
+                persist_directory=persist_dir
+            )
+        vectorstore.persist()
+        record_manifest(manifest_path, pdf_dir, files, chunks, ids, settings)
+
+    print(f"✅ Embeddings saved to Chroma DB at: {persist_dir}")
+    if cache:
+        print(f"♻️ Embedding cache: {embedding_model.hits} hits, {embedding_model.misses} misses")
 
-        for doc in docs:
-            doc.metadata["source"] = file  # Add filename as metadata
-        all_docs.extend(docs)
+    # Step 5: Export text, metadata and float16 vectors to a memory-mapped chunk store
+    n_exported = export_collection(vectorstore, chunk_store_dir)
 
-print(f"✅ Loaded {len(all_docs)} total pages from {len(os.listdir(pdf_dir))} PDFs.")
+    # Normalised vectors for the in-process search backend (MATBOT_VECTOR_BACKEND=numpy),
+    # and their quantized codes (numpy-int8 / numpy-binary), all rebuilt for the new rows
+    if n_exported:
+        build_unit_matrix(chunk_store_dir)
+        for mode in QUANT_MODES:
+            build_quantized_index(chunk_store_dir, mode)
 
-# Step 2: Split documents into chunks
-splitter = RecursiveCharacterTextSplitter(chunk_size=512, chunk_overlap=64)
-chunks = splitter.split_documents(all_docs)
+    print(f"✅ {n_exported} chunks saved to chunk store at: {chunk_store_dir}")
 
-print(f"✅ Split into {len(chunks)} total chunks.")
+    # Step 6: Build the BM25 inverted index used for hybrid retrieval
+    n_terms = build_lexical_index(chunk_store_dir, lexical_index_dir)
 
-# Step 3: Set up HuggingFace embedding model (BGE base)
-embedding_model = HuggingFaceEmbeddings(
-    model_name="BAAI/bge-base-en-v1.5",
-    model_kwargs={"device": "cuda" if torch.cuda.is_available() else "cpu"}
-)
+    print(f"✅ Lexical index with {n_terms} terms saved at: {lexical_index_dir}")
 
-# Step 4: Create Chroma vectorstore and persist it
-persist_dir = "output/chroma_index"
-vectorstore = Chroma.from_documents(
-    documents=chunks,
-    embedding=embedding_model,
-    persist_directory=persist_dir
-)
-vectorstore.persist()
+    # Step 7: Map function names to their reference manual pages for the lookup fast path
+    n_functions = build_function_index(chunk_store_dir, function_index_path)
 
-print(f"✅ Embeddings saved to Chroma DB at: {persist_dir}")
+    print(f"✅ Function index with {n_functions} functions saved at: {function_index_path}")
 
-# Step 5 (Optional): Save text and metadata separately for later reference
-os.makedirs("output", exist_ok=True)
-with open("output/chunks.pkl", "wb") as f:
-    pickle.dump([chunk.page_content for chunk in chunks], f)
-with open("output/metadata.pkl", "wb") as f:
-    pickle.dump([chunk.metadata for chunk in chunks], f)
 
-print("✅ Chunk data and metadata saved.")
+# Worker pools may spawn fresh interpreters that re-import this file
+if __name__ == "__main__":
+    main()
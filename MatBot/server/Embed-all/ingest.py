@@ -0,0 +1,234 @@
+import os
+from collections import defaultdict
+from typing import Dict, List, Sequence
+from langchain.document_loaders import PyMuPDFLoader, TextLoader
+from langchain.schema import Document
+
+from manifest import IndexManifest, chunk_id, file_sha256
+from parallel_extract import extract_pdfs
+
+# Chroma rejects very large single writes, so upserts are sent in slices.
+ADD_BATCH_SIZE = 1000
+
+# -------------------- Loading --------------------
+def list_source_files(pdf_dir: str, extensions: Sequence[str]) -> List[str]:
+    """
+    Lists the supported files of the input directory in a deterministic order.
+    Args:
+        pdf_dir (str): Input directory.
+        extensions (Sequence[str]): File extensions to include, e.g. (".pdf", ".txt").
+    Returns:
+        List[str]: Sorted file names.
+    """
+    return sorted(f for f in os.listdir(pdf_dir) if f.endswith(tuple(extensions)))
+
+
+def load_file(pdf_dir: str, file: str) -> List[Document]:
+    """
+    Loads one PDF or TXT file and tags every document with its file name.
+    Args:
+        pdf_dir (str): Input directory.
+        file (str): File name inside pdf_dir.
+    Returns:
+        List[Document]: One document per PDF page, or one per text file.
+    """
+    full_path = os.path.join(pdf_dir, file)
+
+    if file.endswith(".pdf"):
+        loader = PyMuPDFLoader(full_path)
+    elif file.endswith(".txt"):
+        loader = TextLoader(full_path, encoding="utf-8")
+    else:
+        return []  # Skip unsupported files
+
+    docs = loader.load()
+    if not docs:
+        print(f"⚠️ No text extracted from: {file}")
+    else:
+        print(f"✅ Extracted {len(docs)} document(s) from {file}")
+
+    for doc in docs:
+        doc.metadata["source"] = file  # Add filename as metadata
+    return docs
+
+
+def load_files(pdf_dir: str, files: List[str], workers: int = 1) -> List[Document]:
+    """
+    Loads several files, extracting PDF pages in parallel when workers > 1.
+    Args:
+        pdf_dir (str): Input directory.
+        files (List[str]): File names, in the desired output order.
+        workers (int): Process count for PDF extraction; 1 keeps the serial loader.
+    Returns:
+        List[Document]: Documents in file order, then page order.
+    """
+    if workers <= 1:
+        all_docs = []
+        for file in files:
+            all_docs.extend(load_file(pdf_dir, file))
+        return all_docs
+
+    pdf_docs = defaultdict(list)
+    for doc in extract_pdfs(pdf_dir, [f for f in files if f.endswith(".pdf")], workers):
+        pdf_docs[doc.metadata["source"]].append(doc)
+
+    all_docs = []
+    for file in files:
+        all_docs.extend(pdf_docs[file] if file.endswith(".pdf") else load_file(pdf_dir, file))
+    return all_docs
+
+
+# -------------------- Chunk IDs --------------------
+def assign_chunk_ids(chunks: List[Document], seen: Dict = None) -> List[str]:
+    """
+    Derives content-hashed IDs for chunks, so an unchanged chunk always maps to
+    the same vector and never needs to be embedded again.
+    Args:
+        chunks (List[Document]): Split documents.
+        seen (Dict): Occurrence counters to carry over when a file is processed in pieces.
+    Returns:
+        List[str]: One ID per chunk, in the same order.
+    """
+    seen = defaultdict(int) if seen is None else seen
+    ids = []
+    for chunk in chunks:
+        key = (chunk.metadata["source"], chunk.metadata.get("page", 0), chunk.page_content)
+        ids.append(chunk_id(*key, occurrence=seen[key]))
+        seen[key] += 1
+    return ids
+
+
+def current_hashes(pdf_dir: str, files: List[str], manifest: IndexManifest) -> Dict[str, Dict]:
+    """
+    Hashes the input files, reusing the manifest hash when size and mtime match.
+    Returns:
+        Dict[str, Dict]: File name -> {"sha256", "size", "mtime"}.
+    """
+    hashes = {}
+    for file in files:
+        stat = os.stat(os.path.join(pdf_dir, file))
+        sha = manifest.known_sha256(file, stat.st_size, stat.st_mtime)
+        if sha is None:
+            sha = file_sha256(os.path.join(pdf_dir, file))
+        hashes[file] = {"sha256": sha, "size": stat.st_size, "mtime": stat.st_mtime}
+    return hashes
+
+
+def index_settings(model_name: str, chunk_size: int, chunk_overlap: int, extensions: Sequence[str]) -> Dict:
+    """
+    Settings that determine the chunks and vectors of an index. Recorded in the
+    manifest; an incremental run with different settings re-indexes every file.
+    """
+    return {"model": model_name, "chunk_size": chunk_size, "chunk_overlap": chunk_overlap,
+            "extensions": sorted(extensions)}
+
+
+def record_manifest(manifest_path: str, pdf_dir: str, files: List[str], chunks: List[Document], ids: List[str],
+                    settings: Dict = None):
+    """
+    Writes a fresh manifest after a full rebuild so later runs can be incremental.
+    """
+    manifest = IndexManifest(manifest_path)
+    manifest.files = {}
+    manifest.settings = settings or {}
+    ids_by_source = defaultdict(list)
+    for chunk, cid in zip(chunks, ids):
+        ids_by_source[chunk.metadata["source"]].append(cid)
+
+    for file, info in current_hashes(pdf_dir, files, manifest).items():
+        manifest.update_file(file, info["sha256"], ids_by_source.get(file, []), info["size"], info["mtime"])
+    manifest.save()
+
+
+def upsert_documents(vectorstore, docs: List[Document], ids: List[str]):
+    """Upserts documents into the vectorstore in slices of ADD_BATCH_SIZE."""
+    for start in range(0, len(docs), ADD_BATCH_SIZE):
+        vectorstore.add_documents(
+            docs[start:start + ADD_BATCH_SIZE],
+            ids=ids[start:start + ADD_BATCH_SIZE]
+        )
+
+
+# -------------------- Incremental Sync --------------------
+def sync_index(pdf_dir: str, extensions: Sequence[str], splitter, vectorstore, manifest_path: str,
+               workers: int = 1, upsert=upsert_documents, settings: Dict = None):
+    """
+    Brings the vectorstore in line with the input directory, touching only what changed.
+
+    New and modified files are re-extracted and re-split; only chunks whose
+    content-hashed ID is not already indexed are embedded. Vectors of removed
+    files and of chunks that disappeared from modified files are deleted.
+    Args:
+        pdf_dir (str): Input directory.
+        extensions (Sequence[str]): File extensions to index.
+        splitter: Text splitter used for the index.
+        vectorstore: Chroma vectorstore to update.
+        manifest_path (str): Path of the JSON manifest.
+        workers (int): Process count for PDF page extraction.
+        upsert: Callable(vectorstore, docs, ids) that embeds and writes new chunks.
+        settings (Dict): index_settings() of this run. When they differ from the
+            manifest's, every indexed chunk is deleted and all files re-indexed.
+    Returns:
+        tuple: Number of chunks added and deleted.
+    """
+    manifest = IndexManifest(manifest_path)
+    n_reset = 0
+    if settings is not None and manifest.settings != settings:
+        if manifest.files:
+            # Same text under another model or splitter must not keep its old vectors
+            print("⚠️ Index settings changed since the last run, re-indexing every file.")
+            for file in list(manifest.files):
+                stale_ids = manifest.chunk_ids(file)
+                if stale_ids:
+                    vectorstore.delete(ids=stale_ids)
+                n_reset += len(stale_ids)
+            manifest.files = {}
+        manifest.settings = settings
+        manifest.save()
+    files = list_source_files(pdf_dir, extensions)
+    hashes = current_hashes(pdf_dir, files, manifest)
+    added, changed, removed = manifest.diff({f: info["sha256"] for f, info in hashes.items()})
+
+    print(f"🔄 {len(added)} new, {len(changed)} modified, {len(removed)} removed, "
+          f"{len(files) - len(added) - len(changed)} unchanged file(s).")
+
+    # Refresh size/mtime of files whose content did not change (e.g. after a copy)
+    for file in files:
+        if file not in added and file not in changed:
+            info = hashes[file]
+            manifest.update_file(file, info["sha256"], manifest.chunk_ids(file), info["size"], info["mtime"])
+
+    n_added, n_deleted = 0, n_reset
+    for file in removed:
+        stale_ids = manifest.chunk_ids(file)
+        if stale_ids:
+            vectorstore.delete(ids=stale_ids)
+        n_deleted += len(stale_ids)
+        manifest.remove_file(file)
+        manifest.save()
+        print(f"🗑️ Removed {len(stale_ids)} chunks of {file}")
+
+    for file in added + changed:
+        chunks = splitter.split_documents(load_files(pdf_dir, [file], workers))
+        ids = assign_chunk_ids(chunks)
+        old_ids = set(manifest.chunk_ids(file))
+        new_ids = set(ids)
+
+        stale_ids = sorted(old_ids - new_ids)
+        if stale_ids:
+            vectorstore.delete(ids=stale_ids)
+
+        fresh = [(cid, chunk) for cid, chunk in zip(ids, chunks) if cid not in old_ids]
+        upsert(vectorstore, [c for _, c in fresh], [cid for cid, _ in fresh])
+
+        # Save after every file so an interrupted run only redoes the file in progress
+        info = hashes[file]
+        manifest.update_file(file, info["sha256"], ids, info["size"], info["mtime"])
+        manifest.save()
+        n_added += len(fresh)
+        n_deleted += len(stale_ids)
+        print(f"✅ {file}: {len(fresh)} chunks embedded, {len(stale_ids)} deleted, "
+              f"{len(ids) - len(fresh)} reused")
+
+    manifest.save()
+    return n_added, n_deleted
@@ -0,0 +1,94 @@
+import os
+import json
+import hashlib
+from typing import Dict, List, Tuple
+
+# -------------------- Content Hashing --------------------
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """
+    Hashes a file's bytes without reading it into memory at once.
+    Args:
+        path (str): Path to the file.
+        block_size (int): Number of bytes read per iteration.
+    Returns:
+        str: Hex SHA-256 digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(source: str, page, text: str, occurrence: int = 0) -> str:
+    """
+    Builds a stable vector ID from a chunk's source, page and text.
+    Args:
+        source (str): File name the chunk came from.
+        page: Page number (or 0 for text files).
+        text (str): Chunk text.
+        occurrence (int): Index among identical chunks on the same page.
+    Returns:
+        str: Hex SHA-1 digest used as the Chroma document ID.
+    """
+    key = f"{source}\0{page}\0{occurrence}\0{text}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+# -------------------- Manifest --------------------
+class IndexManifest:
+    """
+    Records, per source file, the content hash and the chunk IDs stored in the
+    vector index so that later runs only touch what changed, along with the
+    settings (embedding model, splitter, file types) the chunks were built with.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files: Dict[str, Dict] = {}
+        self.settings: Dict = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.files = state.get("files", {})
+            self.settings = state.get("settings", {})
+
+    def diff(self, current: Dict[str, str]) -> Tuple[List[str], List[str], List[str]]:
+        """
+        Compares current file hashes against the manifest.
+        Args:
+            current (Dict[str, str]): File name -> SHA-256 of the files on disk.
+        Returns:
+            tuple: Sorted lists of added, changed and removed file names.
+        """
+        added = sorted(name for name in current if name not in self.files)
+        changed = sorted(
+            name for name in current
+            if name in self.files and self.files[name]["sha256"] != current[name]
+        )
+        removed = sorted(name for name in self.files if name not in current)
+        return added, changed, removed
+
+    def chunk_ids(self, name: str) -> List[str]:
+        return list(self.files.get(name, {}).get("chunk_ids", []))
+
+    def known_sha256(self, name: str, size: int, mtime: float):
+        """Returns the recorded hash if the file's size and mtime are unchanged, else None."""
+        entry = self.files.get(name)
+        if entry and entry.get("size") == size and entry.get("mtime") == mtime:
+            return entry["sha256"]
+        return None
+
+    def update_file(self, name: str, sha256: str, chunk_ids: List[str], size: int = None, mtime: float = None):
+        self.files[name] = {"sha256": sha256, "size": size, "mtime": mtime, "chunk_ids": list(chunk_ids)}
+
+    def remove_file(self, name: str):
+        self.files.pop(name, None)
+
+    def save(self):
+        """Writes the manifest atomically so an interrupted run never leaves it half-written."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"settings": self.settings, "files": self.files}, f, indent=1)
+        os.replace(tmp_path, self.path)
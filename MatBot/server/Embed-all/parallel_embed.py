@@ -0,0 +1,93 @@
+import os
+import multiprocessing
+from typing import List, Tuple
+from langchain.schema import Document
+
+# Chunks per shard; each finished shard becomes one bulk upsert into Chroma.
+SHARD_SIZE = 1024
+
+_model = None
+_batch_size = 64
+
+# -------------------- Worker --------------------
+def _init_worker(model_name: str, batch_size: int, threads: int):
+    """
+    Loads a private copy of the embedding model in each worker process and pins
+    its intra-op thread count, so N workers do not oversubscribe the CPU.
+    """
+    global _model, _batch_size
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(threads)
+    _model = SentenceTransformer(model_name, device="cpu")
+    _batch_size = batch_size
+
+
+def _embed_shard(shard: Tuple[int, List[str]]) -> Tuple[int, list]:
+    n, texts = shard
+    # Same preprocessing as HuggingFaceEmbeddings.embed_documents, so vectors match
+    texts = [text.replace("\n", " ") for text in texts]
+    vectors = _model.encode(texts, batch_size=_batch_size, convert_to_numpy=True)
+    return n, vectors.tolist()
+
+
+# -------------------- Sharded Embedding --------------------
+def embed_and_upsert(vectorstore, docs: List[Document], ids: List[str],
+                     model_name: str = "BAAI/bge-base-en-v1.5", workers: int = 4,
+                     batch_size: int = 64, threads: int = None, shard_size: int = SHARD_SIZE,
+                     cache=None):
+    """
+    Embeds chunks across several CPU worker processes and bulk-upserts the vectors.
+
+    Chunks are cut into shards of shard_size; each worker owns its own BGE model
+    and encodes whole shards. As each shard finishes it is written to the Chroma
+    collection with a single upsert carrying the precomputed embeddings.
+    Args:
+        vectorstore: Chroma vectorstore to write to.
+        docs (List[Document]): Chunks to embed.
+        ids (List[str]): Chunk IDs, aligned with docs.
+        model_name (str): SentenceTransformer model to load in every worker.
+        workers (int): Number of worker processes.
+        batch_size (int): Encode batch size inside each worker.
+        threads (int): Torch threads per worker (defaults to cpu_count // workers).
+        shard_size (int): Chunks per shard and per upsert.
+        cache: Optional EmbeddingCache; cached chunks skip the workers entirely.
+    """
+    if not docs:
+        return
+    texts = [doc.page_content for doc in docs]
+
+    def upsert(indices: List[int], vectors: list):
+        vectorstore._collection.upsert(
+            ids=[ids[i] for i in indices],
+            embeddings=vectors,
+            metadatas=[docs[i].metadata for i in indices],
+            documents=[texts[i] for i in indices]
+        )
+
+    cached = cache.get_many(texts) if cache else [None] * len(texts)
+    hits = [i for i, vector in enumerate(cached) if vector is not None]
+    for start in range(0, len(hits), shard_size):
+        part = hits[start:start + shard_size]
+        upsert(part, [cached[i] for i in part])
+    if hits:
+        print(f"♻️ Upserted {len(hits)} chunks from the embedding cache")
+
+    misses = [i for i, vector in enumerate(cached) if vector is None]
+    if not misses:
+        return
+    shards = [misses[start:start + shard_size] for start in range(0, len(misses), shard_size)]
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+    print(f"🧮 Embedding {len(misses)} chunks in {len(shards)} shards with "
+          f"{workers} workers x {threads} threads (batch size {batch_size})...")
+
+    # spawn gives every worker a clean torch runtime instead of a forked copy of ours
+    ctx = multiprocessing.get_context("spawn")
+    tasks = [(n, [texts[i] for i in shard]) for n, shard in enumerate(shards)]
+    with ctx.Pool(workers, initializer=_init_worker, initargs=(model_name, batch_size, threads)) as pool:
+        for done, (n, vectors) in enumerate(pool.imap_unordered(_embed_shard, tasks), 1):
+            upsert(shards[n], vectors)
+            if cache:
+                cache.put_many(tasks[n][1], vectors)
+            print(f"✅ Upserted shard {done}/{len(shards)} ({len(vectors)} chunks)")
@@ -0,0 +1,92 @@
+import os
+import fitz  # PyMuPDF, the same backend PyMuPDFLoader uses
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Tuple
+from langchain.schema import Document
+
+# Pages handed to a worker per task; small enough to balance one huge manual
+# (matlab_ref.pdf) across all cores, large enough to amortise reopening the PDF.
+PAGES_PER_TASK = 64
+
+# -------------------- Worker --------------------
+def _extract_page_range(full_path: str, file: str, start: int, stop: int) -> List[Tuple[str, dict]]:
+    """
+    Extracts pages [start, stop) of one PDF inside a worker process.
+
+    Metadata mirrors PyMuPDFLoader (source, file_path, page, total_pages plus the
+    PDF's string/int metadata), with "source" replaced by the file name exactly
+    like the serial loader does.
+    Returns:
+        List[Tuple[str, dict]]: (page_content, metadata) per page, in page order.
+    """
+    pages = []
+    with fitz.open(full_path) as pdf:
+        pdf_metadata = {k: v for k, v in pdf.metadata.items() if type(v) in [str, int]}
+        for number in range(start, min(stop, len(pdf))):
+            page = pdf[number]
+            metadata = dict(
+                {"source": full_path, "file_path": full_path, "page": page.number, "total_pages": len(pdf)},
+                **pdf_metadata
+            )
+            metadata["source"] = file  # Add filename as metadata
+            pages.append((page.get_text(), metadata))
+    return pages
+
+
+def _run_task(task: Tuple[str, str, int, int]) -> List[Tuple[str, dict]]:
+    return _extract_page_range(*task)
+
+
+# -------------------- Parallel Extraction --------------------
+def extract_pdfs(pdf_dir: str, files: List[str], workers: int = None,
+                 pages_per_task: int = PAGES_PER_TASK) -> List[Document]:
+    """
+    Extracts the pages of many PDFs with a process pool.
+
+    Every PDF is cut into page ranges and all ranges are spread over the pool,
+    so one large manual no longer pins a single core. Results are reassembled
+    in file order, then page order, matching the serial loader.
+    Args:
+        pdf_dir (str): Input directory.
+        files (List[str]): PDF file names, in the desired output order.
+        workers (int): Process count (defaults to os.cpu_count()).
+        pages_per_task (int): Page range size per task.
+    Returns:
+        List[Document]: One document per page.
+    """
+    tasks, task_files = [], []
+    for file in files:
+        full_path = os.path.join(pdf_dir, file)
+        with fitz.open(full_path) as pdf:
+            page_count = len(pdf)
+        for start in range(0, page_count, pages_per_task):
+            tasks.append((full_path, file, start, start + pages_per_task))
+            task_files.append(file)
+
+    pages_by_file = {file: 0 for file in files}
+    all_docs = []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        # map() yields results in submission order, which keeps the output deterministic
+        for file, pages in zip(task_files, pool.map(_run_task, tasks)):
+            all_docs.extend(Document(page_content=text, metadata=metadata) for text, metadata in pages)
+            pages_by_file[file] += len(pages)
+
+    for file in files:
+        if not pages_by_file[file]:
+            print(f"⚠️ No text extracted from: {file}")
+        else:
+            print(f"✅ Extracted {pages_by_file[file]} document(s) from {file}")
+    return all_docs
+
+
+def iter_pdf_pages(pdf_dir: str, file: str, pages_per_read: int = PAGES_PER_TASK) -> Iterator[Document]:
+    """
+    Lazily yields the pages of one PDF, holding at most pages_per_read pages in memory.
+    Metadata is identical to extract_pdfs().
+    """
+    full_path = os.path.join(pdf_dir, file)
+    with fitz.open(full_path) as pdf:
+        page_count = len(pdf)
+    for start in range(0, page_count, pages_per_read):
+        for text, metadata in _extract_page_range(full_path, file, start, start + pages_per_read):
+            yield Document(page_content=text, metadata=metadata)
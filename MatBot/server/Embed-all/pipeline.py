@@ -0,0 +1,263 @@
+import os
+import json
+import queue
+import threading
+from collections import defaultdict
+from typing import Dict, Iterator, List, Sequence, Set, Tuple
+from langchain.schema import Document
+
+from ingest import assign_chunk_ids, current_hashes, load_file
+from manifest import IndexManifest
+from parallel_extract import iter_pdf_pages
+
+# Marks the end of a stage's output on its queue.
+_DONE = object()
+
+# -------------------- Checkpoint --------------------
+class Checkpoint:
+    """
+    Progress of a streaming build: finished files with their chunk IDs, how
+    many chunks of the file in progress have already been upserted, and the
+    SHA-256 each file had when it was indexed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done_files = {}
+        self.current_file = None
+        self.current_ids: List[str] = []
+        self.file_sha256: Dict[str, str] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.done_files = state["done_files"]
+            self.current_file = state["current_file"]
+            self.current_ids = state["current_ids"]
+            self.file_sha256 = state.get("file_sha256", {})
+
+    def advance(self, file: str, ids: List[str], file_finished: bool, sha256: str = None):
+        if file != self.current_file:
+            self.current_file, self.current_ids = file, []
+            self.file_sha256[file] = sha256
+        self.current_ids.extend(ids)
+        if file_finished:
+            self.done_files[file] = self.current_ids
+            self.current_file, self.current_ids = None, []
+        self.save()
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "done_files": self.done_files,
+                "current_file": self.current_file,
+                "current_ids": self.current_ids,
+                "file_sha256": self.file_sha256
+            }, f)
+        os.replace(tmp_path, self.path)
+
+    def discard_changed(self, current: Dict[str, str]) -> List[str]:
+        """
+        Forgets the progress of files whose content differs from when they were
+        indexed (or was not recorded), so they are indexed again from the start.
+        Args:
+            current (Dict[str, str]): File name -> SHA-256 of the files on disk.
+        Returns:
+            List[str]: Chunk IDs already upserted for those files, to delete.
+        """
+        stale_ids = []
+        for file in list(self.done_files):
+            if self.file_sha256.get(file) != current.get(file):
+                stale_ids.extend(self.done_files.pop(file))
+                self.file_sha256.pop(file, None)
+        if self.current_file and self.file_sha256.get(self.current_file) != current.get(self.current_file):
+            stale_ids.extend(self.current_ids)
+            self.file_sha256.pop(self.current_file, None)
+            self.current_file, self.current_ids = None, []
+        if stale_ids:
+            self.save()
+        return stale_ids
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# -------------------- Stages --------------------
+def iter_documents(pdf_dir: str, file: str) -> Iterator[Document]:
+    """Load stage: yields a file's pages one at a time instead of the whole file."""
+    if file.endswith(".pdf"):
+        yield from iter_pdf_pages(pdf_dir, file)
+    else:
+        yield from load_file(pdf_dir, file)
+
+
+def iter_batches(pdf_dir: str, files: Sequence[str], splitter, done_files: Set[str], resume_file: str,
+                 resume_count: int, batch_size: int) -> Iterator[Tuple[str, List[str], List[Document], bool]]:
+    """
+    Split stage: turns pages into ID-tagged chunk batches.
+
+    Batches never span two files; the last batch of a file is flagged so the
+    checkpoint can mark the file as finished. Files in done_files and the first
+    resume_count chunks of resume_file were upserted by an interrupted run and
+    are skipped.
+    Yields:
+        tuple: (file, chunk IDs, chunks, is_last_batch_of_file).
+    """
+    for file in files:
+        if file in done_files:
+            continue
+        skip = resume_count if file == resume_file else 0
+        if skip:
+            print(f"⏩ Resuming {file} after {skip} chunks")
+
+        seen = defaultdict(int)
+        ordinal = 0
+        ids, chunks = [], []
+        for page in iter_documents(pdf_dir, file):
+            page_chunks = splitter.split_documents([page])
+            for cid, chunk in zip(assign_chunk_ids(page_chunks, seen), page_chunks):
+                ordinal += 1
+                if ordinal <= skip:
+                    continue
+                ids.append(cid)
+                chunks.append(chunk)
+                if len(chunks) == batch_size:
+                    yield file, ids, chunks, False
+                    ids, chunks = [], []
+        yield file, ids, chunks, True
+        print(f"✅ Streamed {ordinal} chunks from {file}")
+
+
+def _run_stage(target, errors: list):
+    def run():
+        try:
+            target()
+        except BaseException as e:  # Surface worker failures in the main thread
+            errors.append(e)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def _put(q: queue.Queue, item, errors: list):
+    """Blocking put that gives up once another stage has failed."""
+    while not errors:
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: queue.Queue, errors: list):
+    """Blocking get that returns _DONE once another stage has failed."""
+    while not errors:
+        try:
+            return q.get(timeout=0.5)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+# -------------------- Streaming Build --------------------
+def stream_index(pdf_dir: str, files: Sequence[str], splitter, embedding_model, vectorstore,
+                 checkpoint_path: str, manifest_path: str, batch_size: int = 256, queue_depth: int = 4,
+                 settings: Dict = None):
+    """
+    Builds the index with a bounded-memory load -> split -> embed -> upsert pipeline.
+
+    Stages run in their own threads and talk through queues of at most
+    queue_depth batches, so a slow embedder blocks the splitter instead of
+    letting chunks pile up. At most about (2 * queue_depth + 3) * batch_size
+    chunks are alive at once, independent of corpus size. After every upsert
+    the checkpoint is saved, and a rerun resumes from it.
+    Args:
+        pdf_dir (str): Input directory.
+        files (Sequence[str]): Files to index, in order.
+        splitter: Text splitter.
+        embedding_model: Model providing embed_documents().
+        vectorstore: Chroma vectorstore to write to.
+        checkpoint_path (str): JSON checkpoint; removed once the build completes.
+        manifest_path (str): Manifest written at the end for later incremental runs.
+        batch_size (int): Chunks per embed/upsert batch.
+        queue_depth (int): Maximum batches waiting between two stages.
+        settings (Dict): index_settings() recorded in the manifest.
+    Returns:
+        int: Number of chunks upserted by this run.
+    """
+    checkpoint = Checkpoint(checkpoint_path)
+    manifest = IndexManifest(manifest_path)
+    hashes = current_hashes(pdf_dir, list(files), manifest)
+    # A file edited since the interrupted run is indexed again instead of mixing old and new chunks
+    stale_ids = checkpoint.discard_changed({file: info["sha256"] for file, info in hashes.items()})
+    if stale_ids:
+        print(f"♻️ Files changed since the checkpoint, deleting {len(stale_ids)} of their chunks")
+        vectorstore.delete(ids=stale_ids)
+    if checkpoint.done_files or checkpoint.current_file:
+        print(f"⏩ Resuming from checkpoint: {len(checkpoint.done_files)} file(s) already indexed")
+
+    # Snapshot the resume point; the checkpoint itself keeps changing while we run
+    resume_done = set(checkpoint.done_files)
+    resume_file, resume_count = checkpoint.current_file, len(checkpoint.current_ids)
+
+    split_queue = queue.Queue(maxsize=queue_depth)
+    embed_queue = queue.Queue(maxsize=queue_depth)
+    errors = []
+    upserted = 0
+
+    def split_stage():
+        try:
+            for batch in iter_batches(pdf_dir, files, splitter, resume_done, resume_file, resume_count, batch_size):
+                if not _put(split_queue, batch, errors):
+                    return
+        finally:
+            _put(split_queue, _DONE, errors)
+
+    def embed_stage():
+        try:
+            while True:
+                batch = _get(split_queue, errors)
+                if batch is _DONE:
+                    return
+                file, ids, chunks, last = batch
+                vectors = embedding_model.embed_documents([c.page_content for c in chunks]) if chunks else []
+                if not _put(embed_queue, (file, ids, chunks, vectors, last), errors):
+                    return
+        finally:
+            _put(embed_queue, _DONE, errors)
+
+    threads = [_run_stage(split_stage, errors), _run_stage(embed_stage, errors)]
+
+    # Upsert stage runs here so the checkpoint is only ever written from one thread
+    try:
+        while True:
+            item = _get(embed_queue, errors)
+            if item is _DONE:
+                break
+            file, ids, chunks, vectors, last = item
+            if chunks:
+                vectorstore._collection.upsert(
+                    ids=ids,
+                    embeddings=vectors,
+                    metadatas=[c.metadata for c in chunks],
+                    documents=[c.page_content for c in chunks]
+                )
+                upserted += len(chunks)
+            checkpoint.advance(file, ids, last, hashes[file]["sha256"])
+    except BaseException as e:
+        errors.append(e)
+
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise RuntimeError(f"Streaming build failed, rerun to resume from the checkpoint: {errors[0]}") from errors[0]
+
+    manifest.files = {}
+    manifest.settings = settings or {}
+    for file, info in hashes.items():
+        manifest.update_file(file, info["sha256"], checkpoint.done_files.get(file, []), info["size"], info["mtime"])
+    manifest.save()
+    checkpoint.clear()
+    return upserted
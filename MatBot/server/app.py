@@ -1,50 +1,212 @@
-import torch
-from typing import Dict, List, Optional
-from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline, BitsAndBytesConfig
-from langchain_huggingface import HuggingFaceEmbeddings  # Updated import
+import os
+import time
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional, Tuple
 from langchain_chroma import Chroma  # Updated import
 from langchain.schema import Document
-from langchain_community.document_loaders import WikipediaLoader
-from langchain_community.tools.tavily_search import TavilySearchResults
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+from query_cache import QueryEmbeddingCache
+from response_cache import ResponseCache, doc_key
+from lexical_index import LexicalIndex, reciprocal_rank_fusion
+from function_index import FunctionIndex
+from vector_backends import NumpyVectorStore, QuantizedVectorStore, search_with_scores, batch_search_with_scores
+from onnx_encoder import OnnxEmbeddings
+from confidence import ConfidenceCalibrator
+from web_search import (SearchProvider, WikipediaProvider, TavilyProvider, OfflineProvider,
+                        WebResultsCache)
+from streaming import ResponseStream, stream_generate
+from context_assembly import (assemble_context, make_token_counter, compress_web_context, truncate_to_budget,
+                              truncate_tokens)
+
+# Shared by every caller in this process (e.g. all Streamlit sessions)
+query_embedding_cache = QueryEmbeddingCache(max_size=1024)
+semantic_response_cache = ResponseCache(max_entries=512, ttl_seconds=3600, threshold=0.95)
+# Runs BM25 lookups while the query is being embedded and vector-searched
+search_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="lexical-search")
+# Web fetches that overrun their deadline keep a worker until their HTTP timeout, hence the headroom
+web_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="web-search")
+
+CHUNK_STORE_DIR = "Embed-all-Act/chunk_store"
+LEXICAL_INDEX_DIR = "Embed-all-Act/lexical_index"
+FUNCTION_INDEX_PATH = "Embed-all-Act/function_index.json"
+# Web search only runs when the manuals are unlikely to answer the question
+CONFIDENCE_CALIBRATION_PATH = "Embed-all-Act/confidence_calibration.json"
+WEB_CONFIDENCE_THRESHOLD = 0.5
+# Seconds from the start of search_web() after which a source's results are given up
+WEB_SEARCH_DEADLINES = {"wikipedia": 4.0, "tavily": 6.0, "offline": 1.0}
+DEFAULT_WEB_DEADLINE = 6.0
+# HTTP connect/read timeouts, inside the deadlines so an abandoned fetch frees its worker soon after
+WEB_FETCH_TIMEOUTS = {"wikipedia": 3.0, "tavily": 5.0}
+# "online" (Wikipedia + Tavily), or "offline" to replay recorded results on air-gapped machines
+WEB_PROVIDER = os.getenv("MATBOT_WEB_PROVIDER", "online")
+OFFLINE_WEB_RESULTS_PATH = os.getenv("MATBOT_OFFLINE_WEB_RESULTS", "Embed-all-Act/offline_web_results.jsonl")
+WEB_CACHE_PATH = "Embed-all-Act/web_cache.sqlite"
+retrieval_calibrator = ConfidenceCalibrator.load(CONFIDENCE_CALIBRATION_PATH)
+# Prompt token budgets for the documentation and web context
+CONTEXT_TOKEN_BUDGET = 1500
+WEB_TOKEN_BUDGET = 600
+# Query encoder: "torch", or "onnx-int8" / "onnx" to run BGE with ONNX Runtime on CPU
+QUERY_ENCODER = os.getenv("MATBOT_QUERY_ENCODER", "torch")
+ONNX_ENCODER_DIR = "Embed-all-Act/onnx_encoder"
+# "chroma", "numpy" for exact in-process search over the chunk store, or
+# "numpy-int8" / "numpy-binary" for quantized first-pass search with exact rescoring
+VECTOR_BACKEND = os.getenv("MATBOT_VECTOR_BACKEND", "chroma")
+# "pipeline" calls the transformers pipeline directly; "batched" serves every
+# caller from one continuous-batching decode loop (opt-in, see tests/test_scheduler.py).
+# Only "batched" reuses the KV cache of CACHED_PROMPT_PREFIXES; the pipeline
+# prefills the whole prompt on every request
+GENERATION_MODE = os.getenv("MATBOT_GENERATION", "pipeline")
+GENERATION_KWARGS = dict(max_new_tokens=1024, do_sample=True, temperature=0.3, top_k=50, top_p=0.95,
+                         repetition_penalty=1.2)
+# "transformers" (CUDA), or "llama-cpp" to run a quantized GGUF of the model on CPU
+LLM_BACKEND = os.getenv("MATBOT_LLM_BACKEND", "transformers")
+GGUF_MODEL_PATH = os.getenv("MATBOT_GGUF_MODEL", "models/mistral-7b-instruct-v0.2.Q4_K_M.gguf")
+LLM_THREADS = int(os.getenv("MATBOT_LLM_THREADS", "0")) or None  # None: all cores
+# Window the prompt and answer must fit in (the model accepts 32k; 8k bounds KV-cache memory)
+MODEL_CONTEXT_TOKENS = 8192
+MAX_PROMPT_TOKENS = MODEL_CONTEXT_TOKENS - GENERATION_KWARGS["max_new_tokens"]
+# Batch limits for the scheduler: rows, and padded KV-cache positions (rows x widest row)
+GENERATION_MAX_BATCH_SIZE = 8
+GENERATION_MAX_BATCH_TOKENS = 16384
 
 # -------------------- Load Embeddings + Chroma Vectorstore --------------------
-def load_embedding_model(persist_dir="Embed-all-Act/chroma_index"):
+def load_embedding_model(persist_dir="Embed-all-Act/chroma_index",
+                         cache_path: Optional[str] = "Embed-all-Act/embedding_cache.sqlite",
+                         backend: str = VECTOR_BACKEND, encoder: str = QUERY_ENCODER):
     """
-    Loads the embedding model and Chroma vectorstore.
+    Loads the embedding model and vectorstore.
     Args:
         persist_dir (str): Directory to persist the Chroma index.
+        cache_path (Optional[str]): On-disk embedding cache shared with ingestion (None disables it).
+        backend (str): "chroma", "numpy" to search the chunk store's vectors in process,
+            or "numpy-int8" / "numpy-binary" to search quantized codes and rescore.
+        encoder (str): "torch", or "onnx-int8" / "onnx" for the ONNX Runtime query encoder
+            (exported on first use).
     Returns:
-        tuple: Embedding model and Chroma vectorstore instance.
+        tuple: Embedding model and vectorstore instance.
     """
-    device = "cuda" if torch.cuda.is_available() else "cpu"
+    # PyTorch is only imported for the torch encoder, so a CPU deployment on the
+    # ONNX encoder and the llama-cpp backend never loads it
+    if encoder.startswith("onnx"):
+        device = "cpu (ONNX Runtime)"
+    else:
+        import torch
+        from langchain_huggingface import HuggingFaceEmbeddings  # Updated import
+        device = "cuda" if torch.cuda.is_available() else "cpu"
     print(f"🔄 Loading embedding model on {device}...")
 
     try:
-        embedding_model = HuggingFaceEmbeddings(
-            model_name="BAAI/bge-base-en-v1.5",
-            model_kwargs={"device": device}
-        )
+        model_name = "BAAI/bge-base-en-v1.5"
+        if encoder.startswith("onnx"):
+            embedding_model = OnnxEmbeddings(model_name, ONNX_ENCODER_DIR, quantized=encoder == "onnx-int8")
+        else:
+            embedding_model = HuggingFaceEmbeddings(
+                model_name=model_name,
+                model_kwargs={"device": device}
+            )
+        if cache_path:
+            embedding_model = CachedEmbeddings(embedding_model,
+                                               EmbeddingCache(cache_path, getattr(embedding_model, "model_name", model_name)))
 
-        vectorstore = Chroma(
-            persist_directory=persist_dir,
-            embedding_function=embedding_model
-        )
+        if backend == "numpy":
+            vectorstore = NumpyVectorStore(CHUNK_STORE_DIR, embedding_function=embedding_model)
+        elif backend.startswith("numpy-"):
+            vectorstore = QuantizedVectorStore(CHUNK_STORE_DIR, mode=backend.split("-", 1)[1],
+                                               embedding_function=embedding_model)
+        else:
+            vectorstore = Chroma(
+                persist_directory=persist_dir,
+                embedding_function=embedding_model
+            )
         return embedding_model, vectorstore
     except Exception as e:
         raise RuntimeError(f"Failed to load embedding model or vectorstore: {e}")
 
+# -------------------- Load Lexical Index --------------------
+def load_lexical_index(index_dir: str = LEXICAL_INDEX_DIR, chunk_store_dir: str = CHUNK_STORE_DIR) -> Optional[LexicalIndex]:
+    """
+    Loads the BM25 inverted index built next to the Chroma index at ingestion time.
+    Args:
+        index_dir (str): Lexical index directory.
+        chunk_store_dir (str): Chunk store the index refers to.
+    Returns:
+        Optional[LexicalIndex]: The index, or None if it has not been built.
+    """
+    if not os.path.exists(os.path.join(index_dir, "vocab.json")):
+        print("⚠ No lexical index found, using vector search only")
+        return None
+    print("🔄 Loading lexical index...")
+    return LexicalIndex(index_dir, chunk_store_dir)
+
+
+@lru_cache(maxsize=1)
+def get_lexical_index() -> Optional[LexicalIndex]:
+    """Process-wide lexical index, loaded on first use."""
+    return load_lexical_index()
+
+# -------------------- Load Function Index --------------------
+def load_function_index(index_path: str = FUNCTION_INDEX_PATH, chunk_store_dir: str = CHUNK_STORE_DIR) -> Optional[FunctionIndex]:
+    """
+    Loads the function name -> reference page index built at ingestion time.
+    Args:
+        index_path (str): Function index JSON file.
+        chunk_store_dir (str): Chunk store the index refers to.
+    Returns:
+        Optional[FunctionIndex]: The index, or None if it has not been built.
+    """
+    if not os.path.exists(index_path):
+        print("⚠ No function index found, function lookups use the full pipeline")
+        return None
+    print("🔄 Loading function index...")
+    return FunctionIndex(index_path, chunk_store_dir)
+
+
+@lru_cache(maxsize=1)
+def get_function_index() -> Optional[FunctionIndex]:
+    """Process-wide function index, loaded on first use."""
+    return load_function_index()
+
+
+def detect_function_lookup(query: str) -> Optional[str]:
+    """
+    Returns the indexed function a query only asks about ("what does interp1 do"), or None.
+    """
+    function_index = get_function_index()
+    return function_index.detect(query) if function_index else None
+
 # -------------------- Load Mistral Model --------------------
-def load_mistral_model(model_id="mistralai/Mistral-7B-Instruct-v0.2", use_4bit=True):
+def load_mistral_model(model_id="mistralai/Mistral-7B-Instruct-v0.2", use_4bit=True, mode: str = GENERATION_MODE,
+                       backend: str = LLM_BACKEND, threads: Optional[int] = LLM_THREADS):
     """
     Loads the Mistral model for text generation.
     Args:
         model_id (str): Model identifier.
         use_4bit (bool): Whether to use 4-bit quantization.
+        mode (str): "batched" for a shared InferenceScheduler (with CACHED_PROMPT_PREFIXES
+            registered), "pipeline" for a plain pipeline.
+        backend (str): "transformers", or "llama-cpp" for the GGUF model on CPU.
+        threads (Optional[int]): CPU threads for the llama-cpp backend.
     Returns:
-        pipeline: Text generation pipeline.
+        pipeline: Text generation pipeline, or an InferenceScheduler / LlamaCppPipeline
+        with the same call shape.
     """
+    if backend == "llama-cpp":
+        print(f"🔄 Loading {GGUF_MODEL_PATH} with llama.cpp...")
+        try:
+            # Only this backend needs llama-cpp-python installed
+            from llama_cpp_backend import LlamaCppPipeline
+            return LlamaCppPipeline(GGUF_MODEL_PATH, model_id, threads=threads, n_ctx=MODEL_CONTEXT_TOKENS,
+                                    **GENERATION_KWARGS)
+        except Exception as e:
+            raise RuntimeError(f"Failed to load Mistral model: {e}")
+
     print(f"🔄 Loading {model_id}...")
 
+    import torch
+    from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline, BitsAndBytesConfig
+    from scheduler import InferenceScheduler
+
     try:
         if use_4bit:
             quant_config = BitsAndBytesConfig(
@@ -67,18 +229,20 @@ def load_mistral_model(model_id="mistralai/Mistral-7B-Instruct-v0.2", use_4bit=T
         tokenizer = AutoTokenizer.from_pretrained(model_id, use_fast=True)
         tokenizer.pad_token = tokenizer.eos_token
 
+        if mode == "batched":
+            scheduler = InferenceScheduler(model, tokenizer, max_batch_size=GENERATION_MAX_BATCH_SIZE,
+                                           max_batch_tokens=GENERATION_MAX_BATCH_TOKENS, **GENERATION_KWARGS)
+            for prefix in CACHED_PROMPT_PREFIXES:
+                scheduler.register_prefix(prefix)
+            return scheduler
+
         text_gen = pipeline(
             "text-generation",
             model=model,
             tokenizer=tokenizer,
             device_map="auto",
-            max_new_tokens=1024,
-            do_sample=True,
-            temperature=0.3,
-            top_k=50,
-            top_p=0.95,
-            repetition_penalty=1.2,
-            pad_token_id=tokenizer.eos_token_id
+            pad_token_id=tokenizer.eos_token_id,
+            **GENERATION_KWARGS
         )
         return text_gen
     except Exception as e:
@@ -87,6 +251,32 @@ def load_mistral_model(model_id="mistralai/Mistral-7B-Instruct-v0.2", use_4bit=T
 # -------------------- Prompt Formatter --------------------
 from typing import Optional
 
+# Every prompt starts with these fixed instructions; the batched generator
+# keeps their KV cache and only prefills what follows
+PROMPT_PREFIX = """<s>[INST] You are an expert technical assistant specializing in MATLAB, programming, and data analysis. 
+
+            System Instructions:
+            1. Answer the user's question based primarily on the provided documentation context.
+            2. If the documentation context is insufficient, use any additional web search information provided.
+            3. Provide practical, step-by-step solutions.
+            4. Include relevant code examples when helpful.
+            5. If you're unsure or if information is missing, acknowledge the limitations in your answer.
+            6. Format your response in well-structured Markdown to make it easily readable on the web.
+            7. Focus on technical accuracy and precision.
+            8. While responding write only the MATLAB code in '' code block.
+            9. Do not include any other text in the code block.
+            10. Ensure good formatting and readability in your response and have good spacing too.
+            
+
+            ## Documentation Context:
+
+            code
+            """
+# Prompt prefixes whose KV cache is precomputed when the model loads, with
+# MATBOT_GENERATION=batched only; the llama-cpp backend instead reuses whatever
+# start it shares with the previous prompt, and the default pipeline mode reuses nothing
+CACHED_PROMPT_PREFIXES = [PROMPT_PREFIX]
+
 def format_prompt(question: str, context: str, additional_web_context: Optional[str] = None) -> str:
     """
     Creates a well-structured prompt for the Mistral model that will return nicely formatted Markdown.
@@ -111,25 +301,7 @@ def format_prompt(question: str, context: str, additional_web_context: Optional[
         
         """
     
-    return f"""<s>[INST] You are an expert technical assistant specializing in MATLAB, programming, and data analysis. 
-
-            System Instructions:
-            1. Answer the user's question based primarily on the provided documentation context.
-            2. If the documentation context is insufficient, use any additional web search information provided.
-            3. Provide practical, step-by-step solutions.
-            4. Include relevant code examples when helpful.
-            5. If you're unsure or if information is missing, acknowledge the limitations in your answer.
-            6. Format your response in well-structured Markdown to make it easily readable on the web.
-            7. Focus on technical accuracy and precision.
-            8. While responding write only the MATLAB code in '' code block.
-            9. Do not include any other text in the code block.
-            10. Ensure good formatting and readability in your response and have good spacing too.
-            
-
-            ## Documentation Context:
-
-            code
-            {cleaned_context}
+    return PROMPT_PREFIX + f"""{cleaned_context}
             
             {web_context_section}
             ## User Question: 
@@ -137,8 +309,49 @@ def format_prompt(question: str, context: str, additional_web_context: Optional[
         """
         
 
+def build_prompt(question: str, context: str, additional_web_context: Optional[str] = None, tokenizer=None,
+                 max_tokens: int = MAX_PROMPT_TOKENS) -> Tuple[str, Dict]:
+    """
+    format_prompt() fitted to max_tokens, measured with the generation model's
+    tokenizer. When the prompt is too long, sections are cut by priority: web
+    context first, then documentation context, and the question (which carries
+    any uploaded file) last.
+    Args:
+        question (str): User's question.
+        context (str): Documentation context.
+        additional_web_context (Optional[str]): Additional context from web search.
+        tokenizer: Generation tokenizer; ~4 characters per token without one.
+        max_tokens (int): Prompt token limit.
+    Returns:
+        tuple: Prompt, and {"prompt_tokens": int, "truncated": [section names]}.
+    """
+    count_tokens = make_token_counter(tokenizer)
+    sections = [question, context, additional_web_context or ""]
+    cut = [lambda text, budget: truncate_tokens(text, budget, tokenizer),
+           lambda text, budget: truncate_to_budget(text, max(budget, 0), count_tokens),
+           lambda text, budget: truncate_to_budget(text, max(budget, 0), count_tokens)]
+
+    def measure():
+        prompt = format_prompt(*sections)
+        return prompt, len(tokenizer.encode(prompt)) if tokenizer is not None else count_tokens(prompt)
+
+    prompt, total = measure()
+    truncated = []
+    for i, name in ((2, "web"), (1, "context"), (0, "question")):
+        while total > max_tokens and sections[i]:
+            sections[i] = cut[i](sections[i], count_tokens(sections[i]) - (total - max_tokens))
+            if name not in truncated:
+                truncated.append(name)
+            prompt, total = measure()
+    return prompt, {"prompt_tokens": total, "truncated": truncated}
+
+
 # -------------------- Query Database --------------------
-def query_database(query: str, embedding_model, vectorstore, k: int = 5) -> List[Document]:
+def query_database(query: str, embedding_model, vectorstore, k: int = 5,
+                   query_cache: Optional[QueryEmbeddingCache] = query_embedding_cache,
+                   lexical_index: Optional[LexicalIndex] = None, return_scores: bool = False,
+                   return_confidence: bool = False, return_similarities: bool = False,
+                   return_vector: bool = False) -> List[Document]:
     """
     Queries the database for top-k similar documents.
     Args:
@@ -146,75 +359,246 @@ def query_database(query: str, embedding_model, vectorstore, k: int = 5) -> List
         embedding_model: Embedding model instance.
         vectorstore: Chroma vectorstore instance.
         k (int): Number of top results to return.
+        query_cache (Optional[QueryEmbeddingCache]): LRU of query vectors (None disables it).
+        lexical_index (Optional[LexicalIndex]): BM25 index; when given, lexical and
+            vector results are fused with reciprocal-rank fusion.
+        return_scores (bool): Return (Document, score) pairs: cosine similarity,
+            or the fused score in hybrid mode.
+        return_confidence (bool): Also return {"confidence", "top_similarity"}, the
+            calibrated probability that the retrieved chunks answer the query.
+        return_similarities (bool): Also return the vector search's cosine similarities,
+            best first (more than k in hybrid mode, where the results carry fused scores).
+        return_vector (bool): Also return the query embedding, so callers need not embed it again.
     Returns:
-        List[Document]: Top-k similar documents.
+        List[Document]: Top-k similar documents; with return_confidence, return_similarities
+        and/or return_vector, a tuple of the documents followed by the confidence info,
+        the similarities and/or the query vector, in that order.
     """
     print("🔎 Embedding user query and searching database...")
-    embedded_query = embedding_model.embed_query(query)
-    docs = vectorstore.similarity_search_by_vector(embedded_query, k=k)
-    print(f"✅ Found {len(docs)} relevant documents")
-    return docs
+    # Exact tokens (ode45, MATLAB:badsubscript, 'LineWidth') are searched in parallel
+    candidates = max(4 * k, 20)
+    lexical_future = search_pool.submit(lexical_index.search, query, candidates) if lexical_index else None
+
+    if query_cache is not None:
+        embedded_query = query_cache.embed_query(query, embedding_model)
+        stats = query_cache.stats()
+        print(f"⚡ Query cache hit rate {stats['hit_rate']:.0%} "
+              f"({stats['hits']} memory, {stats['disk_hits']} disk, {stats['misses']} computed)")
+    else:
+        embedded_query = embedding_model.embed_query(query)
+    if lexical_future is None:
+        results = vector_results = search_with_scores(vectorstore, embedded_query, k=k)
+    else:
+        vector_results = search_with_scores(vectorstore, embedded_query, k=candidates)
+        lexical_docs = lexical_index.documents([row for row, _ in lexical_future.result()])
+        results = reciprocal_rank_fusion([[doc for doc, _ in vector_results], lexical_docs], k=k, with_scores=True)
+    print(f"✅ Found {len(results)} relevant documents")
+    if not return_scores:
+        results = [doc for doc, _ in results]
+    if not return_confidence and not return_similarities and not return_vector:
+        return results
+    outputs = [results]
+    if return_confidence:
+        # Confidence comes from cosine similarities, which fused scores are not
+        confidence = retrieval_calibrator.describe([score for _, score in vector_results])
+        print(f"📏 Retrieval confidence {confidence['confidence']:.2f} (top cosine {confidence['top_similarity']:.3f})")
+        outputs.append(confidence)
+    if return_similarities:
+        outputs.append([score for _, score in vector_results])
+    if return_vector:
+        outputs.append(embedded_query)
+    return tuple(outputs)
+
+def query_database_batch(queries: List[str], embedding_model, vectorstore, k: int = 5,
+                         query_cache: Optional[QueryEmbeddingCache] = query_embedding_cache,
+                         lexical_index: Optional[LexicalIndex] = None) -> List[List[Tuple[Document, float]]]:
+    """
+    Batched query_database() for evaluation jobs and concurrent sessions: the
+    queries are embedded in one forward pass and searched with one top-k call.
+    Args:
+        queries (List[str]): User queries.
+        embedding_model: Embedding model instance.
+        vectorstore: Chroma or NumPy vectorstore instance.
+        k (int): Number of results per query.
+        query_cache (Optional[QueryEmbeddingCache]): LRU of query vectors (None disables it).
+        lexical_index (Optional[LexicalIndex]): BM25 index for hybrid retrieval.
+    Returns:
+        List[List[Tuple[Document, float]]]: Per query, (Document, score) pairs best first;
+        scores as in query_database(return_scores=True).
+    """
+    if not queries:
+        return []
+    print(f"🔎 Embedding {len(queries)} queries and searching database...")
+    candidates = max(4 * k, 20)
+    lexical_futures = [search_pool.submit(lexical_index.search, query, candidates)
+                       for query in queries] if lexical_index else None
+
+    if query_cache is not None:
+        embedded = query_cache.embed_queries(queries, embedding_model)
+    else:
+        embedded = embedding_model.embed_documents(queries)
+    if lexical_futures is None:
+        return batch_search_with_scores(vectorstore, embedded, k=k)
+
+    vector_results = batch_search_with_scores(vectorstore, embedded, k=candidates)
+    return [
+        reciprocal_rank_fusion([[doc for doc, _ in results],
+                                lexical_index.documents([row for row, _ in future.result()])],
+                               k=k, with_scores=True)
+        for results, future in zip(vector_results, lexical_futures)
+    ]
 
 # -------------------- Web Search Function --------------------
-def search_web(query: str, tavily_api_key: str) -> Dict[str, str]:
+@lru_cache(maxsize=1)
+def get_offline_provider() -> OfflineProvider:
+    """Recorded web results, read once per process."""
+    return OfflineProvider(OFFLINE_WEB_RESULTS_PATH)
+
+
+@lru_cache(maxsize=1)
+def get_web_results_cache() -> WebResultsCache:
+    """Process-wide web results cache, opened on first web search."""
+    return WebResultsCache(WEB_CACHE_PATH, ttl_seconds=86400, max_entries=5000, negative_ttl_seconds=300)
+
+
+def web_providers(tavily_api_key: str, provider: str = WEB_PROVIDER) -> List[SearchProvider]:
+    """
+    Args:
+        tavily_api_key (str): Tavily API key.
+        provider (str): "online" (Wikipedia + Tavily) or "offline" (recorded results file).
+    Returns:
+        List[SearchProvider]: Providers to query, in the order their context is combined.
+    """
+    if provider == "offline":
+        return [get_offline_provider()]
+    if not tavily_api_key:
+        return []
+    return [WikipediaProvider(timeout=WEB_FETCH_TIMEOUTS["wikipedia"]),
+            TavilyProvider(tavily_api_key, timeout=WEB_FETCH_TIMEOUTS["tavily"])]
+
+
+def search_web(query: str, tavily_api_key: str,
+               deadlines: Optional[Dict[str, float]] = None,
+               providers: Optional[List[SearchProvider]] = None,
+               cache: Optional[WebResultsCache] = None) -> Dict[str, str]:
     """
     Performs a web search and Wikipedia search for additional context.
+
+    Cached results are used first. The remaining providers are fetched
+    concurrently, each against its own deadline from the start of the search,
+    so the call returns within the slowest deadline. A source that misses its
+    deadline is cancelled (or, if already running, abandoned) and the results
+    that did arrive are returned; the providers' own HTTP timeouts end an
+    abandoned fetch shortly after.
     Args:
         query (str): User query.
         tavily_api_key (str): Tavily API key.
+        deadlines (Optional[Dict[str, float]]): Seconds per provider name.
+        providers (Optional[List[SearchProvider]]): Defaults to web_providers().
+        cache (Optional[WebResultsCache]): Persistent results cache, e.g.
+            get_web_results_cache() (None disables it).
     Returns:
-        Dict[str, str]: Combined context from web and Wikipedia.
+        Dict[str, str]: Combined context from web and Wikipedia, and the
+        sources that timed out under "timed_out".
     """
-    if not tavily_api_key:
+    providers = web_providers(tavily_api_key) if providers is None else providers
+    if not providers:
         print("⚠ No Tavily API key provided, skipping web search")
-        return {"context": ""}
+        return {"context": "", "timed_out": []}
         
     print("🌐 Performing web search for additional context...")
-    
-    # Wikipedia Search
-    wiki_context = ""
-    try:
-        wiki_docs = WikipediaLoader(query=query, load_max_docs=2).load()
-        if wiki_docs:
-            wiki_context = "\n\n".join([
-                f'From Wikipedia ({doc.metadata["source"]}):\n{doc.page_content}'
-                for doc in wiki_docs
-            ])
-    except Exception as e:
-        print(f"⚠ Wikipedia search error: {str(e)}")
+    deadlines = {**WEB_SEARCH_DEADLINES, **(deadlines or {})}
+    started = time.monotonic()
+    contexts, futures, timed_out = {}, {}, []
+    for provider in providers:
+        cached = cache.get(provider.name, query) if cache is not None else None
+        if cached is not None:
+            print(f"⚡ {provider.name.capitalize()} results from cache")
+            contexts[provider.name] = cached
+        else:
+            futures[provider.name] = web_pool.submit(provider.fetch, query)
 
-    # Web Search via Tavily
-    web_context = ""
-    try:
-        tavily_search = TavilySearchResults(max_results=3, tavily_api_key=tavily_api_key)
-        web_docs = tavily_search.invoke(query)
-        if web_docs:
-            web_context = "\n\n".join([
-                f'From {doc["url"]}:\n{doc["content"]}'
-                for doc in web_docs
-            ])
-    except Exception as e:
-        print(f"⚠ Tavily search error: {str(e)}")
+    # Deadlines are absolute, so waiting on the sources in turn is bounded by the latest one
+    for source, future in futures.items():
+        deadline = deadlines.get(source, DEFAULT_WEB_DEADLINE)
+        try:
+            contexts[source] = future.result(timeout=max(0.0, deadline - (time.monotonic() - started)))
+            if cache is not None:
+                cache.put(source, query, contexts[source])
+        except FutureTimeoutError:
+            future.cancel()
+            timed_out.append(source)
+            print(f"⚠ {source.capitalize()} search timed out after {deadline:.1f}s")
+        except Exception as e:
+            print(f"⚠ {source.capitalize()} search error: {str(e)}")
 
     # Combine contexts
-    combined_context = "\n\n".join(filter(None, [wiki_context, web_context]))
-    return {"context": combined_context}
+    combined_context = "\n\n".join(filter(None, [contexts.get(provider.name) for provider in providers]))
+    print(f"✅ Web search finished in {time.monotonic() - started:.1f}s")
+    return {"context": combined_context, "timed_out": timed_out}
+
+# -------------------- Function Lookup Fast Path --------------------
+def answer_function_lookup(user_query: str, function_key: str, model_pipeline=None):
+    """
+    Answers a single-function lookup from the indexed reference page, skipping
+    query embedding, vector search and the full-length generation.
+    Args:
+        user_query (str): User's question.
+        function_key (str): Key returned by detect_function_lookup().
+        model_pipeline: When given, a short generation summarises the page;
+            otherwise the reference text is returned as is.
+    Returns:
+        tuple: Response and metadata, as generate_response().
+    """
+    entry = get_function_index().lookup(function_key)
+    response_info = {"fast_path": "function_lookup", "function": entry["name"]}
+    print(f"⚡ Function lookup fast path: {entry['name']} ({entry['source']}, page {entry['page']})")
+
+    if model_pipeline is None:
+        response = (f"### `{entry['name']}`\n\n"
+                    f"From the MATLAB reference ({entry['source']}, page {entry['page']}):\n\n"
+                    f"```\n{entry['text'].strip()}\n```")
+    else:
+        prompt, _ = build_prompt(user_query, entry["text"], tokenizer=getattr(model_pipeline, "tokenizer", None))
+        response = model_pipeline(prompt, max_new_tokens=256, return_full_text=False)[0]['generated_text'].strip()
+        response_info["fast_path_generation"] = True
+
+    # One metadata entry per page, like the regular path's per-document entries
+    used_metadata = list({(m.get("source"), m.get("page")): m for m in entry["metadata"]}.values())
+    return response, used_metadata + [{"response_info": response_info}]
 
 # -------------------- Main Function --------------------
-def generate_response(user_query: str, embedding_model=None, vectorstore=None, model_pipeline=None, 
-                      tavily_api_key: str ="", use_web_search: bool = False) -> str:
+def _prepare_response(user_query: str, embedding_model, vectorstore, model_pipeline, tavily_api_key: str,
+                      use_web_search: bool, response_cache: Optional[ResponseCache], hybrid_search: bool,
+                      function_lookup: bool, function_lookup_generation: bool,
+                      web_confidence_threshold: Optional[float]):
     """
-    Generates a response to the user's query.
+    Everything generate_response() does before and after generation.
     Args:
         user_query (str): User's question.
         embedding_model: Preloaded embedding model.
         vectorstore: Preloaded vectorstore.
         model_pipeline: Preloaded model pipeline.
         tavily_api_key (str): Tavily API key.
-        use_web_search (bool): Whether to use web search.
+        use_web_search (bool): Whether web search is allowed.
+        response_cache (Optional[ResponseCache]): Semantic answer cache (None disables it).
+        hybrid_search (bool): Fuse BM25 results with vector search when the lexical index exists.
+        function_lookup (bool): Answer single-function lookups from the function index.
+        function_lookup_generation (bool): Summarise fast-path answers with a short generation.
+        web_confidence_threshold (Optional[float]): Search the web only when retrieval
+            confidence is below this; None searches whenever use_web_search is set.
     Returns:
-        str: Generated response.
+        tuple: (answer, None, None, None) when the answer is already known (function
+        lookup, response cache hit); otherwise (None, prompt, model_pipeline, finish),
+        where finish(generated_text) formats and caches the answer and returns it.
     """
+    # "What does interp1 do" is answered from the reference page directly
+    function_key = detect_function_lookup(user_query) if function_lookup else None
+    if function_key is not None:
+        answer = answer_function_lookup(user_query, function_key,
+                                        model_pipeline if function_lookup_generation else None)
+        return answer, None, None, None
+
     # Load models if not provided
     if embedding_model is None or vectorstore is None:
         embedding_model, vectorstore = load_embedding_model()
@@ -222,31 +606,138 @@ def generate_response(user_query: str, embedding_model=None, vectorstore=None, m
     if model_pipeline is None:
         model_pipeline = load_mistral_model()
 
-    # Perform similarity search
-    top_docs = query_database(user_query, embedding_model, vectorstore, k=5)
-    combined_context = "\n".join(doc.page_content for doc in top_docs)
+    # Perform similarity search over a wider candidate set, then assemble within the token budget
+    lexical_index = get_lexical_index() if hybrid_search else None
+    scored_docs, confidence, similarities, query_vector = query_database(
+        user_query, embedding_model, vectorstore, k=12, lexical_index=lexical_index, return_scores=True,
+        return_confidence=True, return_similarities=True, return_vector=True)
+    count_tokens = make_token_counter(getattr(model_pipeline, "tokenizer", None))
+    # How many chunks are relevant is judged on cosine similarity, also when the ranking is fused
+    combined_context, top_docs, assembly = assemble_context(scored_docs, CONTEXT_TOKEN_BUDGET, count_tokens,
+                                                            cutoff_scores=similarities)
+    print(f"🧩 Context: {assembly['chunks_used']} of {assembly['candidates']} chunks in "
+          f"{assembly['passages']} passages, {assembly['context_tokens']} tokens")
+    used_metadata = [doc.metadata for doc in top_docs]
+    response_info = {"context_tokens": assembly["context_tokens"], "context_chunks": assembly["chunks_used"],
+                     **confidence}
+
+    # The manuals cover most questions; only low-confidence ones go to the web
+    web_needed = use_web_search and (web_confidence_threshold is None
+                                     or confidence["confidence"] < web_confidence_threshold)
+    response_info["web_search"] = "used" if web_needed else ("skipped" if use_web_search else "disabled")
+
+    # Reuse a recent answer to a near-identical question over the same documents
+    if response_cache is not None:
+        doc_ids = [doc_key(doc) for doc in top_docs]
+        cached = response_cache.lookup(query_vector, web_needed, doc_ids)
+        if cached is not None:
+            response, cached_metadata, similarity = cached
+            print(f"⚡ Response cache hit (cosine {similarity:.3f})")
+            response_info.update(cache="hit", cache_similarity=round(similarity, 4))
+            return (response, cached_metadata + [{"response_info": response_info}]), None, None, None
+        response_info["cache"] = "miss"
     
-    # Perform web search if enabled
+    # Perform web search if enabled and retrieval confidence is low
     web_context = ""
-    if use_web_search:
-        web_results = search_web(user_query, tavily_api_key)
-        web_context = web_results["context"]
+    if web_needed:
+        web_results = search_web(user_query, tavily_api_key, cache=get_web_results_cache())
+        web_context, compression = compress_web_context(
+            user_query, web_results["context"], embedding_model, WEB_TOKEN_BUDGET, count_tokens,
+            query_vector=query_vector)
+        print(f"✂️ Web context compressed from {compression['tokens_before']} to "
+              f"{compression['tokens_after']} tokens ({compression['tokens_saved']} saved)")
+        response_info.update(web_tokens_before=compression["tokens_before"],
+                             web_tokens_after=compression["tokens_after"],
+                             web_tokens_saved=compression["tokens_saved"])
+        if web_results["timed_out"]:
+            response_info["web_timed_out"] = web_results["timed_out"]
     
-    # Create prompt
-    prompt = format_prompt(user_query, combined_context, web_context)
+    # Create prompt, fitted to the model window
+    prompt, prompt_report = build_prompt(user_query, combined_context, web_context,
+                                         getattr(model_pipeline, "tokenizer", None))
+    response_info["prompt_tokens"] = prompt_report["prompt_tokens"]
+    if prompt_report["truncated"]:
+        print(f"⚠ Prompt over {MAX_PROMPT_TOKENS} tokens, truncated: {', '.join(prompt_report['truncated'])}")
+        response_info["prompt_truncated"] = prompt_report["truncated"]
     
+    def finish(response: str):
+        # Format response to include code blocks
+        response = response.replace("", "<pre>").replace("```", "</pre>")
+        if response_cache is not None:
+            response_cache.put(query_vector, web_needed, doc_ids, response, used_metadata)
+        return response, used_metadata + [{"response_info": response_info}]
+
+    return None, prompt, model_pipeline, finish
+
+
+def generate_response(user_query: str, embedding_model=None, vectorstore=None, model_pipeline=None, 
+                      tavily_api_key: str ="", use_web_search: bool = False,
+                      response_cache: Optional[ResponseCache] = semantic_response_cache,
+                      hybrid_search: bool = True, function_lookup: bool = True,
+                      function_lookup_generation: bool = False,
+                      web_confidence_threshold: Optional[float] = WEB_CONFIDENCE_THRESHOLD) -> str:
+    """
+    Generates a response to the user's query.
+    Args:
+        user_query (str): User's question.
+        embedding_model: Preloaded embedding model.
+        vectorstore: Preloaded vectorstore.
+        model_pipeline: Preloaded model pipeline.
+        tavily_api_key (str): Tavily API key.
+        use_web_search (bool): Whether web search is allowed.
+        response_cache (Optional[ResponseCache]): Semantic answer cache (None disables it).
+        hybrid_search (bool): Fuse BM25 results with vector search when the lexical index exists.
+        function_lookup (bool): Answer single-function lookups from the function index.
+        function_lookup_generation (bool): Summarise fast-path answers with a short generation.
+        web_confidence_threshold (Optional[float]): Search the web only when retrieval
+            confidence is below this; None searches whenever use_web_search is set.
+    Returns:
+        str: Generated response. The metadata list ends with a
+        {"response_info": {...}} entry describing how the answer was produced.
+    """
+    answer, prompt, model_pipeline, finish = _prepare_response(
+        user_query, embedding_model, vectorstore, model_pipeline, tavily_api_key, use_web_search,
+        response_cache, hybrid_search, function_lookup, function_lookup_generation, web_confidence_threshold)
+    if answer is not None:
+        return answer
+
     # Generate response
     print("🧠 Generating response...")
-    result = model_pipeline(prompt)[0]['generated_text']
-    used_metadata = [doc.metadata for doc in top_docs]
-    
-    # Extract assistant's response
-    response_start = result.find("[/INST]")
-    response = result[response_start + len("[/INST]"):].strip() if response_start != -1 else result
+    # Only the new tokens come back; the prompt is not decoded and echoed
+    response = model_pipeline(prompt, return_full_text=False)[0]['generated_text'].strip()
+    return finish(response)
+
 
-    # Format response to include code blocks
-    response = response.replace("", "<pre>").replace("```", "</pre>")
-    return response, used_metadata
+def generate_response_stream(user_query: str, embedding_model=None, vectorstore=None, model_pipeline=None,
+                             tavily_api_key: str = "", use_web_search: bool = False,
+                             response_cache: Optional[ResponseCache] = semantic_response_cache,
+                             hybrid_search: bool = True, function_lookup: bool = True,
+                             function_lookup_generation: bool = False,
+                             web_confidence_threshold: Optional[float] = WEB_CONFIDENCE_THRESHOLD) -> ResponseStream:
+    """
+    Streaming generate_response(): same arguments, but returns as soon as the
+    prompt is built. Iterating the returned stream yields text deltas as the
+    model decodes them; afterwards stream.response and stream.metadata hold
+    what generate_response() would have returned. Answers known without
+    generation (function lookups, cache hits) arrive as a single delta.
+    Returns:
+        ResponseStream: Stream of the answer.
+    """
+    answer, prompt, model_pipeline, finish = _prepare_response(
+        user_query, embedding_model, vectorstore, model_pipeline, tavily_api_key, use_web_search,
+        response_cache, hybrid_search, function_lookup, function_lookup_generation, web_confidence_threshold)
+    if answer is not None:
+        return ResponseStream.completed(*answer)
+
+    print("🧠 Streaming response...")
+
+    def finish_stream(text: str):
+        response, metadata = finish(text.strip())
+        metadata[-1]["response_info"]["time_to_first_token"] = round(stream.time_to_first_token or 0.0, 3)
+        return response, metadata
+
+    stream = ResponseStream(stream_generate(model_pipeline, prompt), finish_stream)
+    return stream
 
 # -------------------- Command Line Interface --------------------
 if __name__ == "__main__":
@@ -272,8 +763,4 @@ if __name__ == "__main__":
         )
         print("\n🤖 Response:\n", response)
         
-<<<<<<< HEAD
-        print("\n📄 Used Metadata:", used_metadata)
-=======
         print("\n📄 Used Metadata:", used_metadata)
->>>>>>> 5d317817a5ea15392351f6814d0287bfa4e1fd41
@@ -0,0 +1,60 @@
+"""
+Measures retrieval throughput of query_database() called once per query
+against query_database_batch() at several batch sizes.
+
+    python benchmarks/bench_batch_retrieval.py --batch-sizes 1 8 32 --rounds 3
+
+Run from MatBot/server so the Embed-all-Act index paths resolve. The query
+caches are disabled so every round pays for embedding.
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import load_embedding_model, query_database, query_database_batch
+
+REFERENCE_QUERIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reference_queries.txt")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark single versus batched retrieval.")
+    parser.add_argument("--queries", default=REFERENCE_QUERIES, help="One question per line.")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--backend", default=None, help="Vector backend, as MATBOT_VECTOR_BACKEND.")
+    args = parser.parse_args()
+
+    with open(args.queries, "r", encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+    kwargs = {"cache_path": None}
+    if args.backend:
+        kwargs["backend"] = args.backend
+    embedding_model, vectorstore = load_embedding_model(**kwargs)
+    query_database(questions[0], embedding_model, vectorstore, k=args.k, query_cache=None)  # warm-up
+
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        for question in questions:
+            query_database(question, embedding_model, vectorstore, k=args.k, query_cache=None)
+    single = args.rounds * len(questions) / (time.perf_counter() - start)
+    print(f"one call per query: {single:8.1f} queries/s")
+
+    for batch_size in args.batch_sizes:
+        # Repeat the reference set so every batch is full
+        pool = (questions * (batch_size // len(questions) + 1))
+        start = time.perf_counter()
+        total = 0
+        for _ in range(args.rounds):
+            for offset in range(0, len(questions), batch_size):
+                batch = pool[offset:offset + batch_size]
+                query_database_batch(batch, embedding_model, vectorstore, k=args.k, query_cache=None)
+                total += len(batch)
+        rate = total / (time.perf_counter() - start)
+        print(f"batch of {batch_size:>4}:     {rate:8.1f} queries/s ({rate / single:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Decode throughput of the generation backends on the same prompts: the
+transformers pipeline as load_mistral_model() loads it (4-bit when CUDA is
+available) and the llama.cpp GGUF backend on CPU at several thread
+counts. Each configuration loads the model in a fresh process.
+
+    python benchmarks/bench_llm_backends.py --backends transformers llama-cpp --threads 4 8 16
+"""
+import os
+import sys
+import time
+import argparse
+import multiprocessing as mp
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+REFERENCE_QUERIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reference_queries.txt")
+
+
+def run_backend(backend: str, threads, questions, max_new_tokens: int, results):
+    import torch
+    from app import load_mistral_model, build_prompt
+
+    start = time.perf_counter()
+    llm = load_mistral_model(mode="pipeline", backend=backend, threads=threads,
+                             use_4bit=torch.cuda.is_available())
+    load_s = time.perf_counter() - start
+
+    prompts = [build_prompt(question, "", tokenizer=llm.tokenizer)[0] for question in questions]
+    llm(prompts[0], max_new_tokens=8)  # warm-up
+    latencies, tokens = [], 0
+    for prompt in prompts:
+        start = time.perf_counter()
+        text = llm(prompt, max_new_tokens=max_new_tokens, return_full_text=False)[0]["generated_text"]
+        latencies.append(time.perf_counter() - start)
+        tokens += len(llm.tokenizer.encode(text, add_special_tokens=False))
+    results.put({
+        "backend": backend,
+        "threads": threads or "-",
+        "load_s": load_s,
+        "tokens_per_second": tokens / sum(latencies),
+        "p50_s": float(np.percentile(latencies, 50))
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark generation backends.")
+    parser.add_argument("--backends", nargs="+", default=["transformers", "llama-cpp"])
+    parser.add_argument("--threads", nargs="+", type=int, default=[os.cpu_count()],
+                        help="Thread counts to try for llama-cpp.")
+    parser.add_argument("--queries", default=REFERENCE_QUERIES, help="One question per line.")
+    parser.add_argument("--limit", type=int, default=5, help="Questions to generate for.")
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    args = parser.parse_args()
+
+    with open(args.queries, "r", encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()][:args.limit]
+
+    configs = [(backend, threads) for backend in args.backends
+               for threads in (args.threads if backend == "llama-cpp" else [None])]
+    context = mp.get_context("spawn")
+    print(f"{'backend':>12} | {'threads':>7} | {'load':>6} | {'tokens/s':>8} | {'p50 s':>6}")
+    for backend, threads in configs:
+        results = context.Queue()
+        process = context.Process(target=run_backend,
+                                  args=(backend, threads, questions, args.max_new_tokens, results))
+        process.start()
+        report = results.get()
+        process.join()
+        print(f"{report['backend']:>12} | {report['threads']:>7} | {report['load_s']:>5.1f}s | "
+              f"{report['tokens_per_second']:>8.1f} | {report['p50_s']:>6.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Prefill time saved by reusing the KV cache of format_prompt's fixed system
+instructions. Each reference question is sent one at a time with
+max_new_tokens=1 (so latency is essentially prefill) to a scheduler without
+cached prefixes and to one with them, and the first greedy tokens of both
+are compared to check the cached path generates the same text. Prefix reuse
+is a feature of the batched scheduler (MATBOT_GENERATION=batched); the
+default pipeline mode prefills the whole prompt, like the "full prefill" row.
+
+    python benchmarks/bench_prefix_cache.py --context-words 300 --parity-tokens 16
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import load_mistral_model, format_prompt, CACHED_PROMPT_PREFIXES  # noqa: E402
+from scheduler import InferenceScheduler  # noqa: E402
+
+REFERENCE_QUERIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reference_queries.txt")
+FILLER = ("MATLAB stores numeric data in arrays and matrices, and most functions operate "
+          "element-wise or along a chosen dimension. ")
+
+
+def prefill_latencies(scheduler, prompts, repeats: int):
+    latencies = []
+    for _ in range(repeats):
+        for prompt in prompts:
+            start = time.perf_counter()
+            scheduler(prompt, max_new_tokens=1)
+            latencies.append(time.perf_counter() - start)
+    return np.asarray(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark prompt-prefix KV cache reuse.")
+    parser.add_argument("--queries", default=REFERENCE_QUERIES, help="One question per line.")
+    parser.add_argument("--context-words", type=int, default=300, help="Stand-in documentation context length.")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--parity-tokens", type=int, default=16)
+    args = parser.parse_args()
+
+    with open(args.queries, "r", encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+    filler_words = FILLER.split()
+    context = " ".join(filler_words[i % len(filler_words)] for i in range(args.context_words))
+    prompts = [format_prompt(question, context) for question in questions]
+
+    loaded = load_mistral_model(mode="batched")
+    # Greedy, so the two schedulers can be compared token for token
+    cold = InferenceScheduler(loaded.model, loaded.tokenizer, max_batch_size=1, do_sample=False)
+    warm = InferenceScheduler(loaded.model, loaded.tokenizer, max_batch_size=1, do_sample=False)
+    prefix_tokens = sum(warm.register_prefix(prefix) for prefix in CACHED_PROMPT_PREFIXES)
+
+    prompt_tokens = np.mean([len(loaded.tokenizer(prompt)["input_ids"]) for prompt in prompts])
+    prefill_latencies(cold, prompts[:2], 1)  # warm-up
+    prefill_latencies(warm, prompts[:2], 1)
+    cold_ms = prefill_latencies(cold, prompts, args.repeats)
+    warm_ms = prefill_latencies(warm, prompts, args.repeats)
+
+    matches = 0
+    for prompt in prompts:
+        a = cold(prompt, max_new_tokens=args.parity_tokens, return_full_text=False)[0]["generated_text"]
+        b = warm(prompt, max_new_tokens=args.parity_tokens, return_full_text=False)[0]["generated_text"]
+        matches += a == b
+
+    print(f"prompt tokens (mean): {prompt_tokens:.0f}, cached prefix tokens: {prefix_tokens}")
+    print(f"{'':>14} | {'p50 ms':>7} | {'mean ms':>7}")
+    print(f"{'full prefill':>14} | {np.percentile(cold_ms, 50):>7.1f} | {cold_ms.mean():>7.1f}")
+    print(f"{'cached prefix':>14} | {np.percentile(warm_ms, 50):>7.1f} | {warm_ms.mean():>7.1f}")
+    print(f"prefill time saved per request: {cold_ms.mean() - warm_ms.mean():.1f} ms "
+          f"({1 - warm_ms.mean() / cold_ms.mean():.0%})")
+    print(f"greedy outputs identical ({args.parity_tokens} tokens): {matches}/{len(prompts)}")
+    print(f"scheduler stats: {warm.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Compares the PyTorch and ONNX Runtime query encoders on CPU: load time,
+query-embedding latency, process RSS, and cosine agreement with the PyTorch
+vectors. Each encoder runs in a fresh process so RSS is not shared.
+
+    python benchmarks/bench_query_encoder.py --encoders torch onnx onnx-int8 --threads 4
+"""
+import os
+import sys
+import time
+import argparse
+import multiprocessing as mp
+import numpy as np
+import psutil
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+REFERENCE_QUERIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reference_queries.txt")
+MODEL_NAME = "BAAI/bge-base-en-v1.5"
+ONNX_ENCODER_DIR = "Embed-all-Act/onnx_encoder"  # as in app.py; run from MatBot/server
+
+
+def run_encoder(encoder: str, questions, threads, repeats: int, results):
+    start = time.perf_counter()
+    if encoder == "torch":
+        import torch
+        from langchain_huggingface import HuggingFaceEmbeddings
+        if threads:
+            torch.set_num_threads(threads)
+        model = HuggingFaceEmbeddings(model_name=MODEL_NAME, model_kwargs={"device": "cpu"})
+    else:
+        # Not imported from app.py, which would load PyTorch into this process
+        from onnx_encoder import OnnxEmbeddings
+        model = OnnxEmbeddings(MODEL_NAME, ONNX_ENCODER_DIR, quantized=encoder == "onnx-int8", threads=threads)
+    load_s = time.perf_counter() - start
+
+    model.embed_query(questions[0])  # warm-up
+    latencies = []
+    for _ in range(repeats):
+        for question in questions:
+            start = time.perf_counter()
+            model.embed_query(question)
+            latencies.append(time.perf_counter() - start)
+    vectors = [model.embed_query(question) for question in questions]
+    results.put({
+        "encoder": encoder,
+        "load_s": load_s,
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p95_ms": float(np.percentile(latencies, 95) * 1000),
+        "rss_mb": psutil.Process().memory_info().rss / 2 ** 20,
+        "vectors": vectors
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PyTorch and ONNX Runtime query encoders.")
+    parser.add_argument("--encoders", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--queries", default=REFERENCE_QUERIES, help="One question per line.")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(args.queries, "r", encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+
+    context = mp.get_context("spawn")
+    reports = []
+    for encoder in args.encoders:
+        results = context.Queue()
+        process = context.Process(target=run_encoder, args=(encoder, questions, args.threads, args.repeats, results))
+        process.start()
+        reports.append(results.get())
+        process.join()
+
+    reference = next((r for r in reports if r["encoder"] == "torch"), None)
+    print(f"{'encoder':>10} | {'load':>6} | {'p50 ms':>7} | {'p95 ms':>7} | {'RSS MB':>7} | cosine vs torch (mean/min)")
+    for report in reports:
+        agreement = ""
+        if reference is not None:
+            a = np.asarray(reference["vectors"], dtype=np.float32)
+            b = np.asarray(report["vectors"], dtype=np.float32)
+            cosines = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+            agreement = f"{cosines.mean():.4f} / {cosines.min():.4f}"
+        print(f"{report['encoder']:>10} | {report['load_s']:>5.1f}s | {report['p50_ms']:>7.1f} | "
+              f"{report['p95_ms']:>7.1f} | {report['rss_mb']:>7.0f} | {agreement}")
+
+
+if __name__ == "__main__":
+    main()
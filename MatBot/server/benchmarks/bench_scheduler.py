@@ -0,0 +1,79 @@
+"""
+Aggregate generation throughput under concurrency: N threads send reference
+questions at once, either straight to a shared text-generation pipeline or
+through the continuous-batching InferenceScheduler. With the scheduler,
+tokens/sec should grow with N; with the bare pipeline it stays flat. Each
+mode loads the model in a fresh process.
+
+    python benchmarks/bench_scheduler.py --concurrency 1 2 4 8 --max-new-tokens 128
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+import multiprocessing as mp
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+REFERENCE_QUERIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reference_queries.txt")
+
+
+def run(model_pipeline, questions, concurrency: int, max_new_tokens: int):
+    tokenizer = model_pipeline.tokenizer
+    latencies, tokens = [], []
+    lock = threading.Lock()
+
+    def worker(question):
+        start = time.perf_counter()
+        text = model_pipeline(f"<s>[INST] {question} [/INST]", max_new_tokens=max_new_tokens,
+                              return_full_text=False)[0]["generated_text"]
+        with lock:
+            latencies.append(time.perf_counter() - start)
+            tokens.append(len(tokenizer(text, add_special_tokens=False)["input_ids"]))
+
+    batch = [questions[i % len(questions)] for i in range(concurrency)]
+    threads = [threading.Thread(target=worker, args=(question,)) for question in batch]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    return sum(tokens) / wall, float(np.percentile(latencies, 50)), float(np.max(latencies))
+
+
+def run_mode(mode: str, questions, levels, max_new_tokens: int, results):
+    from app import load_mistral_model
+    model_pipeline = load_mistral_model(mode=mode)
+    run(model_pipeline, questions, 1, 8)  # warm-up
+    results.put([(concurrency, *run(model_pipeline, questions, concurrency, max_new_tokens))
+                 for concurrency in levels])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent generation throughput.")
+    parser.add_argument("--modes", nargs="+", default=["pipeline", "batched"])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 2, 4, 8])
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument("--queries", default=REFERENCE_QUERIES, help="One question per line.")
+    args = parser.parse_args()
+
+    with open(args.queries, "r", encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+
+    print(f"{'mode':>9} | {'users':>5} | {'tokens/s':>8} | {'p50 s':>6} | {'max s':>6}")
+    context = mp.get_context("spawn")
+    for mode in args.modes:
+        results = context.Queue()
+        process = context.Process(target=run_mode,
+                                  args=(mode, questions, args.concurrency, args.max_new_tokens, results))
+        process.start()
+        for concurrency, tokens_per_second, p50, worst in results.get():
+            print(f"{mode:>9} | {concurrency:>5} | {tokens_per_second:>8.1f} | {p50:>6.1f} | {worst:>6.1f}")
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Compares query latency of the Chroma vectorstore and the in-process NumPy
+backend on synthetic 768-d corpora of increasing size.
+
+    python benchmarks/bench_vector_backends.py --sizes 1000 10000 100000 --queries 200
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+from langchain_chroma import Chroma
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chunk_store import ChunkStoreWriter
+from vector_backends import NumpyVectorStore, build_unit_matrix
+
+DIM = 768
+CHROMA_BATCH = 5000  # below Chroma's maximum batch size
+
+
+def make_corpus(n: int, rng) -> np.ndarray:
+    vectors = rng.standard_normal((n, DIM), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_queries(corpus: np.ndarray, n: int, rng) -> np.ndarray:
+    # Perturbed corpus vectors, so every query has a clear nearest neighbour
+    queries = corpus[rng.integers(0, len(corpus), n)] + 0.05 * rng.standard_normal((n, DIM), dtype=np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def time_queries(search, queries: np.ndarray) -> np.ndarray:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query.tolist())
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1000
+
+
+def bench_size(n: int, queries_per_size: int, k: int, workdir: str, rng) -> dict:
+    corpus = make_corpus(n, rng)
+    queries = make_queries(corpus, queries_per_size, rng)
+    ids = [f"chunk-{i}" for i in range(n)]
+    texts = [f"chunk {i}" for i in range(n)]
+    metadatas = [{"source": "synthetic.pdf", "page": i // 10} for i in range(n)]
+
+    store_dir = os.path.join(workdir, f"store_{n}")
+    with ChunkStoreWriter(store_dir) as writer:
+        writer.add(ids, texts, metadatas, corpus)
+    build_unit_matrix(store_dir)
+
+    chroma_dir = os.path.join(workdir, f"chroma_{n}")
+    vectorstore = Chroma(collection_name="bench", persist_directory=chroma_dir,
+                         collection_metadata={"hnsw:space": "cosine"})
+    for start in range(0, n, CHROMA_BATCH):
+        stop = start + CHROMA_BATCH
+        vectorstore._collection.add(ids=ids[start:stop], embeddings=corpus[start:stop].tolist(),
+                                    documents=texts[start:stop], metadatas=metadatas[start:stop])
+
+    # Cold open: what load_embedding_model pays at startup
+    start = time.perf_counter()
+    vectorstore = Chroma(collection_name="bench", persist_directory=chroma_dir)
+    vectorstore.similarity_search_by_vector(queries[0].tolist(), k=k)
+    chroma_open = time.perf_counter() - start
+    start = time.perf_counter()
+    backend = NumpyVectorStore(store_dir)
+    backend.similarity_search_by_vector(queries[0].tolist(), k=k)
+    numpy_open = time.perf_counter() - start
+
+    chroma_ms = time_queries(lambda q: vectorstore.similarity_search_by_vector(q, k=k), queries)
+    numpy_ms = time_queries(lambda q: backend.similarity_search_by_vector(q, k=k), queries)
+
+    # Overlap of Chroma's approximate (HNSW) results with the exact top-k
+    overlap = np.mean([
+        len({doc.page_content for doc in vectorstore.similarity_search_by_vector(q.tolist(), k=k)} &
+            {doc.page_content for doc in backend.similarity_search_by_vector(q.tolist(), k=k)}) / k
+        for q in queries[:50]
+    ])
+    return {
+        "n": n,
+        "chroma_open_s": chroma_open, "numpy_open_s": numpy_open,
+        "chroma_p50": np.percentile(chroma_ms, 50), "chroma_p95": np.percentile(chroma_ms, 95),
+        "numpy_p50": np.percentile(numpy_ms, 50), "numpy_p95": np.percentile(numpy_ms, 95),
+        "overlap": overlap
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Chroma against the NumPy exact-search backend.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000, 100000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    workdir = tempfile.mkdtemp(prefix="matbot-bench-")
+    try:
+        print(f"{'chunks':>8} | {'open chroma':>11} {'open numpy':>10} | "
+              f"{'chroma p50/p95 ms':>18} | {'numpy p50/p95 ms':>17} | {'top-k overlap':>13}")
+        for n in args.sizes:
+            r = bench_size(n, args.queries, args.k, workdir, rng)
+            print(f"{r['n']:>8} | {r['chroma_open_s']:>10.2f}s {r['numpy_open_s']:>9.2f}s | "
+                  f"{r['chroma_p50']:>8.2f} / {r['chroma_p95']:>7.2f} | "
+                  f"{r['numpy_p50']:>7.2f} / {r['numpy_p95']:>7.2f} | {r['overlap']:>13.1%}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Checks that the llama.cpp GGUF backend answers like the transformers path.
+Both decode the reference questions greedily (each backend in a fresh
+process); the script reports how often the first token agrees and how long
+the outputs stay identical, verifies the pipeline call shape (prompt echo,
+streaming), and exits non-zero if first-token agreement is below
+--min-agreement. Quantization flips near-ties, so outputs are not expected
+to match token for token all the way. Run it where the transformers path
+loads (a CUDA machine) with the GGUF file at MATBOT_GGUF_MODEL.
+
+    python benchmarks/check_llm_parity.py --tokens 32 --min-agreement 0.8
+"""
+import os
+import sys
+import argparse
+import multiprocessing as mp
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+REFERENCE_QUERIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reference_queries.txt")
+
+
+def generate(backend: str, questions, tokens: int, threads, results):
+    from app import load_mistral_model, build_prompt, GENERATION_KWARGS, GGUF_MODEL_PATH, MODEL_CONTEXT_TOKENS
+    from llama_cpp_backend import LlamaCppPipeline
+    from streaming import stream_generate
+
+    if backend == "llama-cpp":
+        kwargs = dict(GENERATION_KWARGS, do_sample=False)
+        llm = LlamaCppPipeline(GGUF_MODEL_PATH, "mistralai/Mistral-7B-Instruct-v0.2", threads=threads,
+                               n_ctx=MODEL_CONTEXT_TOKENS, **kwargs)
+        call = lambda prompt, **kw: llm(prompt, **kw)
+    else:
+        llm = load_mistral_model(mode="pipeline", backend="transformers")
+        call = lambda prompt, **kw: llm(prompt, do_sample=False, **kw)
+
+    outputs = []
+    for question in questions:
+        prompt, _ = build_prompt(question, "", tokenizer=llm.tokenizer)
+        text = call(prompt, max_new_tokens=tokens, return_full_text=False)[0]["generated_text"]
+        outputs.append(llm.tokenizer.encode(text, add_special_tokens=False))
+
+    # Call shape: the prompt is echoed on request, and streaming yields text
+    prompt, _ = build_prompt(questions[0], "", tokenizer=llm.tokenizer)
+    full = call(prompt, max_new_tokens=8)[0]["generated_text"]
+    streamed = "".join(stream_generate(llm, prompt, max_new_tokens=8))
+    shape_ok = full.startswith(prompt) and len(streamed) > 0
+    results.put((outputs, shape_ok))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare greedy outputs of the llama.cpp and transformers backends.")
+    parser.add_argument("--queries", default=REFERENCE_QUERIES, help="One question per line.")
+    parser.add_argument("--limit", type=int, default=10, help="Questions to compare.")
+    parser.add_argument("--tokens", type=int, default=32, help="Tokens generated per question.")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--min-agreement", type=float, default=0.8, help="Required first-token agreement.")
+    args = parser.parse_args()
+
+    with open(args.queries, "r", encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()][:args.limit]
+
+    context = mp.get_context("spawn")
+    runs = {}
+    for backend in ("transformers", "llama-cpp"):
+        results = context.Queue()
+        process = context.Process(target=generate, args=(backend, questions, args.tokens, args.threads, results))
+        process.start()
+        runs[backend] = results.get()
+        process.join()
+
+    reference, candidate = runs["transformers"][0], runs["llama-cpp"][0]
+    first, prefix_lengths = 0, []
+    for a, b in zip(reference, candidate):
+        common = 0
+        while common < min(len(a), len(b)) and a[common] == b[common]:
+            common += 1
+        first += common > 0
+        prefix_lengths.append(common)
+    agreement = first / len(questions)
+    print(f"first-token agreement: {agreement:.2f} ({first}/{len(questions)})")
+    print(f"identical prefix: mean {sum(prefix_lengths) / len(prefix_lengths):.1f} of {args.tokens} tokens, "
+          f"{sum(length >= args.tokens for length in prefix_lengths)} outputs fully identical")
+    print(f"call shape (prompt echo, streaming): "
+          f"transformers {'ok' if runs['transformers'][1] else 'FAIL'}, llama-cpp {'ok' if runs['llama-cpp'][1] else 'FAIL'}")
+
+    failed = agreement < args.min_agreement or not runs["llama-cpp"][1]
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Measures recall@k of the quantized vector backends against exact search,
+along with the memory of their first-pass codes.
+
+    python benchmarks/eval_quantized_recall.py --chunk-store Embed-all-Act/chunk_store
+    python benchmarks/eval_quantized_recall.py --synthetic 50000
+
+With a real chunk store, the questions in reference_queries.txt are embedded
+with BGE. The script exits non-zero if any mode loses more than --tolerance
+recall relative to exact search.
+"""
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chunk_store import ChunkStoreWriter
+from vector_backends import NumpyVectorStore, QuantizedVectorStore, QUANT_MODES
+
+REFERENCE_QUERIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reference_queries.txt")
+
+
+def embed_reference_queries(path: str) -> np.ndarray:
+    from langchain_huggingface import HuggingFaceEmbeddings
+    with open(path, "r", encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+    model = HuggingFaceEmbeddings(model_name="BAAI/bge-base-en-v1.5")
+    return np.array([model.embed_query(question) for question in questions], dtype=np.float32)
+
+
+def synthetic_store(path: str, n: int, rng, dim: int = 768) -> np.ndarray:
+    # Clustered vectors, closer to real embeddings than isotropic noise
+    centers = rng.standard_normal((max(n // 400, 1), dim), dtype=np.float32)
+    corpus = centers[rng.integers(0, len(centers), n)] + 0.7 * rng.standard_normal((n, dim), dtype=np.float32)
+    with ChunkStoreWriter(path) as writer:
+        writer.add([str(i) for i in range(n)], [f"chunk {i}" for i in range(n)],
+                   [{"source": "synthetic.pdf", "page": i} for i in range(n)], corpus)
+    return corpus[rng.integers(0, n, 200)] + 0.5 * rng.standard_normal((200, dim), dtype=np.float32)
+
+
+def recall(rows: np.ndarray, exact: np.ndarray) -> float:
+    return float(np.mean([len(set(a) & set(b)) / len(b) for a, b in zip(rows, exact)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall and memory of quantized vector search.")
+    parser.add_argument("--chunk-store", default="Embed-all-Act/chunk_store")
+    parser.add_argument("--queries", default=REFERENCE_QUERIES, help="One question per line.")
+    parser.add_argument("--synthetic", type=int, default=0, help="Use a synthetic corpus of this size instead.")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.02, help="Allowed recall@k drop versus exact search.")
+    args = parser.parse_args()
+
+    workdir = None
+    try:
+        if args.synthetic:
+            workdir = tempfile.mkdtemp(prefix="matbot-quant-")
+            store_dir = os.path.join(workdir, "store")
+            queries = synthetic_store(store_dir, args.synthetic, np.random.default_rng(0))
+        else:
+            store_dir = args.chunk_store
+            queries = embed_reference_queries(args.queries)
+
+        exact_store = NumpyVectorStore(store_dir)
+        exact, _ = exact_store.search(queries, args.k)
+        float32_bytes = exact_store.matrix.shape[0] * exact_store.matrix.shape[1] * 4
+        print(f"{len(queries)} queries over {exact_store.matrix.shape[0]} chunks, "
+              f"float32 vectors {float32_bytes / 2 ** 20:.1f} MB")
+
+        failed = False
+        for mode in QUANT_MODES:
+            backend = QuantizedVectorStore(store_dir, mode)
+            rows, _ = backend.search(queries, args.k)
+            score = recall(rows, exact)
+            ok = 1.0 - score <= args.tolerance
+            failed |= not ok
+            print(f"{'✅' if ok else '❌'} {mode:>6}: recall@{args.k} {score:.3f} "
+                  f"(rescoring {args.k * backend.rescore_factor} candidates), "
+                  f"codes {backend.memory_bytes() / 2 ** 20:.1f} MB "
+                  f"({float32_bytes / backend.memory_bytes():.0f}x smaller)")
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Fits the retrieval confidence calibration used to gate web search.
+
+The input is a JSON-lines file of labelled questions:
+    {"query": "How do I plot a sine wave?", "answered": true}
+"answered" records whether the retrieved manual chunks actually answered
+the question. Run from MatBot/server:
+
+    python benchmarks/fit_confidence_calibration.py labelled_queries.jsonl
+"""
+import os
+import sys
+import json
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import CONFIDENCE_CALIBRATION_PATH, load_embedding_model, query_embedding_cache
+from confidence import ConfidenceCalibrator
+from vector_backends import search_with_scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit retrieval confidence calibration from labelled queries.")
+    parser.add_argument("labels", help="JSON-lines file with query and answered fields.")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--output", default=CONFIDENCE_CALIBRATION_PATH)
+    args = parser.parse_args()
+
+    with open(args.labels, "r", encoding="utf-8") as f:
+        examples = [json.loads(line) for line in f if line.strip()]
+    embedding_model, vectorstore = load_embedding_model()
+
+    signals = []
+    for example in examples:
+        vector = query_embedding_cache.embed_query(example["query"], embedding_model)
+        scores = [score for _, score in search_with_scores(vectorstore, vector, k=args.k)]
+        signals.append(ConfidenceCalibrator.signal(scores))
+    answered = [bool(example["answered"]) for example in examples]
+
+    try:
+        calibrator = ConfidenceCalibrator().fit(signals, answered)
+    except ValueError as e:
+        print(f"❌ {e}; {args.output} left unchanged.")
+        sys.exit(1)
+    calibrator.save(args.output)
+    predicted = [calibrator.confidence([s]) >= 0.5 for s in signals]
+    accuracy = sum(p == a for p, a in zip(predicted, answered)) / len(examples)
+    print(f"✅ midpoint {calibrator.midpoint:.4f}, scale {calibrator.scale:.4f} "
+          f"({accuracy:.0%} of {len(examples)} queries on the right side of 0.5), saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import os
+import json
+import mmap
+import numpy as np
+from typing import Any, Dict, Iterable, List, Optional
+
+FORMAT_VERSION = 1
+
+# -------------------- Layout --------------------
+# A chunk store is a directory:
+#   store.json        row count, embedding dim, metadata column dictionaries
+#   text.bin          UTF-8 chunk texts, back to back
+#   text.off          int64[n + 1] byte offsets into text.bin
+#   id.bin / id.off   chunk IDs, same layout as the text
+#   meta_<key>.i32    int32[n] codes into the column's value list (-1 = missing)
+#   embeddings.f16    float16[n, dim], optional
+# Every file is raw and fixed-width, so all of it can be memory-mapped and
+# chunk N is a couple of array lookups away.
+
+class ChunkStoreWriter:
+    """
+    Appends chunks to a new chunk store without holding the corpus in memory.
+    Only the metadata codes (4 bytes per chunk and column) stay in RAM until close().
+    """
+
+    def __init__(self, path: str, dim: Optional[int] = None):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dim = dim
+        self.count = 0
+        self._text = open(os.path.join(path, "text.bin"), "wb")
+        self._text_off = open(os.path.join(path, "text.off"), "wb")
+        self._id = open(os.path.join(path, "id.bin"), "wb")
+        self._id_off = open(os.path.join(path, "id.off"), "wb")
+        self._embeddings = None
+        self._text_pos = self._id_pos = 0
+        self._text_off.write(np.zeros(1, dtype=np.int64).tobytes())
+        self._id_off.write(np.zeros(1, dtype=np.int64).tobytes())
+        self._values: Dict[str, List[Any]] = {}
+        self._lookup: Dict[str, Dict[Any, int]] = {}
+        self._codes: Dict[str, List[int]] = {}
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[dict], embeddings=None):
+        """
+        Appends a batch of chunks.
+        Args:
+            ids (List[str]): Chunk IDs.
+            texts (List[str]): Chunk texts.
+            metadatas (List[dict]): Flat metadata dicts (str/int/float/bool values).
+            embeddings: Optional [len(texts), dim] array-like; required for every batch once given.
+        """
+        metadatas = [metadata or {} for metadata in metadatas]
+        self._text_pos = _append_blobs(self._text, self._text_off, texts, self._text_pos)
+        self._id_pos = _append_blobs(self._id, self._id_off, ids, self._id_pos)
+
+        for key in set().union(*metadatas) - set(self._codes):
+            self._values[key], self._lookup[key] = [], {}
+            self._codes[key] = [-1] * self.count
+        for key, codes in self._codes.items():
+            lookup, values = self._lookup[key], self._values[key]
+            for metadata in metadatas:
+                if key not in metadata:
+                    codes.append(-1)
+                    continue
+                value = metadata[key]
+                # bool is an int subclass, keep True and 1 apart
+                token = (type(value).__name__, value)
+                if token not in lookup:
+                    lookup[token] = len(values)
+                    values.append(value)
+                codes.append(lookup[token])
+
+        if embeddings is not None:
+            matrix = np.asarray(embeddings, dtype=np.float16)
+            if self._embeddings is None:
+                if self.count:
+                    raise ValueError("Embeddings must be given for every batch or for none.")
+                self.dim = matrix.shape[1]
+                self._embeddings = open(os.path.join(self.path, "embeddings.f16"), "wb")
+            self._embeddings.write(np.ascontiguousarray(matrix).tobytes())
+        elif self._embeddings is not None:
+            raise ValueError("Embeddings must be given for every batch or for none.")
+        self.count += len(texts)
+
+    def close(self):
+        for f in (self._text, self._text_off, self._id, self._id_off, self._embeddings):
+            if f is not None:
+                f.close()
+        for key, codes in self._codes.items():
+            np.asarray(codes, dtype=np.int32).tofile(os.path.join(self.path, f"meta_{_safe(key)}.i32"))
+        header = {
+            "version": FORMAT_VERSION,
+            "count": self.count,
+            "dim": self.dim if self._embeddings is not None else None,
+            "columns": {key: {"file": f"meta_{_safe(key)}.i32", "values": values}
+                        for key, values in self._values.items()}
+        }
+        with open(os.path.join(self.path, "store.json"), "w", encoding="utf-8") as f:
+            json.dump(header, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _append_blobs(data_file, offset_file, items: Iterable[str], position: int) -> int:
+    offsets = []
+    for item in items:
+        encoded = item.encode("utf-8")
+        data_file.write(encoded)
+        position += len(encoded)
+        offsets.append(position)
+    offset_file.write(np.asarray(offsets, dtype=np.int64).tobytes())
+    return position
+
+
+def _safe(key: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in key)
+
+
+# -------------------- Reader --------------------
+class ChunkStore:
+    """
+    Read-only, memory-mapped view of a chunk store. Opening is O(1) in the
+    corpus size; pages are faulted in by the OS only when a chunk is touched,
+    and several processes opening the same store share the page cache.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "store.json"), "r", encoding="utf-8") as f:
+            header = json.load(f)
+        self.count = header["count"]
+        self.dim = header["dim"]
+        self._text = _map_bytes(os.path.join(path, "text.bin"))
+        self._text_off = np.memmap(os.path.join(path, "text.off"), dtype=np.int64, mode="r")
+        self._id = _map_bytes(os.path.join(path, "id.bin"))
+        self._id_off = np.memmap(os.path.join(path, "id.off"), dtype=np.int64, mode="r")
+        self._columns = {
+            key: (np.memmap(os.path.join(path, column["file"]), dtype=np.int32, mode="r")
+                  if self.count else np.zeros(0, dtype=np.int32), column["values"])
+            for key, column in header["columns"].items()
+        }
+        self.embeddings = None
+        if self.dim:
+            self.embeddings = np.memmap(os.path.join(path, "embeddings.f16"), dtype=np.float16,
+                                        mode="r", shape=(self.count, self.dim))
+
+    def __len__(self):
+        return self.count
+
+    def text_bytes(self, i: int) -> memoryview:
+        """Zero-copy view of chunk i's UTF-8 text."""
+        return self._text[self._text_off[i]:self._text_off[i + 1]]
+
+    def text(self, i: int) -> str:
+        return str(self.text_bytes(i), "utf-8")
+
+    def chunk_id(self, i: int) -> str:
+        return str(self._id[self._id_off[i]:self._id_off[i + 1]], "utf-8")
+
+    def metadata(self, i: int) -> dict:
+        metadata = {}
+        for key, (codes, values) in self._columns.items():
+            code = codes[i]
+            if code >= 0:
+                metadata[key] = values[code]
+        return metadata
+
+    def column(self, key: str) -> np.ndarray:
+        """Raw int32 codes of a metadata column, for vectorised filtering."""
+        return self._columns[key][0]
+
+    def values(self, key: str) -> list:
+        return self._columns[key][1]
+
+
+def _map_bytes(path: str) -> memoryview:
+    if os.path.getsize(path) == 0:
+        return memoryview(b"")
+    with open(path, "rb") as f:
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+# -------------------- Export --------------------
+def export_collection(vectorstore, path: str, page_size: int = 5000, include_embeddings: bool = True) -> int:
+    """
+    Copies every chunk of a Chroma vectorstore into a chunk store, one page at a time.
+    Args:
+        vectorstore: LangChain Chroma vectorstore.
+        path (str): Output directory.
+        page_size (int): Chunks fetched from Chroma per request.
+        include_embeddings (bool): Also store the vectors as float16.
+    Returns:
+        int: Number of chunks written.
+    """
+    include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+    with ChunkStoreWriter(path) as writer:
+        offset = 0
+        while True:
+            page = vectorstore.get(include=include, limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            writer.add(page["ids"], page["documents"], page["metadatas"],
+                       page["embeddings"] if include_embeddings else None)
+            offset += len(page["ids"])
+        return writer.count
@@ -0,0 +1,82 @@
+import os
+import json
+import math
+import numpy as np
+from typing import Dict, Sequence
+
+# Below this fitted slope the similarities do not separate answered from
+# unanswered queries, and std / w would blow up or flip the curve
+MIN_SLOPE = 1e-6
+
+
+class ConfidenceCalibrator:
+    """
+    Maps retrieval cosine similarities to the probability that the manuals
+    answer the question, with Platt scaling: sigmoid((s - midpoint) / scale)
+    on s = 0.7 * top-1 + 0.3 * mean(top-3) similarity.
+
+    The defaults suit BGE-base, where on-topic chunks score ~0.75-0.9 and
+    off-topic ones ~0.5-0.65; fit() re-estimates them from labelled queries.
+    """
+
+    def __init__(self, midpoint: float = 0.68, scale: float = 0.04):
+        self.midpoint = midpoint
+        self.scale = scale
+
+    @staticmethod
+    def signal(similarities: Sequence[float]) -> float:
+        if not len(similarities):
+            return 0.0
+        top = sorted(similarities, reverse=True)[:3]
+        return 0.7 * top[0] + 0.3 * float(np.mean(top))
+
+    def confidence(self, similarities: Sequence[float]) -> float:
+        if not len(similarities):
+            return 0.0
+        z = (self.signal(similarities) - self.midpoint) / self.scale
+        return 1.0 / (1.0 + math.exp(-max(min(z, 50.0), -50.0)))
+
+    def fit(self, signals: Sequence[float], answered: Sequence[bool], steps: int = 2000, lr: float = 0.5):
+        """
+        Fits midpoint and scale by logistic regression.
+        Args:
+            signals: signal() of each labelled query's retrieval similarities.
+            answered: Whether the retrieved manuals actually answered that query.
+        Raises:
+            ValueError: If higher similarity does not predict an answer; the current
+                midpoint and scale are kept.
+        """
+        x = np.asarray(signals, dtype=np.float64)
+        y = np.asarray(answered, dtype=np.float64)
+        mean, std = x.mean(), x.std() or 1.0
+        xs = (x - mean) / std
+        w, b = 1.0, 0.0
+        for _ in range(steps):
+            p = 1.0 / (1.0 + np.exp(-(w * xs + b)))
+            w -= lr * float(np.mean((p - y) * xs))
+            b -= lr * float(np.mean(p - y))
+        if w < MIN_SLOPE:
+            raise ValueError(f"Fitted slope {w:.3g} is not positive: retrieval similarity does not "
+                             f"separate answered from unanswered queries in this data")
+        # sigmoid(w * (s - mean) / std + b) == sigmoid((s - midpoint) / scale)
+        self.scale = std / w
+        self.midpoint = mean - b * std / w
+        return self
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"midpoint": self.midpoint, "scale": self.scale}, f)
+
+    @classmethod
+    def load(cls, path: str) -> "ConfidenceCalibrator":
+        """Loads fitted parameters, or the defaults if path does not exist."""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(**json.load(f))
+
+    def describe(self, similarities: Sequence[float]) -> Dict[str, float]:
+        return {
+            "confidence": round(self.confidence(similarities), 4),
+            "top_similarity": round(float(max(similarities)), 4) if len(similarities) else 0.0
+        }
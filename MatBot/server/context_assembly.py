@@ -0,0 +1,308 @@
+import re
+import numpy as np
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from function_index import join_overlapping
+from embedding_cache import CachedEmbeddings
+
+_WORD = re.compile(r"\w+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(`])|\n+")
+# Source headers written by the web search providers ("From Wikipedia (...):", "From https://...:")
+_SOURCE_HEADER = re.compile(r"^From .+:$")
+
+
+# -------------------- Token Counting --------------------
+def make_token_counter(tokenizer=None) -> Callable[[str], int]:
+    """
+    Returns a function counting the tokens of a text with the generation model's
+    tokenizer, or ~4 characters per token when no tokenizer is available.
+    """
+    if tokenizer is None:
+        return lambda text: (len(text) + 3) // 4
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+
+
+def truncate_to_budget(text: str, budget: int, count_tokens: Callable[[str], int]) -> str:
+    """Keeps whole paragraphs of text, in order, while they fit in budget tokens."""
+    if count_tokens(text) <= budget:
+        return text
+    kept, used = [], 0
+    for paragraph in text.split("\n\n"):
+        cost = count_tokens(paragraph)
+        if used + cost > budget:
+            break
+        kept.append(paragraph)
+        used += cost
+    if not kept:
+        # A single oversized paragraph: cut it proportionally
+        return text[:len(text) * budget // count_tokens(text)]
+    return "\n\n".join(kept)
+
+
+def truncate_tokens(text: str, budget: int, tokenizer=None) -> str:
+    """Keeps the first budget tokens of text (~4 characters per token without a tokenizer)."""
+    if budget <= 0:
+        return ""
+    if tokenizer is None:
+        return text[:budget * 4]
+    ids = tokenizer.encode(text, add_special_tokens=False)
+    if len(ids) <= budget:
+        return text
+    return tokenizer.decode(ids[:budget], skip_special_tokens=True)
+
+
+# -------------------- Adaptive k --------------------
+def adaptive_cutoff(scores: Sequence[float], min_k: int = 2, max_k: int = 8, floor: float = 0.8) -> int:
+    """
+    Picks how many results to keep from a best-first score list: at most those
+    scoring floor * best, cut at the largest relative drop after min_k.
+    Returns:
+        int: Number of results to keep.
+    """
+    if len(scores) <= min_k:
+        return len(scores)
+    top = scores[0]
+    keep = min_k
+    while keep < min(len(scores), max_k) and scores[keep] >= floor * top:
+        keep += 1
+    # An elbow inside the kept range means the tail is a different population
+    gaps = [(scores[i - 1] - scores[i]) / (abs(scores[i - 1]) or 1.0) for i in range(min_k, keep)]
+    if gaps and max(gaps) > 0.15:
+        keep = min_k + gaps.index(max(gaps))
+    return keep
+
+
+# -------------------- MMR --------------------
+def _word_set(text: str) -> frozenset:
+    return frozenset(_WORD.findall(text.lower()))
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+def mmr_order(docs: List, scores: Sequence[float], diversity: float = 0.3,
+              redundancy_threshold: float = 0.8) -> List[int]:
+    """
+    Orders documents by maximal marginal relevance:
+    (1 - diversity) * relevance - diversity * max similarity to those already picked.
+    Similarity is the Jaccard overlap of word sets, so no document vectors are
+    needed; documents above redundancy_threshold to a picked one are dropped.
+    Returns:
+        List[int]: Indices into docs, in selection order.
+    """
+    if not docs:
+        return []
+    top, bottom = max(scores), min(scores)
+    relevance = [(s - bottom) / (top - bottom) if top > bottom else 1.0 for s in scores]
+    words = [_word_set(doc.page_content) for doc in docs]
+    remaining = list(range(len(docs)))
+    picked: List[int] = []
+    while remaining:
+        best, best_value = None, None
+        for i in list(remaining):
+            similarity = max((_jaccard(words[i], words[j]) for j in picked), default=0.0)
+            if similarity >= redundancy_threshold:
+                remaining.remove(i)
+                continue
+            value = (1 - diversity) * relevance[i] - diversity * similarity
+            if best_value is None or value > best_value:
+                best, best_value = i, value
+        if best is None:
+            break
+        picked.append(best)
+        remaining.remove(best)
+    return picked
+
+
+# -------------------- Merging --------------------
+def merge_page_chunks(docs: List) -> List[Tuple[str, List]]:
+    """
+    Merges chunks of the same source page into one passage, removing the text
+    consecutive chunks share (the splitter's chunk_overlap).
+    Returns:
+        List[Tuple[str, List]]: (passage text, merged documents), in first-appearance order.
+    """
+    groups: Dict[tuple, List] = {}
+    for doc in docs:
+        groups.setdefault((doc.metadata.get("source"), doc.metadata.get("page")), []).append(doc)
+
+    passages = []
+    for members in groups.values():
+        texts = [doc.page_content for doc in members]
+        # Chain chunks whose start overlaps another chunk's end, in page order
+        ordered = []
+        while texts:
+            chain = [texts.pop(0)]
+            extended = True
+            while extended and texts:
+                extended = False
+                for i, text in enumerate(texts):
+                    if _overlap(chain[-1], text):
+                        chain.append(texts.pop(i))
+                        extended = True
+                        break
+                    if _overlap(text, chain[0]):
+                        chain.insert(0, texts.pop(i))
+                        extended = True
+                        break
+            ordered.append(join_overlapping(chain))
+        passages.append(("\n".join(ordered), members))
+    return passages
+
+
+def _overlap(first: str, second: str, min_chars: int = 20, max_chars: int = 512) -> bool:
+    """True if second starts with at least min_chars of the end of first."""
+    for size in range(min(max_chars, len(first), len(second)), min_chars - 1, -1):
+        if first.endswith(second[:size]):
+            return True
+    return False
+
+
+# -------------------- Assembly --------------------
+class _Passage:
+    """Document-like wrapper so mmr_order() can rank merged passages."""
+
+    def __init__(self, page_content: str):
+        self.page_content = page_content
+
+
+def assemble_context(scored_docs: List[Tuple], budget: int = 1500,
+                     count_tokens: Optional[Callable[[str], int]] = None,
+                     min_k: int = 2, max_k: int = 8, diversity: float = 0.3,
+                     cutoff_scores: Optional[Sequence[float]] = None) -> Tuple[str, List, Dict]:
+    """
+    Builds the documentation context for the prompt from retrieved chunks.
+
+    Chunks are cut adaptively from the score distribution, merged per page
+    where they overlap, ordered by MMR (near-duplicate passages dropped), and
+    added in that order while they fit in the token budget.
+    Args:
+        scored_docs (List[Tuple]): (Document, score) pairs, best first.
+        budget (int): Maximum context tokens.
+        count_tokens: Token counter, see make_token_counter().
+        min_k (int): Chunks always considered.
+        max_k (int): Chunks never exceeded.
+        diversity (float): MMR trade-off; 0 ranks by relevance only.
+        cutoff_scores (Optional[Sequence[float]]): Best-first cosine similarities to take
+            the adaptive cut on when scored_docs carries reciprocal-rank fusion scores,
+            whose near-uniform 1/(60 + rank) steps the cut was not tuned for.
+    Returns:
+        tuple: Context string, documents used (in MMR order), and a report dict.
+    """
+    count_tokens = count_tokens or make_token_counter()
+    docs = [doc for doc, _ in scored_docs]
+    scores = [float(score) for _, score in scored_docs]
+    keep = min(adaptive_cutoff(scores if cutoff_scores is None else [float(s) for s in cutoff_scores],
+                               min_k, max_k), len(docs))
+
+    # Overlapping chunks of a page become one passage before redundancy is judged
+    passages = merge_page_chunks(docs[:keep])
+    best_score = {id(doc): score for doc, score in zip(docs, scores)}
+    passage_scores = [max(best_score[id(doc)] for doc in members) for _, members in passages]
+    order = mmr_order([_Passage(text) for text, _ in passages], passage_scores, diversity)
+
+    texts, used, tokens = [], [], 0
+    for i in order:
+        text, members = passages[i]
+        cost = count_tokens(text)
+        if tokens + cost > budget:
+            if texts:
+                continue
+            # Never return an empty context: trim the best passage instead
+            text = truncate_to_budget(text, budget, count_tokens)
+            cost = count_tokens(text)
+        texts.append(text)
+        used.extend(members)
+        tokens += cost
+
+    report = {
+        "candidates": len(docs),
+        "adaptive_k": keep,
+        "redundant_dropped": len(passages) - len(order),
+        "chunks_used": len(used),
+        "passages": len(texts),
+        "context_tokens": tokens
+    }
+    return "\n\n".join(texts), used, report
+
+
+# -------------------- Web Compression --------------------
+def compress_web_context(query: str, web_context: str, embedding_model, budget: int = 600,
+                         count_tokens: Optional[Callable[[str], int]] = None,
+                         query_vector: Optional[Sequence[float]] = None,
+                         min_similarity: float = 0.45, max_sentences: int = 256) -> Tuple[str, Dict]:
+    """
+    Extractive compression of web search results: keeps the sentences most
+    similar to the query under the BGE model, up to the token budget, in
+    their original order and under their source headers.
+    Args:
+        query (str): User query.
+        web_context (str): Combined provider output.
+        embedding_model: The loaded embedding model; a CachedEmbeddings wrapper
+            is bypassed so web sentences do not fill the document cache.
+        budget (int): Maximum tokens of compressed context.
+        count_tokens: Token counter, see make_token_counter().
+        query_vector: Query embedding, if already computed.
+        min_similarity (float): Sentences below this cosine are never kept.
+        max_sentences (int): Sentences embedded at most; beyond this the ones
+            sharing the most words with the query are preferred.
+    Returns:
+        tuple: Compressed context and {"tokens_before", "tokens_after", "tokens_saved"}.
+    """
+    count_tokens = count_tokens or make_token_counter()
+    tokens_before = count_tokens(web_context) if web_context else 0
+    sentences: List[Tuple[int, str]] = []  # (source index, sentence)
+    headers: List[str] = []
+    for line in web_context.split("\n"):
+        if _SOURCE_HEADER.match(line.strip()):
+            headers.append(line.strip())
+            continue
+        for sentence in _SENTENCE_END.split(line):
+            if len(_WORD.findall(sentence)) >= 4:
+                sentences.append((max(len(headers) - 1, 0), sentence.strip()))
+    if not sentences:
+        # Nothing to rank (e.g. tables or code only): still hold the budget
+        compressed = truncate_to_budget(web_context, budget, count_tokens) if web_context else ""
+        tokens_after = count_tokens(compressed) if compressed else 0
+        return compressed, {"tokens_before": tokens_before, "tokens_after": tokens_after,
+                            "tokens_saved": tokens_before - tokens_after}
+
+    if len(sentences) > max_sentences:
+        query_words = _word_set(query)
+        overlap = [len(query_words & _word_set(sentence)) for _, sentence in sentences]
+        top = sorted(np.argsort(overlap, kind="stable")[::-1][:max_sentences])
+        sentences = [sentences[i] for i in top]
+
+    if isinstance(embedding_model, CachedEmbeddings):
+        embedding_model = embedding_model.embeddings
+    vectors = np.asarray(embedding_model.embed_documents([sentence for _, sentence in sentences]), dtype=np.float32)
+    query_vector = np.asarray(query_vector if query_vector is not None else embedding_model.embed_query(query),
+                              dtype=np.float32)
+    similarities = vectors @ query_vector / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query_vector) + 1e-12)
+
+    kept, used_sources, tokens = set(), set(), 0
+    for i in np.argsort(-similarities):
+        if similarities[i] < min_similarity:
+            break
+        source, sentence = sentences[i]
+        cost = count_tokens(sentence)
+        if source not in used_sources and source < len(headers):
+            cost += count_tokens(headers[source])  # first sentence of a source brings its header
+        if tokens + cost > budget:
+            continue
+        kept.add(int(i))
+        used_sources.add(source)
+        tokens += cost
+
+    blocks: Dict[int, List[str]] = {}
+    for i in sorted(kept):
+        blocks.setdefault(sentences[i][0], []).append(sentences[i][1])
+    compressed = "\n\n".join(
+        (f"{headers[source]}\n" if source < len(headers) else "") + " ".join(block)
+        for source, block in blocks.items()
+    )
+    tokens_after = count_tokens(compressed) if compressed else 0
+    return compressed, {"tokens_before": tokens_before, "tokens_after": tokens_after,
+                        "tokens_saved": tokens_before - tokens_after}
+
@@ -0,0 +1,134 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from array import array
+from typing import List, Optional
+from langchain_core.embeddings import Embeddings
+
+# -------------------- Keys --------------------
+def normalize_text(text: str) -> str:
+    """
+    Normalizes text for cache lookups. Only whitespace is folded, which the
+    BGE tokenizer ignores anyway, so a cached vector is exact for every text
+    that maps to the same key.
+    """
+    return " ".join(text.split())
+
+
+def normalize_query(query: str) -> str:
+    """
+    Folds case and whitespace. BGE's English tokenizer is uncased, so
+    "How to plot" and "how  to plot" embed to the same vector. Every writer
+    of kind="query" entries keys them by this, so they share hits.
+    """
+    return " ".join(query.casefold().split())
+
+
+def cache_key(model_name: str, text: str, kind: str = "doc") -> str:
+    """
+    Args:
+        model_name (str): Embedding model identifier.
+        text (str): Raw text.
+        kind (str): "doc" or "query", in case a model embeds the two differently.
+    Returns:
+        str: Hex SHA-256 of model, kind and normalized text.
+    """
+    payload = f"{model_name}\0{kind}\0{normalize_text(text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# -------------------- On-disk Cache --------------------
+class EmbeddingCache:
+    """
+    SQLite-backed store of embedding vectors keyed by cache_key().
+
+    The same file can be shared by ingestion runs (any chunking configuration)
+    and by the query server; WAL mode lets several processes read while one writes.
+    """
+
+    def __init__(self, path: str, model_name: str):
+        self.path = path
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.commit()
+
+    def get_many(self, texts: List[str], kind: str = "doc") -> List[Optional[List[float]]]:
+        """
+        Returns:
+            List[Optional[List[float]]]: Cached vector per text, or None on a miss.
+        """
+        keys = [cache_key(self.model_name, text, kind) for text in texts]
+        found = {}
+        with self._lock:
+            # SQLite caps bound parameters, so look keys up in slices
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                found.update(rows)
+        return [_decode(found[key]) if key in found else None for key in keys]
+
+    def put_many(self, texts: List[str], vectors: List[List[float]], kind: str = "doc"):
+        rows = [(cache_key(self.model_name, text, kind), _encode(vector)) for text, vector in zip(texts, vectors)]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+def _encode(vector) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _decode(blob: bytes) -> List[float]:
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+# -------------------- Embeddings Wrapper --------------------
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps a LangChain embedding model so only texts missing from the cache are encoded.
+    Drop-in for HuggingFaceEmbeddings wherever Chroma or query_database expects one.
+    """
+
+    def __init__(self, embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = cache.model_name
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.cache.get_many(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            computed = self.embeddings.embed_documents([texts[i] for i in missing])
+            self.cache.put_many([texts[i] for i in missing], computed)
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        # Keyed like QueryEmbeddingCache's disk tier, so the two share entries
+        normalized = normalize_query(text)
+        vector = self.cache.get_many([normalized], kind="query")[0]
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put_many([normalized], [vector], kind="query")
+            self.misses += 1
+        else:
+            self.hits += 1
+        return vector
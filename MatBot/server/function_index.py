@@ -0,0 +1,157 @@
+import re
+import json
+from typing import Dict, List, Optional
+
+from chunk_store import ChunkStore
+
+# Manuals whose pages are one function per entry, headed by the function name.
+REFERENCE_MANUALS = ("matlab_ref.pdf", "matlab_apiref.pdf")
+
+_IDENTIFIER = re.compile(r"^[A-Za-z][A-Za-z0-9_]*(?:\.[A-Za-z][A-Za-z0-9_]*)*$")
+_QUERY_TOKEN = re.compile(r"[A-Za-z][A-Za-z0-9_]*(?:\.[A-Za-z][A-Za-z0-9_]*)*")
+_SECTION_TITLES = frozenset(
+    "syntax description examples example tips algorithms contents index introduction "
+    "arguments see also references limitations output input properties methods".split()
+)
+# Words that may surround a function name in a pure "look this function up" question
+_LOOKUP_FILLERS = frozenset(
+    "what whats does do did is are the a an of for on syntax usage use using used how to i can "
+    "explain describe show me tell about function functions command matlab in help doc docs "
+    "documentation mean means work works purpose please".split()
+)
+# Many function names are also English words ("error", "plot", "input"), so a
+# query is only taken as a lookup when it reads like code: one of these words,
+# the name in backticks or followed by "(", or a name no prose word looks like
+_LOOKUP_CUES = frozenset("function functions command syntax".split())
+_CODE_LIKE_NAME = re.compile(r"[0-9_.]|[a-z][A-Z]")
+
+# -------------------- Build --------------------
+def build_function_index(chunk_store_dir: str, out_path: str, manuals=REFERENCE_MANUALS) -> int:
+    """
+    Extracts a function name -> reference page index from the reference manuals.
+
+    Reference pages start with the function name as a running header. A name is
+    kept only if one of its pages has a "Syntax" section; the entry points at
+    that page and at the following page of the same entry.
+    Args:
+        chunk_store_dir (str): Chunk store written by the Embed-all scripts.
+        out_path (str): JSON file to write.
+        manuals: Source file names to scan.
+    Returns:
+        int: Number of functions indexed.
+    """
+    store = ChunkStore(chunk_store_dir)
+    pages: Dict[tuple, List[int]] = {}
+    for row in range(len(store)):
+        metadata = store.metadata(row)
+        if metadata.get("source") in manuals:
+            pages.setdefault((metadata["source"], metadata.get("page", 0)), []).append(row)
+
+    entries: Dict[str, Dict] = {}
+    for (source, page), rows in sorted(pages.items()):
+        head = _first_line(store.text(rows[0]))
+        if not _IDENTIFIER.match(head) or head.lower() in _SECTION_TITLES:
+            continue
+        has_syntax = any("Syntax" in store.text(row) for row in rows)
+        entry = entries.setdefault(head.lower(), {"name": head, "source": source, "pages": []})
+        if entry["source"] == source:
+            entry["pages"].append({"page": page, "rows": rows, "syntax": has_syntax})
+
+    index = {}
+    for key, entry in entries.items():
+        syntax_pages = [i for i, page in enumerate(entry["pages"]) if page["syntax"]]
+        if not syntax_pages:
+            continue
+        first = syntax_pages[0]
+        selected = [page for page in entry["pages"][first:first + 2]
+                    if page["page"] - entry["pages"][first]["page"] <= 1]
+        index[key] = {
+            "name": entry["name"],
+            "source": entry["source"],
+            "page": selected[0]["page"],
+            "rows": [row for page in selected for row in page["rows"]]
+        }
+
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    return len(index)
+
+
+def _first_line(text: str) -> str:
+    for line in text.splitlines():
+        if line.strip():
+            return line.strip()
+    return ""
+
+
+# -------------------- Lookup --------------------
+class FunctionIndex:
+    """Function name -> reference text lookup backed by the chunk store."""
+
+    def __init__(self, index_path: str, chunk_store_dir: str):
+        with open(index_path, "r", encoding="utf-8") as f:
+            self.entries = json.load(f)
+        self.store = ChunkStore(chunk_store_dir)
+
+    def detect(self, query: str) -> Optional[str]:
+        """
+        Recognises single-function lookups such as "what does interp1 do" or
+        "syntax of fprintf": exactly one non-filler word, it is an indexed
+        function, and the query reads like code (see _has_code_cue), so that
+        "what does the error mean" is not taken for the error function.
+        Returns:
+            Optional[str]: Index key of the function, or None.
+        """
+        words = _QUERY_TOKEN.findall(query)
+        if not words or len(words) > 12:
+            return None
+        remaining = [word for word in words if word.lower() not in _LOOKUP_FILLERS]
+        if not remaining:
+            # The function may itself be a filler word, e.g. "what does doc do"
+            remaining = [word for word in words if word.lower() in self.entries]
+        if len(remaining) != 1 or remaining[0].lower() not in self.entries:
+            return None
+        name = remaining[0]
+        return name.lower() if _has_code_cue(query, name, words) else None
+
+    def lookup(self, key: str) -> Dict:
+        """
+        Returns:
+            Dict: name, source, page, reference text and per-chunk metadata.
+        """
+        entry = self.entries[key]
+        rows = entry["rows"]
+        return {
+            "name": entry["name"],
+            "source": entry["source"],
+            "page": entry["page"],
+            "text": join_overlapping([self.store.text(row) for row in rows]),
+            "metadata": [self.store.metadata(row) for row in rows]
+        }
+
+
+def _has_code_cue(query: str, name: str, words: List[str]) -> bool:
+    if any(word.lower() in _LOOKUP_CUES for word in words):
+        return True
+    if re.search(rf"`\s*{re.escape(name)}\b|\b{re.escape(name)}\s*\(", query):
+        return True
+    return bool(_CODE_LIKE_NAME.search(name))
+
+
+def join_overlapping(texts: List[str], max_overlap: int = 512, min_overlap: int = 20) -> str:
+    """
+    Concatenates consecutive chunks, dropping the text each one repeats from
+    the end of the previous chunk (the splitter's chunk_overlap). Shorter
+    matches than min_overlap are treated as coincidence.
+    """
+    if not texts:
+        return ""
+    joined = texts[0]
+    for text in texts[1:]:
+        overlap = 0
+        for size in range(min(max_overlap, len(joined), len(text)), min_overlap - 1, -1):
+            if joined.endswith(text[:size]):
+                overlap = size
+                break
+        joined += ("" if overlap else "\n") + text[overlap:]
+    return joined
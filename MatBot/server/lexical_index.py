@@ -0,0 +1,173 @@
+import os
+import re
+import json
+import math
+import hashlib
+import numpy as np
+from array import array
+from typing import Dict, List, Tuple
+from langchain.schema import Document
+
+from chunk_store import ChunkStore
+
+# Identifiers may carry "." or ":" (MATLAB:badsubscript, matlab.ui.Figure);
+# such tokens are indexed whole and also split into their parts.
+_TOKEN = re.compile(r"[a-z_][a-z0-9_]*(?:[.:][a-z_][a-z0-9_]*)*|\d+(?:\.\d+)?")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i if in is it of on or "
+    "that the this to what when where which with you your".split()
+)
+
+K1 = 1.2
+B = 0.75
+
+# -------------------- Tokenizer --------------------
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercases and splits text into BM25 terms, keeping MATLAB identifiers,
+    error IDs and option names ('LineWidth' -> linewidth) intact.
+    """
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        tokens.append(token)
+        if "." in token or ":" in token:
+            tokens.extend(part for part in re.split(r"[.:]", token) if part not in _STOPWORDS)
+    return tokens
+
+
+# -------------------- Build --------------------
+def build_lexical_index(chunk_store_dir: str, index_dir: str) -> int:
+    """
+    Builds a compact BM25 inverted index over a chunk store.
+
+    Postings are stored term-major as flat arrays (document row, term frequency),
+    with per-term offsets, so the index is memory-mapped at query time and a
+    term's postings are one contiguous slice. Document numbers are chunk store rows.
+    Args:
+        chunk_store_dir (str): Chunk store written by the Embed-all scripts.
+        index_dir (str): Output directory.
+    Returns:
+        int: Vocabulary size.
+    """
+    store = ChunkStore(chunk_store_dir)
+    vocabulary: Dict[str, int] = {}
+    post_term, post_doc, post_tf = array("i"), array("i"), array("H")
+    doc_len = np.zeros(len(store), dtype=np.int32)
+
+    for row in range(len(store)):
+        tokens = tokenize(store.text(row))
+        doc_len[row] = len(tokens)
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, tf in counts.items():
+            post_term.append(vocabulary.setdefault(token, len(vocabulary)))
+            post_doc.append(row)
+            post_tf.append(min(tf, 65535))
+
+    terms = np.frombuffer(post_term, dtype=np.int32)
+    order = np.argsort(terms, kind="stable")  # term-major, rows ascending within a term
+    term_off = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(terms, minlength=len(vocabulary)), out=term_off[1:])
+
+    os.makedirs(index_dir, exist_ok=True)
+    np.frombuffer(post_doc, dtype=np.int32)[order].tofile(os.path.join(index_dir, "post_doc.i32"))
+    np.frombuffer(post_tf, dtype=np.uint16)[order].tofile(os.path.join(index_dir, "post_tf.u16"))
+    term_off.tofile(os.path.join(index_dir, "term_off.i64"))
+    doc_len.tofile(os.path.join(index_dir, "doc_len.i32"))
+    with open(os.path.join(index_dir, "vocab.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "terms": sorted(vocabulary, key=vocabulary.get),
+            "doc_count": len(store),
+            "avg_doc_len": float(doc_len.mean()) if len(store) else 0.0
+        }, f)
+    return len(vocabulary)
+
+
+# -------------------- Search --------------------
+class LexicalIndex:
+    """Memory-mapped BM25 index over a chunk store."""
+
+    def __init__(self, index_dir: str, chunk_store_dir: str):
+        with open(os.path.join(index_dir, "vocab.json"), "r", encoding="utf-8") as f:
+            header = json.load(f)
+        self.vocabulary = {term: i for i, term in enumerate(header["terms"])}
+        self.doc_count = header["doc_count"]
+        self.avg_doc_len = header["avg_doc_len"] or 1.0
+        self.term_off = np.fromfile(os.path.join(index_dir, "term_off.i64"), dtype=np.int64)
+        self.post_doc = _memmap(os.path.join(index_dir, "post_doc.i32"), np.int32)
+        self.post_tf = _memmap(os.path.join(index_dir, "post_tf.u16"), np.uint16)
+        # Precompute the BM25 length normalisation once per document
+        doc_len = np.fromfile(os.path.join(index_dir, "doc_len.i32"), dtype=np.int32)
+        self.length_norm = (K1 * (1 - B + B * doc_len / self.avg_doc_len)).astype(np.float32)
+        self.store = ChunkStore(chunk_store_dir)
+
+    def search(self, query: str, k: int = 20) -> List[Tuple[int, float]]:
+        """
+        Returns:
+            List[Tuple[int, float]]: (chunk store row, BM25 score), best first.
+        """
+        scores = np.zeros(self.doc_count, dtype=np.float32)
+        matched = False
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, stop = self.term_off[term_id], self.term_off[term_id + 1]
+            docs = self.post_doc[start:stop]
+            tf = self.post_tf[start:stop].astype(np.float32)
+            df = stop - start
+            idf = math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tf * (K1 + 1) / (tf + self.length_norm[docs])
+            matched = True
+        if not matched:
+            return []
+
+        k = min(k, self.doc_count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top if scores[row] > 0]
+
+    def documents(self, rows: List[int]) -> List[Document]:
+        return [Document(page_content=self.store.text(row), metadata=self.store.metadata(row)) for row in rows]
+
+
+def _memmap(path: str, dtype) -> np.ndarray:
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+# -------------------- Fusion --------------------
+def content_key(doc) -> str:
+    """Identity of a chunk that is the same whether it came from Chroma or the chunk store."""
+    payload = f'{doc.metadata.get("source")}\0{doc.metadata.get("page")}\0{doc.page_content}'
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def reciprocal_rank_fusion(result_lists: List[list], k: int = 5, rrf_k: int = 60,
+                           with_scores: bool = False) -> list:
+    """
+    Merges ranked document lists with reciprocal-rank fusion: each document
+    scores sum(1 / (rrf_k + rank)) over the lists it appears in.
+    Args:
+        result_lists (List[list]): Ranked Document lists, best first.
+        k (int): Number of fused results to return.
+        rrf_k (int): Rank damping constant (60 in the original RRF paper).
+        with_scores (bool): Return (Document, fused score) pairs.
+    Returns:
+        list: Top-k Documents, best first.
+    """
+    scores: Dict[str, float] = {}
+    docs = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, 1):
+            key = content_key(doc)
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+    ranked = sorted(scores, key=scores.get, reverse=True)[:k]
+    if with_scores:
+        return [(docs[key], scores[key]) for key in ranked]
+    return [docs[key] for key in ranked]
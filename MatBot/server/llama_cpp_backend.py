@@ -0,0 +1,72 @@
+import os
+import time
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+from llama_cpp import Llama
+from transformers import AutoTokenizer
+
+
+class LlamaCppPipeline:
+    """
+    Mistral-7B-Instruct from a quantized GGUF file (e.g. Q4_K_M, or Q8_0 for
+    int8) run on CPU with llama.cpp, behind the text-generation pipeline's call
+    shape:
+        llm(prompt, max_new_tokens=256, streamer=streamer, return_full_text=False)[0]["generated_text"]
+
+    Prompts are tokenized with the Hugging Face tokenizer, exactly as on the
+    transformers path, and generated ids are fed to transformers streamers, so
+    build_prompt() and stream_generate() work unchanged. llama.cpp keeps the
+    KV cache of the previous prompt and only evaluates what differs, so the
+    fixed instruction prefix is not recomputed between requests. One llama.cpp
+    context serves one generation at a time; concurrent callers queue.
+    """
+
+    def __init__(self, model_path: str, tokenizer_id: str, threads: Optional[int] = None, n_ctx: int = 8192,
+                 max_new_tokens: int = 1024, do_sample: bool = True, temperature: float = 0.3,
+                 top_k: int = 50, top_p: float = 0.95, repetition_penalty: float = 1.2):
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"GGUF model {model_path} not found")
+        self.threads = threads or os.cpu_count()
+        self.llm = Llama(model_path=model_path, n_ctx=n_ctx, n_threads=self.threads,
+                         n_threads_batch=self.threads, logits_all=False, verbose=False)
+        self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_id, use_fast=True)
+        self.max_new_tokens = max_new_tokens
+        # temp=0 makes llama.cpp decode greedily
+        self.sampling = dict(temp=temperature if do_sample else 0.0, top_k=top_k, top_p=top_p,
+                             min_p=0.0, repeat_penalty=repetition_penalty)
+        self.eos_token_id = self.llm.token_eos()
+        self._lock = threading.Lock()
+        self.generated_tokens = 0
+        self.busy_seconds = 0.0
+
+    def __call__(self, prompt: str, max_new_tokens: Optional[int] = None, streamer=None,
+                 return_full_text: bool = True) -> List[Dict[str, str]]:
+        prompt_ids = self.tokenizer(prompt)["input_ids"]
+        limit = max_new_tokens or self.max_new_tokens
+        output_ids: List[int] = []
+        if streamer is not None:
+            streamer.put(np.asarray(prompt_ids))  # skipped by skip_prompt streamers, as in generate()
+        try:
+            with self._lock:
+                start = time.perf_counter()
+                for token in self.llm.generate(prompt_ids, reset=True, **self.sampling):
+                    output_ids.append(token)
+                    if streamer is not None:
+                        streamer.put(np.asarray([token]))
+                    if token == self.eos_token_id or len(output_ids) >= limit:
+                        break
+                self.busy_seconds += time.perf_counter() - start
+                self.generated_tokens += len(output_ids)
+        finally:
+            if streamer is not None:
+                streamer.end()
+        text = self.tokenizer.decode(output_ids, skip_special_tokens=True)
+        return [{"generated_text": prompt + text if return_full_text else text}]
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "generated_tokens": self.generated_tokens,
+            "tokens_per_second": round(self.generated_tokens / self.busy_seconds, 1) if self.busy_seconds else 0.0,
+            "threads": self.threads
+        }
@@ -0,0 +1,116 @@
+import os
+import numpy as np
+import onnxruntime as ort
+from typing import List, Optional
+from transformers import AutoTokenizer
+from langchain_core.embeddings import Embeddings
+
+MAX_LENGTH = 512
+# Checked against the PyTorch model right after export
+AGREEMENT_SAMPLES = [
+    "How do I plot a sine wave in MATLAB?",
+    "vq = interp1(x,v,xq) returns interpolated values of a 1-D function at specific query points.",
+    "Error using horzcat: Dimensions of arrays being concatenated are not consistent.",
+    "Use ode45 to solve nonstiff differential equations with a medium order method."
+]
+MIN_AGREEMENT = 0.99
+
+# -------------------- Export --------------------
+def export_onnx_encoder(model_name: str, out_dir: str, quantize: bool = True) -> str:
+    """
+    Exports a BERT-style encoder to ONNX with dynamic batch and sequence axes,
+    then applies dynamic int8 quantization to its weights.
+    Args:
+        model_name (str): Hugging Face model identifier.
+        out_dir (str): Directory for the ONNX files and tokenizer.
+        quantize (bool): Also write the int8 model.
+    Returns:
+        str: Path of the model to serve (int8 if quantize).
+    """
+    # Export-only dependencies; OnnxEmbeddings needs neither PyTorch nor the model weights
+    import torch
+    from transformers import AutoModel
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    os.makedirs(out_dir, exist_ok=True)
+    fp32_path = os.path.join(out_dir, "model.onnx")
+    int8_path = os.path.join(out_dir, "model.int8.onnx")
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={name: {0: "batch", 1: "sequence"}
+                          for name in ("input_ids", "attention_mask", "token_type_ids", "last_hidden_state")},
+            opset_version=17
+        )
+    tokenizer.save_pretrained(out_dir)
+    path = fp32_path
+    if quantize:
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        path = int8_path
+
+    # CLS pooling + normalisation, as sentence-transformers does for BGE
+    batch = tokenizer(AGREEMENT_SAMPLES, padding=True, return_tensors="pt")
+    with torch.no_grad():
+        reference = model(**batch).last_hidden_state[:, 0].numpy()
+    session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+    exported = session.run(["last_hidden_state"], {key: value.numpy() for key, value in batch.items()})[0][:, 0]
+    agreement = _cosines(reference, exported)
+    status = "✅" if agreement.min() >= MIN_AGREEMENT else "⚠️"
+    print(f"{status} ONNX encoder agreement with PyTorch: mean cosine {agreement.mean():.4f}, min {agreement.min():.4f}")
+    return path
+
+
+def _cosines(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+
+# -------------------- Encoder --------------------
+class OnnxEmbeddings(Embeddings):
+    """
+    BGE sentence embeddings (CLS pooling, L2-normalised) computed with ONNX
+    Runtime on CPU. Drop-in for HuggingFaceEmbeddings at query time.
+    """
+
+    def __init__(self, model_name: str, model_dir: str, quantized: bool = True,
+                 threads: Optional[int] = None, batch_size: int = 32):
+        model_path = os.path.join(model_dir, "model.int8.onnx" if quantized else "model.onnx")
+        if not os.path.exists(model_path):
+            print(f"🔄 Exporting {model_name} to ONNX{' (int8)' if quantized else ''}...")
+            export_onnx_encoder(model_name, model_dir, quantize=quantized)
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.batch_size = batch_size
+        # Distinct from the PyTorch model's name so cached vectors are never mixed
+        self.model_name = f"{model_name}:onnx{'-int8' if quantized else ''}"
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = self.tokenizer([text.replace("\n", " ") for text in texts[start:start + self.batch_size]],
+                                   padding=True, truncation=True, max_length=MAX_LENGTH, return_tensors="np")
+            hidden = self.session.run(["last_hidden_state"], {
+                "input_ids": batch["input_ids"].astype(np.int64),
+                "attention_mask": batch["attention_mask"].astype(np.int64),
+                "token_type_ids": batch["token_type_ids"].astype(np.int64)
+            })[0]
+            cls = hidden[:, 0]
+            vectors.extend((cls / np.linalg.norm(cls, axis=1, keepdims=True)).tolist())
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0]
@@ -0,0 +1,127 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from embedding_cache import CachedEmbeddings, EmbeddingCache, normalize_query
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU of query vectors keyed by (model name, normalized query), with an
+    optional on-disk EmbeddingCache as a second tier that survives restarts.
+    Safe to share between Streamlit sessions (script threads).
+    """
+
+    def __init__(self, max_size: int = 1024, disk_cache: Optional[EmbeddingCache] = None):
+        self.max_size = max_size
+        self.disk_cache = disk_cache
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def embed_query(self, query: str, embedding_model) -> List[float]:
+        """
+        Returns the query vector from memory, then disk, and only then the model.
+        Args:
+            query (str): User query.
+            embedding_model: LangChain embedding model; a CachedEmbeddings wrapper
+                is unwrapped and its cache used as the disk tier.
+        Returns:
+            List[float]: Query embedding.
+        """
+        disk_cache = self.disk_cache
+        if isinstance(embedding_model, CachedEmbeddings):
+            disk_cache = disk_cache or embedding_model.cache
+            embedding_model = embedding_model.embeddings
+
+        normalized = normalize_query(query)
+        key = (getattr(embedding_model, "model_name", type(embedding_model).__name__), normalized)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+
+        vector = disk_cache.get_many([normalized], kind="query")[0] if disk_cache else None
+        if vector is not None:
+            self.disk_hits += 1
+        else:
+            vector = embedding_model.embed_query(query)
+            if disk_cache:
+                disk_cache.put_many([normalized], [vector], kind="query")
+            self.misses += 1
+
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return vector
+
+    def embed_queries(self, queries: List[str], embedding_model) -> List[List[float]]:
+        """
+        Batched embed_query(): every query missing from both tiers is embedded
+        in a single forward pass.
+        Returns:
+            List[List[float]]: One embedding per query, in order.
+        """
+        disk_cache = self.disk_cache
+        if isinstance(embedding_model, CachedEmbeddings):
+            disk_cache = disk_cache or embedding_model.cache
+            embedding_model = embedding_model.embeddings
+
+        model_name = getattr(embedding_model, "model_name", type(embedding_model).__name__)
+        normalized = [normalize_query(query) for query in queries]
+        vectors: List[Optional[List[float]]] = [None] * len(queries)
+        with self._lock:
+            for i, text in enumerate(normalized):
+                vector = self._entries.get((model_name, text))
+                if vector is not None:
+                    self._entries.move_to_end((model_name, text))
+                    self.hits += 1
+                    vectors[i] = vector
+
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing and disk_cache:
+            for i, vector in zip(missing, disk_cache.get_many([normalized[i] for i in missing], kind="query")):
+                if vector is not None:
+                    vectors[i] = vector
+                    self.disk_hits += 1
+            missing = [i for i in missing if vectors[i] is None]
+        if missing:
+            # Duplicate queries in the batch are embedded once
+            first = {}
+            for i in missing:
+                first.setdefault(normalized[i], i)
+            unique = list(first)
+            computed = dict(zip(unique, embedding_model.embed_documents([queries[first[text]] for text in unique])))
+            for i in missing:
+                vectors[i] = computed[normalized[i]]
+            if disk_cache:
+                disk_cache.put_many(unique, [computed[text] for text in unique], kind="query")
+            self.misses += len(missing)
+
+        with self._lock:
+            for text, vector in zip(normalized, vectors):
+                self._entries[(model_name, text)] = vector
+                self._entries.move_to_end((model_name, text))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return vectors
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "hit_rate": (self.hits + self.disk_hits) / total if total else 0.0
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,104 @@
+import time
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+def doc_key(doc) -> str:
+    """
+    Stable identifier of a retrieved document: its vectorstore ID when the
+    Document carries one, otherwise a hash of source, page and text.
+    """
+    if getattr(doc, "id", None):
+        return doc.id
+    payload = f'{doc.metadata.get("source")}\0{doc.metadata.get("page")}\0{doc.page_content}'
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class ResponseCache:
+    """
+    Semantic cache of generated answers.
+
+    An entry is reused when a new query embedding is within `threshold` cosine
+    similarity of a cached one AND the web-search flag and the retrieved
+    document IDs are identical, so the answer was produced from the same context.
+    Entries expire after ttl_seconds; beyond max_entries the least recently
+    used entry is evicted.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 3600.0, threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self._entries: OrderedDict = OrderedDict()  # entry id -> entry dict
+        self._by_context: Dict[Tuple, List[int]] = {}  # (use_web, doc ids) -> entry ids
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, query_vector: Sequence[float], use_web: bool,
+               doc_ids: Sequence[str]) -> Optional[Tuple[str, Any, float]]:
+        """
+        Returns:
+            Optional[tuple]: (response, metadata, similarity) of the best match, or None.
+        """
+        vector = _unit(query_vector)
+        context = (bool(use_web), tuple(doc_ids))
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            best_id, best_sim = None, self.threshold
+            for entry_id in self._by_context.get(context, []):
+                sim = float(np.dot(self._entries[entry_id]["vector"], vector))
+                if sim >= best_sim:
+                    best_id, best_sim = entry_id, sim
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            entry = self._entries[best_id]
+            return entry["response"], entry["metadata"], best_sim
+
+    def put(self, query_vector: Sequence[float], use_web: bool, doc_ids: Sequence[str], response: str, metadata: Any):
+        context = (bool(use_web), tuple(doc_ids))
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                "vector": _unit(query_vector),
+                "context": context,
+                "response": response,
+                "metadata": metadata,
+                "created": time.time()
+            }
+            self._by_context.setdefault(context, []).append(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries),
+                "hit_rate": self.hits / total if total else 0.0}
+
+    def _expire(self, now: float):
+        expired = [entry_id for entry_id, entry in self._entries.items()
+                   if now - entry["created"] > self.ttl_seconds]
+        for entry_id in expired:
+            self._remove(entry_id)
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        ids = self._by_context[entry["context"]]
+        ids.remove(entry_id)
+        if not ids:
+            del self._by_context[entry["context"]]
+
+
+def _unit(vector: Sequence[float]) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -0,0 +1,334 @@
+import time
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional
+import torch
+import torch.nn.functional as F
+from transformers import (LogitsProcessorList, RepetitionPenaltyLogitsProcessor, TemperatureLogitsWarper,
+                          TopKLogitsWarper, TopPLogitsWarper)
+
+
+class GenerationRequest:
+    """One prompt in flight. `finished` is set once output_ids is complete or error is set."""
+
+    def __init__(self, prompt_ids: List[int], max_new_tokens: int, streamer=None):
+        self.prompt_ids = prompt_ids
+        self.max_new_tokens = max_new_tokens
+        self.streamer = streamer
+        self.output_ids: List[int] = []
+        self.error: Optional[BaseException] = None
+        self.finished = threading.Event()
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        """
+        Stops the request at the next decode step, or drops it if still queued;
+        output_ids keeps the tokens generated so far.
+        """
+        self.cancelled.set()
+
+
+def _pad_left(tensor: torch.Tensor, width: int, dim: int) -> torch.Tensor:
+    """Left-pads tensor with zeros along dim (2 for KV tensors, 1 for attention masks) to width."""
+    missing = width - tensor.shape[dim]
+    if missing <= 0:
+        return tensor
+    padding = [0, 0] * (tensor.dim() - dim - 1) + [missing, 0]
+    return F.pad(tensor, padding)
+
+
+def _legacy_cache(past_key_values):
+    """KV cache as a tuple of per-layer (keys, values), each [batch, heads, positions, head_dim]."""
+    if hasattr(past_key_values, "to_legacy_cache"):
+        return past_key_values.to_legacy_cache()
+    return past_key_values
+
+
+class InferenceScheduler:
+    """
+    Owns a causal LM and serves every caller's generations from one decode
+    loop (continuous batching), so concurrent Streamlit sessions share each
+    forward pass instead of queueing behind each other's full generations.
+
+    Requests wait in a FIFO queue and join the running batch at the next step
+    boundary: they are prefilled together, left-padded, and their KV caches
+    appended to the batch's. A request is admitted only while the padded batch
+    (rows x widest row) stays within max_batch_tokens, so one long prompt does
+    not inflate every short one; finished rows leave immediately and padding
+    columns no row needs any more are trimmed.
+
+    Prompts that start with a registered prefix (e.g. format_prompt's fixed
+    system instructions) reuse that prefix's precomputed KV cache and only
+    prefill the rest.
+
+    Called like the text-generation pipeline it replaces:
+        scheduler(prompt, max_new_tokens=256, streamer=streamer)[0]["generated_text"]
+    A request stops early when cancelled, or when its streamer raises (e.g.
+    the stream's reader went away); the rest of the batch carries on.
+    """
+
+    def __init__(self, model, tokenizer, max_batch_size: int = 8, max_batch_tokens: int = 16384,
+                 max_new_tokens: int = 1024, do_sample: bool = True, temperature: float = 0.3,
+                 top_k: int = 50, top_p: float = 0.95, repetition_penalty: float = 1.2):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_new_tokens = max_new_tokens
+        self.do_sample = do_sample
+        self.pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+        self.eos_token_id = tokenizer.eos_token_id
+        self.device = model.device
+        self.processors = LogitsProcessorList([RepetitionPenaltyLogitsProcessor(repetition_penalty)])
+        if do_sample:
+            self.processors.extend([TemperatureLogitsWarper(temperature), TopKLogitsWarper(top_k),
+                                    TopPLogitsWarper(top_p)])
+
+        # Registered prompt prefixes: (token ids, per-layer (keys, values) for one row)
+        self.prefixes: Dict[str, tuple] = {}
+        # Held for every forward pass, so prefixes can be registered while serving
+        self._model_lock = threading.Lock()
+
+        self._pending: Deque[GenerationRequest] = deque()
+        self._cond = threading.Condition()
+        # Running batch, one row per request; only the worker thread touches these
+        self._active: List[GenerationRequest] = []
+        self._cache = None
+        self._mask: Optional[torch.Tensor] = None  # [rows, positions], 0 on left padding
+        self._lengths: Optional[torch.Tensor] = None  # real tokens in each row's cache
+        self._next_tokens: Optional[torch.Tensor] = None  # token each row feeds next
+
+        self.generated_tokens = 0
+        self.decode_steps = 0
+        self.busy_seconds = 0.0
+        self.prefill_tokens = 0
+        self.prefix_tokens_reused = 0
+        self._worker = threading.Thread(target=self._run, name="inference-scheduler", daemon=True)
+        self._worker.start()
+
+    # -------------------- Prefix Cache --------------------
+    def register_prefix(self, text: str) -> int:
+        """
+        Precomputes and keeps the KV cache of a prompt prefix.
+        Args:
+            text (str): Prompt prefix, exactly as prompts start.
+        Returns:
+            int: Number of prefix tokens cached.
+        """
+        # The last token may merge with whatever follows the prefix, so it is left to the prompt
+        ids = self.tokenizer(text)["input_ids"][:-1]
+        with self._model_lock, torch.inference_mode():
+            out = self.model(input_ids=torch.tensor([ids], device=self.device), use_cache=True)
+        self.prefixes[text] = (ids, _legacy_cache(out.past_key_values))
+        print(f"✅ Cached KV for a {len(ids)}-token prompt prefix")
+        return len(ids)
+
+    def unregister_prefix(self, text: str):
+        self.prefixes.pop(text, None)
+
+    def _match_prefix(self, prompt_ids: List[int]) -> Optional[tuple]:
+        """The longest registered prefix whose tokens start prompt_ids, leaving at least one to prefill."""
+        best = None
+        for ids, cache in list(self.prefixes.values()):
+            if best is not None and len(ids) <= len(best[0]):
+                continue
+            if len(ids) < len(prompt_ids) and prompt_ids[:len(ids)] == ids:
+                best = (ids, cache)
+        return best
+
+    # -------------------- Callers --------------------
+    def submit(self, prompt: str, max_new_tokens: Optional[int] = None, streamer=None) -> GenerationRequest:
+        """
+        Queues a prompt and returns immediately.
+        Args:
+            prompt (str): Full prompt, tokenized as the pipeline would.
+            max_new_tokens (Optional[int]): Defaults to the scheduler's.
+            streamer: Optional transformers streamer (e.g. TextIteratorStreamer).
+        Returns:
+            GenerationRequest: Wait on .finished, then read .output_ids or .error; .cancel() stops it.
+        """
+        prompt_ids = self.tokenizer(prompt)["input_ids"]
+        request = GenerationRequest(prompt_ids, max_new_tokens or self.max_new_tokens, streamer)
+        if streamer is not None:
+            streamer.put(torch.tensor(prompt_ids))  # skipped by skip_prompt streamers, as in generate()
+        with self._cond:
+            self._pending.append(request)
+            self._cond.notify()
+        return request
+
+    def __call__(self, prompt: str, max_new_tokens: Optional[int] = None, streamer=None,
+                 return_full_text: bool = True) -> List[Dict[str, str]]:
+        """Blocking generation with the text-generation pipeline's call and return shape."""
+        request = self.submit(prompt, max_new_tokens, streamer)
+        request.finished.wait()
+        if request.error is not None:
+            raise RuntimeError(f"Generation failed: {request.error}") from request.error
+        text = self.tokenizer.decode(request.output_ids, skip_special_tokens=True)
+        return [{"generated_text": prompt + text if return_full_text else text}]
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "generated_tokens": self.generated_tokens,
+            "decode_steps": self.decode_steps,
+            "mean_batch_size": round(self.generated_tokens / self.decode_steps, 2) if self.decode_steps else 0.0,
+            "tokens_per_second": round(self.generated_tokens / self.busy_seconds, 1) if self.busy_seconds else 0.0,
+            "prefill_tokens": self.prefill_tokens,
+            "prefix_tokens_reused": self.prefix_tokens_reused
+        }
+
+    # -------------------- Decode Loop --------------------
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._active:
+                    self._cond.wait()
+                admitted = self._admit()
+            start = time.perf_counter()
+            try:
+                with self._model_lock, torch.inference_mode():
+                    if admitted:
+                        self._prefill(admitted)
+                    if self._active:
+                        self._decode_step()
+            except BaseException as e:
+                # e.g. out of memory: fail everything in flight and start over with an empty batch
+                for request in {id(r): r for r in self._active + admitted}.values():
+                    if not request.finished.is_set():
+                        request.error = e
+                        self._finish(request)
+                self._active, self._cache = [], None
+            self.busy_seconds += time.perf_counter() - start
+
+    def _admit(self) -> List[GenerationRequest]:
+        """Pops the queued requests that fit in the batch, in arrival order."""
+        admitted = []
+        rows = len(self._active)
+        width = self._mask.shape[1] if self._active else 0
+        while self._pending and rows + len(admitted) < self.max_batch_size:
+            if self._pending[0].cancelled.is_set():
+                self._finish(self._pending.popleft())
+                continue
+            new_width = max(width, len(self._pending[0].prompt_ids))
+            if (rows or admitted) and (rows + len(admitted) + 1) * new_width > self.max_batch_tokens:
+                break
+            admitted.append(self._pending.popleft())
+            width = new_width
+        return admitted
+
+    def _prefill(self, requests: List[GenerationRequest]):
+        # One forward pass per shared prefix (or none), since the prefix cache differs
+        groups: Dict[int, tuple] = {}
+        for request in requests:
+            prefix = self._match_prefix(request.prompt_ids)
+            groups.setdefault(id(prefix[1]) if prefix else 0, (prefix, []))[1].append(request)
+        for prefix, group in groups.values():
+            self._prefill_group(group, prefix)
+
+    def _prefill_group(self, requests: List[GenerationRequest], prefix: Optional[tuple]):
+        """Prefills requests after the cached prefix, if any, and adds them to the batch."""
+        prefix_ids, prefix_cache = prefix if prefix else ([], None)
+        start = len(prefix_ids)
+        width = max(len(r.prompt_ids) - start for r in requests)
+        input_ids = torch.full((len(requests), width), self.pad_token_id, dtype=torch.long)
+        mask = torch.zeros((len(requests), width), dtype=torch.long)
+        for i, request in enumerate(requests):
+            suffix = request.prompt_ids[start:]
+            input_ids[i, width - len(suffix):] = torch.tensor(suffix)
+            mask[i, width - len(suffix):] = 1
+        input_ids, mask = input_ids.to(self.device), mask.to(self.device)
+        positions = start + (mask.cumsum(-1) - 1).clamp(min=0)
+        past_key_values = None
+        if prefix_cache is not None:
+            # Rows read the shared prefix tensors; the forward pass concatenates onto copies
+            past_key_values = tuple((k.expand(len(requests), -1, -1, -1), v.expand(len(requests), -1, -1, -1))
+                                    for k, v in prefix_cache)
+            mask = torch.cat([mask.new_ones((len(requests), start)), mask], dim=1)
+        out = self.model(input_ids=input_ids, attention_mask=mask, position_ids=positions,
+                         past_key_values=past_key_values, use_cache=True)
+        self.prefill_tokens += int(mask.sum()) - start * len(requests)
+        self.prefix_tokens_reused += start * len(requests)
+        next_tokens = self._sample(requests, out.logits[:, -1, :])
+        self._merge(requests, _legacy_cache(out.past_key_values), mask, mask.sum(-1), next_tokens)
+        self._emit(requests, next_tokens)
+
+    def _decode_step(self):
+        mask = torch.cat([self._mask, self._mask.new_ones((len(self._active), 1))], dim=1)
+        out = self.model(input_ids=self._next_tokens[:, None], attention_mask=mask,
+                         position_ids=self._lengths[:, None], past_key_values=self._cache, use_cache=True)
+        self._cache = _legacy_cache(out.past_key_values)
+        self._mask = mask
+        self._lengths = self._lengths + 1
+        self._next_tokens = self._sample(self._active, out.logits[:, -1, :])
+        self.decode_steps += 1
+        self._emit(self._active, self._next_tokens)
+
+    def _sample(self, requests: List[GenerationRequest], logits: torch.Tensor) -> torch.Tensor:
+        tokens = []
+        for i, request in enumerate(requests):
+            # Per row, so the repetition penalty sees only that request's tokens
+            ids = torch.tensor([request.prompt_ids + request.output_ids], device=logits.device)
+            scores = self.processors(ids, logits[i:i + 1].float())
+            if self.do_sample:
+                tokens.append(torch.multinomial(torch.softmax(scores, dim=-1), 1)[0, 0])
+            else:
+                tokens.append(scores[0].argmax())
+        return torch.stack(tokens)
+
+    def _merge(self, requests, cache, mask, lengths, next_tokens):
+        """Appends prefilled rows to the running batch, left-padding whichever side is narrower."""
+        if not self._active:
+            self._active, self._cache, self._mask = list(requests), cache, mask
+            self._lengths, self._next_tokens = lengths, next_tokens
+            return
+        width = max(self._mask.shape[1], mask.shape[1])
+        self._cache = tuple(
+            (torch.cat([_pad_left(k, width, 2), _pad_left(nk, width, 2)]),
+             torch.cat([_pad_left(v, width, 2), _pad_left(nv, width, 2)]))
+            for (k, v), (nk, nv) in zip(self._cache, cache)
+        )
+        self._mask = torch.cat([_pad_left(self._mask, width, 1), _pad_left(mask, width, 1)])
+        self._lengths = torch.cat([self._lengths, lengths])
+        self._next_tokens = torch.cat([self._next_tokens, next_tokens])
+        self._active.extend(requests)
+
+    def _emit(self, requests: List[GenerationRequest], tokens: torch.Tensor):
+        for request, token in zip(requests, tokens.tolist()):
+            if request.cancelled.is_set():
+                self._finish(request)
+                continue
+            request.output_ids.append(token)
+            self.generated_tokens += 1
+            if request.streamer is not None:
+                try:
+                    request.streamer.put(torch.tensor([token]))
+                except Exception:
+                    # Only this request's reader is gone, so only this request stops
+                    request.cancel()
+            if (request.cancelled.is_set() or token == self.eos_token_id
+                    or len(request.output_ids) >= request.max_new_tokens):
+                self._finish(request)
+        self._compact()
+
+    def _finish(self, request: GenerationRequest):
+        if request.streamer is not None:
+            request.streamer.end()
+        request.finished.set()
+
+    def _compact(self):
+        """Drops finished rows and the leading padding columns no remaining row attends to."""
+        keep = [i for i, request in enumerate(self._active) if not request.finished.is_set()]
+        if not keep:
+            self._active, self._cache = [], None
+            return
+        if len(keep) < len(self._active):
+            index = torch.tensor(keep, device=self._mask.device)
+            self._active = [self._active[i] for i in keep]
+            self._cache = tuple((k.index_select(0, index.to(k.device)), v.index_select(0, index.to(v.device)))
+                                for k, v in self._cache)
+            self._mask = self._mask.index_select(0, index)
+            self._lengths = self._lengths.index_select(0, index)
+            self._next_tokens = self._next_tokens.index_select(0, index)
+        first = int(self._mask.any(dim=0).nonzero()[0])
+        if first:
+            self._cache = tuple((k[:, :, first:], v[:, :, first:]) for k, v in self._cache)
+            self._mask = self._mask[:, first:]
@@ -0,0 +1,109 @@
+import time
+import threading
+from typing import Callable, Iterator, List, Optional, Tuple
+from transformers import TextIteratorStreamer
+
+# Longest wait for the next token before the stream is considered stalled
+TOKEN_TIMEOUT = 120.0
+
+
+class GenerationCancelled(Exception):
+    """Raised into the generating thread once a stream's reader has gone away."""
+
+
+class CancellableStreamer(TextIteratorStreamer):
+    """
+    TextIteratorStreamer that stops the generation feeding it: after cancel(),
+    put() raises GenerationCancelled, which ends generate() and the llama.cpp
+    loop, and cancels the request in the batched scheduler.
+    """
+
+    def __init__(self, tokenizer, **kwargs):
+        super().__init__(tokenizer, **kwargs)
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def put(self, value):
+        if self.cancelled.is_set():
+            raise GenerationCancelled("stream closed by its reader")
+        super().put(value)
+
+
+def stream_generate(model_pipeline, prompt: str, **generate_kwargs) -> Iterator[str]:
+    """
+    Runs a text-generation pipeline in a background thread and yields the
+    decoded text as it is produced, without the prompt. Closing the generator
+    early (or a stalled stream timing out) stops the generation.
+    Args:
+        model_pipeline: Hugging Face text-generation pipeline.
+        prompt (str): Full prompt.
+        **generate_kwargs: Extra generation arguments (e.g. max_new_tokens).
+    Yields:
+        str: Text deltas.
+    """
+    streamer = CancellableStreamer(model_pipeline.tokenizer, skip_prompt=True,
+                                   skip_special_tokens=True, timeout=TOKEN_TIMEOUT)
+    errors: List[BaseException] = []
+
+    def run():
+        try:
+            model_pipeline(prompt, streamer=streamer, **generate_kwargs)
+        except BaseException as e:
+            errors.append(e)
+            streamer.end()  # unblock the consumer
+
+    thread = threading.Thread(target=run, name="generation-stream", daemon=True)
+    thread.start()
+    try:
+        for delta in streamer:
+            if delta:
+                yield delta
+    finally:
+        # No-op once generation has ended; otherwise the reader left early
+        streamer.cancel()
+    thread.join()
+    if errors:
+        raise RuntimeError(f"Generation failed: {errors[0]}") from errors[0]
+
+
+class ResponseStream:
+    """
+    Iterable over the text deltas of one answer. Once exhausted, `response`
+    and `metadata` hold the same values generate_response() returns.
+    """
+
+    def __init__(self, deltas: Iterator[str], finish: Callable[[str], Tuple[str, list]]):
+        self._deltas = deltas
+        self._finish = finish
+        self.text = ""
+        self.response: Optional[str] = None
+        self.metadata: Optional[list] = None
+        self.time_to_first_token: Optional[float] = None
+        self._created = time.perf_counter()
+
+    @classmethod
+    def completed(cls, response: str, metadata: list) -> "ResponseStream":
+        """A stream for an answer that is already known (cache hit, fast path, error)."""
+        return cls(iter([response]), lambda text: (response, metadata))
+
+    def __iter__(self) -> Iterator[str]:
+        for delta in self._deltas:
+            if self.time_to_first_token is None:
+                self.time_to_first_token = time.perf_counter() - self._created
+            self.text += delta
+            yield delta
+        self.response, self.metadata = self._finish(self.text)
+
+    def close(self):
+        """Stops generation if the stream is abandoned before its end (e.g. on a Streamlit rerun)."""
+        if hasattr(self._deltas, "close"):
+            self._deltas.close()
+
+    def result(self) -> Tuple[str, list]:
+        """Consumes the rest of the stream and returns (response, metadata)."""
+        if self.response is None:
+            for _ in self:
+                pass
+        return self.response, self.metadata
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The server modules import each other as top-level modules, as when app.py is run from MatBot/server
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,63 @@
+"""
+Context assembly on hybrid retrieval output: reciprocal-rank fusion scores
+are nearly uniform (~2/61 for a chunk in both lists, ~1/61 in one), so the
+adaptive cut must be taken on the vector search's cosine similarities.
+
+    python -m pytest tests/test_context_assembly.py
+"""
+import pytest
+
+pytest.importorskip("langchain")
+pytest.importorskip("langchain_core")
+
+from langchain.schema import Document  # noqa: E402
+from context_assembly import assemble_context, adaptive_cutoff  # noqa: E402
+from lexical_index import reciprocal_rank_fusion  # noqa: E402
+
+TOPICS = ["plot", "interp1", "ode45", "fprintf", "cellfun", "struct", "datetime", "regexp",
+          "histogram", "meshgrid", "fzero", "table", "strsplit", "bsxfun", "linspace", "cumsum"]
+
+
+def chunk(i: int) -> Document:
+    # Distinct pages and vocabularies, so neither page merging nor MMR redundancy interferes
+    words = " ".join(f"{TOPICS[i]}{j}" for j in range(60))
+    return Document(page_content=f"{TOPICS[i]} reference. {words}", metadata={"source": f"doc{i}.pdf", "page": i})
+
+
+def count_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+@pytest.fixture
+def hybrid_results():
+    """What query_database returns in hybrid mode: fused pairs and the vector search's cosines."""
+    docs = [chunk(i) for i in range(len(TOPICS))]
+    # As usual, only the top couple of chunks are in both lists
+    vector_ranked = docs[:10]
+    lexical_ranked = [docs[i] for i in (0, 1, 10, 11, 12, 13, 14, 15)]
+    fused = reciprocal_rank_fusion([vector_ranked, lexical_ranked], k=12, with_scores=True)
+    cosines = [0.86, 0.85, 0.84, 0.83, 0.82, 0.81, 0.80, 0.79, 0.62, 0.60]
+    return fused, cosines
+
+
+def test_fused_scores_alone_cut_at_min_k(hybrid_results):
+    fused, _ = hybrid_results
+    assert adaptive_cutoff([score for _, score in fused]) == 2
+
+
+def test_cut_on_cosine_similarities_with_fused_ranking(hybrid_results):
+    fused, cosines = hybrid_results
+    context, used, report = assemble_context(fused, 1500, count_tokens, cutoff_scores=cosines)
+    assert report["adaptive_k"] == 8
+    assert report["chunks_used"] == 8
+    # The fused ranking decides which chunks fill the cut
+    assert {doc.metadata["page"] for doc in used} == {doc.metadata["page"] for doc, _ in fused[:8]}
+    assert report["context_tokens"] <= 1500
+
+
+def test_cutoff_scores_default_to_the_pair_scores():
+    docs = [chunk(i) for i in range(4)]
+    scored = list(zip(docs, [0.9, 0.88, 0.87, 0.5]))
+    _, used, report = assemble_context(scored, 1500, count_tokens)
+    assert report["adaptive_k"] == 3
+    assert len(used) == 3
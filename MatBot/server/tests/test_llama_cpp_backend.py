@@ -0,0 +1,128 @@
+"""
+Call shape and streaming of LlamaCppPipeline against a stubbed llama_cpp.Llama,
+so it runs without llama-cpp-python or a GGUF file. Whether the GGUF model
+answers like the transformers path is checked by benchmarks/check_llm_parity.py
+on a machine with both.
+
+    python -m pytest tests/test_llama_cpp_backend.py
+"""
+import sys
+import types
+import itertools
+import importlib
+import pytest
+
+pytest.importorskip("transformers")
+
+from transformers import TextIteratorStreamer  # noqa: E402
+
+EOS = 2
+
+
+class FakeLlama:
+    """Stands in for llama_cpp.Llama: generate() yields `script`, then token 50 forever."""
+    script = [10, 11, 12, EOS, 13]
+    instances = []
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.calls = []
+        FakeLlama.instances.append(self)
+
+    def token_eos(self):
+        return EOS
+
+    def generate(self, tokens, reset=True, **sampling):
+        self.calls.append({"tokens": list(tokens), "reset": reset, **sampling})
+        return itertools.chain(self.script, itertools.repeat(50))
+
+
+class WordTokenizer:
+    """Stand-in for the Hugging Face tokenizer: one id per word, "w<id>" back."""
+    bos_token_id = 1
+    eos_token_id = EOS
+
+    @classmethod
+    def from_pretrained(cls, *args, **kwargs):
+        return cls()
+
+    def __call__(self, text):
+        return {"input_ids": [self.bos_token_id] + [3 + len(word) for word in text.split()]}
+
+    def decode(self, ids, skip_special_tokens=False, **kwargs):
+        special = {self.bos_token_id, self.eos_token_id} if skip_special_tokens else set()
+        return "".join(f"w{i} " for i in ids if i not in special)
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    monkeypatch.setitem(sys.modules, "llama_cpp", types.SimpleNamespace(Llama=FakeLlama))
+    monkeypatch.delitem(sys.modules, "llama_cpp_backend", raising=False)
+    module = importlib.import_module("llama_cpp_backend")
+    monkeypatch.setattr(module, "AutoTokenizer", WordTokenizer)
+    FakeLlama.instances.clear()
+    yield module
+    sys.modules.pop("llama_cpp_backend", None)
+
+
+@pytest.fixture
+def model_path(tmp_path):
+    path = tmp_path / "model.Q4_K_M.gguf"
+    path.write_bytes(b"")
+    return str(path)
+
+
+def test_missing_model_file(backend, tmp_path):
+    with pytest.raises(FileNotFoundError):
+        backend.LlamaCppPipeline(str(tmp_path / "missing.gguf"), "tokenizer")
+
+
+def test_call_shape(backend, model_path):
+    llm = backend.LlamaCppPipeline(model_path, "tokenizer", threads=3, n_ctx=2048, do_sample=False,
+                                   repetition_penalty=1.2)
+    prompt = "How do I plot"
+    assert llm(prompt, return_full_text=False) == [{"generated_text": "w10 w11 w12 "}]
+    assert llm(prompt)[0]["generated_text"] == prompt + "w10 w11 w12 "
+
+    fake = FakeLlama.instances[0]
+    assert fake.kwargs["model_path"] == model_path
+    assert fake.kwargs["n_ctx"] == 2048 and fake.kwargs["n_threads"] == 3
+    call = fake.calls[0]
+    assert call["tokens"] == WordTokenizer()(prompt)["input_ids"]
+    assert call["reset"] is True
+    assert call["temp"] == 0.0 and call["repeat_penalty"] == 1.2  # greedy when do_sample=False
+    # Stopping at EOS: three tokens and EOS itself
+    assert llm.stats()["generated_tokens"] == 8
+
+
+def test_max_new_tokens(backend, model_path):
+    llm = backend.LlamaCppPipeline(model_path, "tokenizer", max_new_tokens=6)
+    FakeLlama.script = []  # never emits EOS
+    try:
+        assert llm("q", return_full_text=False)[0]["generated_text"] == "w50 " * 6
+        assert llm("q", max_new_tokens=2, return_full_text=False)[0]["generated_text"] == "w50 " * 2
+    finally:
+        FakeLlama.script = [10, 11, 12, EOS, 13]
+
+
+def test_streams_into_transformers_streamers(backend, model_path):
+    llm = backend.LlamaCppPipeline(model_path, "tokenizer")
+    streamer = TextIteratorStreamer(llm.tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=5)
+    llm("How do I plot", streamer=streamer)
+    assert "".join(streamer) == "w10 w11 w12 "
+
+
+def test_closing_a_stream_stops_generation(backend, model_path):
+    from streaming import stream_generate
+
+    llm = backend.LlamaCppPipeline(model_path, "tokenizer", max_new_tokens=100000)
+    FakeLlama.script = []
+    try:
+        deltas = stream_generate(llm, "q")
+        assert next(deltas)
+        deltas.close()
+        # The generation thread gives the lock back once the cancelled streamer stops it
+        assert llm._lock.acquire(timeout=5)
+        llm._lock.release()
+    finally:
+        FakeLlama.script = [10, 11, 12, EOS, 13]
@@ -0,0 +1,155 @@
+"""
+Greedy parity of the continuous-batching InferenceScheduler with
+model.generate(), on a tiny randomly initialised Mistral: requests joining a
+running batch, with different prompt lengths and finishing at different
+steps, must produce exactly the tokens they would alone. Also checks that
+cancelled and abandoned requests stop without disturbing the rest.
+
+    python -m pytest tests/test_scheduler.py
+"""
+import threading
+import time
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from scheduler import InferenceScheduler  # noqa: E402
+from streaming import stream_generate  # noqa: E402
+
+VOCAB = 96
+EOS = 2
+PREFIX = "[INST] You are a MATLAB assistant. "
+QUESTIONS = ["How do I plot?", "interp1 vs interp2, and which one should I use for a grid?", "ode45"]
+REPETITION_PENALTY = 1.2
+TIMEOUT = 30
+
+
+class CharTokenizer:
+    """Character-level stand-in for the Mistral tokenizer: BOS, then one id per character."""
+    bos_token_id = 1
+    eos_token_id = EOS
+    pad_token_id = 0
+
+    def __call__(self, text):
+        return {"input_ids": [self.bos_token_id] + [3 + ord(c) % (VOCAB - 3) for c in text]}
+
+    def decode(self, ids, skip_special_tokens=False, **kwargs):
+        special = {self.bos_token_id, self.eos_token_id} if skip_special_tokens else set()
+        return "".join(f"t{i} " for i in ids if i not in special)
+
+
+class GateStreamer:
+    """Holds the scheduler's decode loop after `after` tokens of its request until release is set."""
+
+    def __init__(self, after: int):
+        self.after = after
+        self.tokens = 0
+        self.prompt_seen = False
+        self.reached = threading.Event()
+        self.release = threading.Event()
+
+    def put(self, value):
+        if not self.prompt_seen:
+            self.prompt_seen = True
+            return
+        self.tokens += 1
+        if self.tokens == self.after:
+            self.reached.set()
+            self.release.wait(TIMEOUT)
+
+    def end(self):
+        pass
+
+
+@pytest.fixture(scope="module")
+def model():
+    torch.manual_seed(0)
+    config = transformers.MistralConfig(vocab_size=VOCAB, hidden_size=64, intermediate_size=128,
+                                        num_hidden_layers=2, num_attention_heads=4, num_key_value_heads=2,
+                                        max_position_embeddings=1024, bos_token_id=1, eos_token_id=EOS)
+    return transformers.MistralForCausalLM(config).eval()
+
+
+@pytest.fixture
+def tokenizer():
+    return CharTokenizer()
+
+
+def reference(model, tokenizer, prompt: str, max_new_tokens: int):
+    """What model.generate() produces greedily for the prompt alone, up to and including EOS."""
+    ids = torch.tensor([tokenizer(prompt)["input_ids"]])
+    with torch.inference_mode():
+        out = model.generate(ids, attention_mask=torch.ones_like(ids), max_new_tokens=max_new_tokens,
+                             do_sample=False, repetition_penalty=REPETITION_PENALTY,
+                             eos_token_id=EOS, pad_token_id=tokenizer.pad_token_id)
+    tokens = out[0, ids.shape[1]:].tolist()
+    return tokens[:tokens.index(EOS) + 1] if EOS in tokens else tokens
+
+
+def make_scheduler(model, tokenizer, **kwargs):
+    return InferenceScheduler(model, tokenizer, do_sample=False, repetition_penalty=REPETITION_PENALTY, **kwargs)
+
+
+@pytest.mark.parametrize("use_prefix", [False, True])
+def test_greedy_parity_with_staggered_admission(model, tokenizer, use_prefix):
+    scheduler = make_scheduler(model, tokenizer, max_batch_size=4)
+    if use_prefix:
+        scheduler.register_prefix(PREFIX)
+    prompts = [PREFIX + question for question in QUESTIONS]
+    budgets = [24, 5, 13]
+
+    # The first request is decoding when the others arrive, so they join a running batch
+    gate = GateStreamer(after=3)
+    first = scheduler.submit(prompts[0], max_new_tokens=budgets[0], streamer=gate)
+    assert gate.reached.wait(TIMEOUT)
+    rest = [scheduler.submit(prompt, max_new_tokens=budget) for prompt, budget in zip(prompts[1:], budgets[1:])]
+    gate.release.set()
+
+    for request, prompt, budget in zip([first] + rest, prompts, budgets):
+        assert request.finished.wait(TIMEOUT)
+        assert request.error is None
+        assert request.output_ids == reference(model, tokenizer, prompt, budget)
+    assert scheduler.stats()["mean_batch_size"] > 1
+    if use_prefix:
+        assert scheduler.stats()["prefix_tokens_reused"] > 0
+
+
+def test_call_shape_matches_pipeline(model, tokenizer):
+    scheduler = make_scheduler(model, tokenizer)
+    prompt = PREFIX + QUESTIONS[0]
+    expected = tokenizer.decode(reference(model, tokenizer, prompt, 8), skip_special_tokens=True)
+    assert scheduler(prompt, max_new_tokens=8, return_full_text=False)[0]["generated_text"] == expected
+    assert scheduler(prompt, max_new_tokens=8)[0]["generated_text"] == prompt + expected
+
+
+def test_cancel_stops_only_the_cancelled_requests(model, tokenizer):
+    scheduler = make_scheduler(model, tokenizer, max_batch_size=4)
+    gate = GateStreamer(after=2)
+    long_request = scheduler.submit(PREFIX + QUESTIONS[0], max_new_tokens=500, streamer=gate)
+    assert gate.reached.wait(TIMEOUT)
+    queued = scheduler.submit(PREFIX + QUESTIONS[1], max_new_tokens=500)
+    other = scheduler.submit(PREFIX + QUESTIONS[2], max_new_tokens=6)
+    long_request.cancel()
+    queued.cancel()
+    gate.release.set()
+
+    assert long_request.finished.wait(TIMEOUT) and queued.finished.wait(TIMEOUT)
+    assert 2 <= len(long_request.output_ids) < 500
+    assert queued.output_ids == []
+    assert other.finished.wait(TIMEOUT)
+    assert other.output_ids == reference(model, tokenizer, PREFIX + QUESTIONS[2], 6)
+
+
+def test_closing_a_stream_cancels_its_generation(model, tokenizer):
+    tokenizer.eos_token_id = -1  # never generated, so only cancellation ends the request early
+    scheduler = make_scheduler(model, tokenizer)
+    deltas = stream_generate(scheduler, PREFIX + QUESTIONS[0], max_new_tokens=500)
+    assert next(deltas)
+    deltas.close()
+
+    deadline = time.monotonic() + TIMEOUT
+    while (scheduler._active or scheduler._pending) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not scheduler._active and not scheduler._pending
+    assert scheduler.generated_tokens < 500
@@ -0,0 +1,278 @@
+import os
+import numpy as np
+from typing import List, Sequence, Tuple
+from langchain.schema import Document
+
+from chunk_store import ChunkStore
+
+BLOCK_ROWS = 65536  # rows scored per matmul; bounds the float32 scratch to ~200 MB at 768-d
+
+# -------------------- Unit Matrix --------------------
+def unit_matrix_path(chunk_store_dir: str, dtype: str = "float16") -> str:
+    return os.path.join(chunk_store_dir, f"unit.{np.dtype(dtype).name}")
+
+
+def build_unit_matrix(chunk_store_dir: str, dtype: str = "float16") -> str:
+    """
+    Writes the chunk store embeddings L2-normalised, so a dot product is the
+    cosine similarity, as a raw row-major matrix next to the store.
+    Args:
+        chunk_store_dir (str): Chunk store with embeddings.
+        dtype (str): "float16" (half the memory) or "float32".
+    Returns:
+        str: Path of the matrix file.
+    """
+    store = ChunkStore(chunk_store_dir)
+    if store.embeddings is None:
+        raise ValueError(f"Chunk store {chunk_store_dir} has no embeddings")
+    path = unit_matrix_path(chunk_store_dir, dtype)
+    with open(path + ".tmp", "wb") as f:
+        for start in range(0, store.count, BLOCK_ROWS):
+            block = np.asarray(store.embeddings[start:start + BLOCK_ROWS], dtype=np.float32)
+            norms = np.linalg.norm(block, axis=1, keepdims=True)
+            np.divide(block, norms, out=block, where=norms > 0)
+            block.astype(dtype).tofile(f)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+# -------------------- Top-k --------------------
+def top_k(matrix: np.ndarray, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Exact inner-product top-k of every query against every matrix row,
+    scanning the matrix in blocks so a float16 memmap is never fully upcast.
+    Args:
+        matrix (np.ndarray): [n, dim] unit vectors.
+        queries (np.ndarray): [q, dim] unit float32 queries.
+        k (int): Results per query.
+    Returns:
+        tuple: rows [q, k] and scores [q, k], best first.
+    """
+    n = matrix.shape[0]
+    k = min(k, n)
+    best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+    best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+    for start in range(0, n, BLOCK_ROWS):
+        block = np.asarray(matrix[start:start + BLOCK_ROWS], dtype=np.float32)
+        scores = queries @ block.T
+        kk = min(k, block.shape[0])
+        part = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+        # Merge the block's candidates with the running best
+        best_rows = np.concatenate([best_rows, part + start], axis=1)
+        best_scores = np.concatenate([best_scores, np.take_along_axis(scores, part, axis=1)], axis=1)
+        if best_rows.shape[1] > k:
+            keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+            best_rows = np.take_along_axis(best_rows, keep, axis=1)
+            best_scores = np.take_along_axis(best_scores, keep, axis=1)
+    order = np.argsort(-best_scores, axis=1)
+    return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+def unit_queries(vectors) -> np.ndarray:
+    queries = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(queries, axis=1, keepdims=True)
+    return np.divide(queries, norms, out=queries, where=norms > 0)
+
+
+# -------------------- Quantization --------------------
+QUANT_MODES = ("int8", "binary")
+# Popcount of every byte value, for Hamming distances over packed sign bits
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def build_quantized_index(chunk_store_dir: str, mode: str = "int8", dtype: str = "float16") -> str:
+    """
+    Quantizes the normalised embedding matrix for first-pass search.
+
+    int8: symmetric per-dimension scalar quantization (4x smaller than float32),
+    codes = round(x / scale) with scale = max|x| / 127 per dimension.
+    binary: one sign bit per dimension, packed (32x smaller than float32).
+    Args:
+        chunk_store_dir (str): Chunk store with embeddings.
+        mode (str): "int8" or "binary".
+        dtype (str): Unit matrix to quantize (built if missing).
+    Returns:
+        str: Path of the codes file.
+    """
+    if mode not in QUANT_MODES:
+        raise ValueError(f"Unknown quantization mode {mode!r}, expected one of {QUANT_MODES}")
+    store = ChunkStore(chunk_store_dir)
+    unit_path = unit_matrix_path(chunk_store_dir, dtype)
+    if not os.path.exists(unit_path):
+        build_unit_matrix(chunk_store_dir, dtype)
+    matrix = np.memmap(unit_path, dtype=dtype, mode="r", shape=(store.count, store.dim))
+
+    path = os.path.join(chunk_store_dir, f"quant.{mode}")
+    if mode == "int8":
+        max_abs = np.zeros(store.dim, dtype=np.float32)
+        for start in range(0, store.count, BLOCK_ROWS):
+            np.maximum(max_abs, np.abs(np.asarray(matrix[start:start + BLOCK_ROWS], dtype=np.float32)).max(axis=0),
+                       out=max_abs)
+        scale = np.where(max_abs > 0, max_abs / 127, 1).astype(np.float32)
+        scale.tofile(os.path.join(chunk_store_dir, "quant_scale.f32"))
+    with open(path + ".tmp", "wb") as f:
+        for start in range(0, store.count, BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + BLOCK_ROWS], dtype=np.float32)
+            if mode == "int8":
+                codes = np.clip(np.rint(block / scale), -127, 127).astype(np.int8)
+            else:
+                codes = np.packbits(block > 0, axis=1)
+            codes.tofile(f)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+# -------------------- Backend --------------------
+class NumpyVectorStore:
+    """
+    Exact cosine search over the memory-mapped chunk store, for corpora that
+    fit in RAM. Implements the vectorstore calls query_database() makes, so it
+    can stand in for Chroma.
+    """
+
+    def __init__(self, chunk_store_dir: str, dtype: str = "float16", embedding_function=None):
+        self.store = ChunkStore(chunk_store_dir)
+        self.embedding_function = embedding_function
+        if self.store.count:
+            path = unit_matrix_path(chunk_store_dir, dtype)
+            if not os.path.exists(path):
+                build_unit_matrix(chunk_store_dir, dtype)
+            self.matrix = np.memmap(path, dtype=dtype, mode="r", shape=(self.store.count, self.store.dim))
+        else:
+            # An empty store has no embeddings, and so no dimension either
+            self.matrix = np.zeros((0, self.store.dim or 0), dtype=dtype)
+
+    def search(self, vectors, k: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns:
+            tuple: Chunk store rows [q, k] and cosine scores [q, k] for a batch of query vectors.
+        """
+        return top_k(self.matrix, unit_queries(vectors), k)
+
+    def documents(self, rows: Sequence[int]) -> List[Document]:
+        return [Document(page_content=self.store.text(row), metadata=self.store.metadata(row),
+                         id=self.store.chunk_id(row)) for row in rows]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs) -> List[Document]:
+        if not self.store.count:
+            return []
+        rows, _ = self.search(embedding, k)
+        return self.documents(rows[0])
+
+    def similarity_search_by_vector_with_scores(self, embedding: List[float], k: int = 4,
+                                                **kwargs) -> List[Tuple[Document, float]]:
+        """Like similarity_search_by_vector, with each document's cosine similarity."""
+        if not self.store.count:
+            return []
+        rows, scores = self.search(embedding, k)
+        return list(zip(self.documents(rows[0]), scores[0].tolist()))
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
+        return self.similarity_search_by_vector(self.embedding_function.embed_query(query), k)
+
+
+class QuantizedVectorStore(NumpyVectorStore):
+    """
+    Two-stage search: a first pass over int8 or binary codes held in memory
+    picks k * rescore_factor candidates, which are then rescored exactly
+    against the full-precision matrix. Only candidate rows of the float
+    matrix are read, so it can stay on disk.
+    """
+
+    def __init__(self, chunk_store_dir: str, mode: str = "int8", rescore_factor: int = None,
+                 dtype: str = "float16", embedding_function=None):
+        super().__init__(chunk_store_dir, dtype, embedding_function)
+        self.mode = mode
+        # Sign bits discard magnitudes, so binary codes need a much deeper candidate list
+        self.rescore_factor = rescore_factor or (4 if mode == "int8" else 100)
+        dim = self.store.dim or 0
+        width = dim if mode == "int8" else (dim + 7) // 8
+        if not self.store.count:
+            self.codes = np.zeros((0, width), dtype=np.int8 if mode == "int8" else np.uint8)
+            self.scale = np.ones(dim, dtype=np.float32)
+            return
+        path = os.path.join(chunk_store_dir, f"quant.{mode}")
+        scale_path = os.path.join(chunk_store_dir, "quant_scale.f32")
+        # Codes left from before a re-index have the wrong row count
+        stale = not os.path.exists(path) or os.path.getsize(path) != self.store.count * width
+        if mode == "int8":
+            stale = stale or not os.path.exists(scale_path) or os.path.getsize(scale_path) != dim * 4
+        if stale:
+            build_quantized_index(chunk_store_dir, mode, dtype)
+        self.codes = np.fromfile(path, dtype=np.int8 if mode == "int8" else np.uint8).reshape(-1, width)
+        if self.codes.shape[0] != self.store.count:
+            raise ValueError(f"{path} has {self.codes.shape[0]} rows, the chunk store {self.store.count}")
+        if mode == "int8":
+            self.scale = np.fromfile(scale_path, dtype=np.float32)
+
+    def memory_bytes(self) -> int:
+        """Resident size of the first-pass codes."""
+        return self.codes.nbytes + (self.scale.nbytes if self.mode == "int8" else 0)
+
+    def search(self, vectors, k: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+        queries = unit_queries(vectors)
+        n = self.codes.shape[0]
+        if not n:
+            return np.zeros((len(queries), 0), dtype=np.int64), np.zeros((len(queries), 0), dtype=np.float32)
+        candidates = min(n, k * self.rescore_factor)
+        if self.mode == "int8":
+            first_rows, _ = top_k(self.codes, queries * self.scale, candidates)
+        else:
+            first_rows = self._hamming_top_k(queries, candidates)
+
+        # Exact rescoring of the candidates
+        rows = np.zeros((len(queries), min(k, n)), dtype=np.int64)
+        scores = np.zeros(rows.shape, dtype=np.float32)
+        for i, (query, candidate_rows) in enumerate(zip(queries, first_rows)):
+            ordered = np.sort(candidate_rows)  # sequential reads from the memmap
+            exact = np.asarray(self.matrix[ordered], dtype=np.float32) @ query
+            best = np.argsort(-exact)[:rows.shape[1]]
+            rows[i], scores[i] = ordered[best], exact[best]
+        return rows, scores
+
+    def _hamming_top_k(self, queries: np.ndarray, k: int) -> np.ndarray:
+        query_bits = np.packbits(queries > 0, axis=1)
+        rows = np.zeros((len(queries), k), dtype=np.int64)
+        for i, bits in enumerate(query_bits):
+            distances = np.zeros(self.codes.shape[0], dtype=np.int32)
+            for start in range(0, self.codes.shape[0], BLOCK_ROWS):
+                block = self.codes[start:start + BLOCK_ROWS]
+                distances[start:start + len(block)] = _POPCOUNT[block ^ bits].sum(axis=1, dtype=np.int32)
+            rows[i] = np.argpartition(distances, k - 1)[:k]
+        return rows
+
+
+def search_with_scores(vectorstore, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+    """
+    Vector search returning (document, cosine similarity) for either backend.
+    Chroma reports squared L2 distances; BGE vectors are unit length, so
+    cosine = 1 - d / 2.
+    """
+    if isinstance(vectorstore, NumpyVectorStore):
+        return vectorstore.similarity_search_by_vector_with_scores(embedding, k)
+    return [(doc, 1.0 - distance / 2)
+            for doc, distance in vectorstore.similarity_search_by_vector_with_relevance_scores(embedding, k)]
+
+
+def batch_search_with_scores(vectorstore, embeddings: List[List[float]], k: int = 4) -> List[List[Tuple[Document, float]]]:
+    """
+    search_with_scores() for many query vectors in one call: a single
+    blockwise matmul for the NumPy backends, a single collection query for Chroma.
+    Returns:
+        List[List[Tuple[Document, float]]]: Per query, (document, cosine similarity) best first.
+    """
+    if not len(embeddings):
+        return []
+    if isinstance(vectorstore, NumpyVectorStore):
+        if not vectorstore.store.count:
+            return [[] for _ in embeddings]
+        rows, scores = vectorstore.search(embeddings, k)
+        return [list(zip(vectorstore.documents(r), s.tolist())) for r, s in zip(rows, scores)]
+    results = vectorstore._collection.query(query_embeddings=[list(map(float, e)) for e in embeddings], n_results=k,
+                                            include=["documents", "metadatas", "distances"])
+    return [
+        [(Document(page_content=text, metadata=metadata or {}, id=doc_id), 1.0 - distance / 2)
+         for doc_id, text, metadata, distance in zip(ids, texts, metadatas, distances)]
+        for ids, texts, metadatas, distances in zip(results["ids"], results["documents"],
+                                                    results["metadatas"], results["distances"])
+    ]
@@ -0,0 +1,208 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+import requests
+
+_WORD = re.compile(r"\w+")
+WIKIPEDIA_API_URL = "https://en.wikipedia.org/w/api.php"
+TAVILY_API_URL = "https://api.tavily.com/search"
+# Wikipedia's API policy asks clients to identify themselves
+USER_AGENT = "MatBot/1.0 (MATLAB documentation assistant)"
+# As WikipediaLoader's doc_content_chars_max
+MAX_WIKIPEDIA_CHARS = 4000
+
+
+def normalize_web_query(query: str) -> str:
+    """Folds case, punctuation and whitespace, so trivially different phrasings share results."""
+    return " ".join(_WORD.findall(query.casefold()))
+
+
+# -------------------- Providers --------------------
+class SearchProvider(ABC):
+    """
+    A source of web context for search_web(). Subclasses set `name` and
+    implement fetch(), returning formatted context text ("" if nothing found).
+    """
+    name = "provider"
+
+    @abstractmethod
+    def fetch(self, query: str) -> str:
+        ...
+
+
+class WikipediaProvider(SearchProvider):
+    """
+    Wikipedia article extracts from the MediaWiki API, in one request. Connect
+    and read are bounded by timeout (seconds), so a stalled fetch gives its
+    thread back instead of holding it until the server answers.
+    """
+    name = "wikipedia"
+
+    def __init__(self, max_docs: int = 2, timeout: float = 3.0):
+        self.max_docs = max_docs
+        self.timeout = timeout
+
+    def fetch(self, query: str) -> str:
+        response = requests.get(WIKIPEDIA_API_URL, params={
+            "action": "query", "format": "json", "formatversion": 2,
+            "generator": "search", "gsrsearch": query, "gsrlimit": self.max_docs,
+            "prop": "extracts|info", "exintro": 1, "explaintext": 1, "inprop": "url", "redirects": 1
+        }, headers={"User-Agent": USER_AGENT}, timeout=self.timeout)
+        response.raise_for_status()
+        pages = sorted(response.json().get("query", {}).get("pages", []), key=lambda page: page.get("index", 0))
+        return "\n\n".join([
+            f'From Wikipedia ({page["fullurl"]}):\n{page["extract"][:MAX_WIKIPEDIA_CHARS]}'
+            for page in pages if page.get("extract")
+        ])
+
+
+class TavilyProvider(SearchProvider):
+    """
+    Tavily web search over its REST API, with connect and read bounded by
+    timeout (seconds) as for WikipediaProvider.
+    """
+    name = "tavily"
+
+    def __init__(self, api_key: str, max_results: int = 3, timeout: float = 5.0):
+        self.api_key = api_key
+        self.max_results = max_results
+        self.timeout = timeout
+
+    def fetch(self, query: str) -> str:
+        # Same request as langchain's TavilySearchResults
+        response = requests.post(TAVILY_API_URL, json={
+            "api_key": self.api_key, "query": query, "max_results": self.max_results,
+            "search_depth": "advanced"
+        }, timeout=self.timeout)
+        response.raise_for_status()
+        web_docs = response.json().get("results", [])
+        return "\n\n".join([
+            f'From {doc["url"]}:\n{doc["content"]}'
+            for doc in web_docs or []
+        ])
+
+
+class OfflineProvider(SearchProvider):
+    """
+    File-backed stand-in for the web, for air-gapped machines and repeatable
+    benchmarks. Reads JSON lines of {"query", "context"} (and optionally
+    "source"), e.g. as written by WebResultsCache.export_jsonl(). A query is
+    answered by the recorded query with the highest word overlap, if at least
+    min_overlap of the words match.
+    """
+    name = "offline"
+
+    def __init__(self, path: str, min_overlap: float = 0.6):
+        self.min_overlap = min_overlap
+        self.records: List[Dict] = []
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.records = [json.loads(line) for line in f if line.strip()]
+        else:
+            print(f"⚠ Offline web results file {path} not found, offline search returns nothing")
+        self._words = [set(normalize_web_query(record["query"]).split()) for record in self.records]
+
+    def fetch(self, query: str) -> str:
+        words = set(normalize_web_query(query).split())
+        if not words:
+            return ""
+        best, best_overlap = None, self.min_overlap
+        for i, recorded in enumerate(self._words):
+            overlap = len(words & recorded) / len(words | recorded)
+            if overlap >= best_overlap:
+                best, best_overlap = i, overlap
+        if best is None:
+            return ""
+        # A recorded query may have results from several sources
+        query_key = normalize_web_query(self.records[best]["query"])
+        return "\n\n".join(record["context"] for record in self.records
+                           if normalize_web_query(record["query"]) == query_key and record["context"])
+
+
+# -------------------- Results Cache --------------------
+class WebResultsCache:
+    """
+    Persistent TTL cache of web search results keyed by (source, normalized query).
+
+    Backed by SQLite like EmbeddingCache. Entries older than ttl_seconds are
+    ignored and purged; beyond max_entries the least recently used are evicted.
+    Empty results (nothing found, or an upstream hiccup) only live for
+    negative_ttl_seconds, so a transient miss is retried soon.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 86400.0, max_entries: int = 5000,
+                 negative_ttl_seconds: float = 300.0):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS web_results (key TEXT PRIMARY KEY, source TEXT NOT NULL, "
+            "query TEXT NOT NULL, context TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS web_results_accessed ON web_results (accessed)")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(source: str, query: str) -> str:
+        return hashlib.sha256(f"{source}\0{normalize_web_query(query)}".encode("utf-8")).hexdigest()
+
+    def get(self, source: str, query: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT context, created FROM web_results WHERE key = ?",
+                                     (self.key(source, query),)).fetchone()
+            if row is None or now - row[1] > (self.ttl_seconds if row[0] else self.negative_ttl_seconds):
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE web_results SET accessed = ? WHERE key = ?", (now, self.key(source, query)))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, source: str, query: str, context: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO web_results (key, source, query, context, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self.key(source, query), source, normalize_web_query(query), context, now, now)
+            )
+            self._conn.execute("DELETE FROM web_results WHERE created < ? OR (context = '' AND created < ?)",
+                               (now - self.ttl_seconds, now - self.negative_ttl_seconds))
+            self._conn.execute(
+                "DELETE FROM web_results WHERE key IN (SELECT key FROM web_results "
+                "ORDER BY accessed DESC LIMIT -1 OFFSET ?)", (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def export_jsonl(self, path: str) -> int:
+        """
+        Writes the live entries in OfflineProvider's format, to replay on air-gapped machines.
+        Returns:
+            int: Number of entries written.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT source, query, context FROM web_results "
+                                      "WHERE created >= ? AND context != ''",
+                                      (time.time() - self.ttl_seconds,)).fetchall()
+        with open(path, "w", encoding="utf-8") as f:
+            for source, query, context in rows:
+                f.write(json.dumps({"query": query, "source": source, "context": context}) + "\n")
+        return len(rows)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM web_results").fetchone()[0]